@@ -1,4 +1,5 @@
 import os
+import click
 from datetime import timedelta
 from flask import Flask, request, make_response
 from flask_cors import CORS
@@ -36,7 +37,7 @@ CORS(
     origins=allowed_origins,
     allow_headers=["Content-Type", "Authorization", "Access-Control-Allow-Headers", "Origin", "Accept", "X-Requested-With"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    expose_headers=["Content-Range", "X-Content-Range"],
+    expose_headers=["Content-Range", "X-Content-Range", "X-TMDB-Stale"],
     send_wildcard=False,
     vary_header=True
 )
@@ -85,6 +86,11 @@ app.register_blueprint(user_bp, url_prefix='/api/user')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(movie_bp, url_prefix='/api/movie')
 
+# In-process catalogue sync; enable it in a single process only
+from catalogue import CatalogueSyncScheduler, CATALOGUE_SYNC_INTERVAL
+if CATALOGUE_SYNC_INTERVAL > 0:
+    CatalogueSyncScheduler(app, CATALOGUE_SYNC_INTERVAL).start()
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -106,9 +112,57 @@ def health_check():
 
 # Create tables only when running directly (not during import)
 def create_tables():
-    """Create database tables if they don't exist"""
+    """Create database tables if they don't exist and add new columns"""
+    from migrations import upgrade_schema
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
+
+@app.cli.command('reconcile-review-counts')
+def reconcile_review_counts_command():
+    """Recompute every review's like_count and comment_count from the like and comment rows."""
+    from reviews import reconcile_review_counts
+    print(f"Corrected counters on {reconcile_review_counts()} reviews")
+
+@app.cli.command('decay-review-scores')
+@click.option('--batch-size', default=1000, show_default=True, help='Reviews per transaction.')
+def decay_review_scores_command(batch_size):
+    """Age every review's hot_score for sort=top; run periodically (e.g. hourly from cron)."""
+    from reviews import decay_hot_scores
+    print(f"Updated hot scores on {decay_hot_scores(batch_size)} reviews")
+
+@app.cli.command('rebuild-rating-stats')
+def rebuild_rating_stats_command():
+    """Recompute movie_rating_stats from every user's ratings (backfill or repair)."""
+    from rating_stats import rebuild_rating_stats
+    print(f"Rebuilt rating stats for {rebuild_rating_stats()} movies")
+
+@app.cli.command('load-id-export')
+@click.argument('path')
+@click.option('--min-popularity', default=0.0, show_default=True, help='Skip movies less popular than this.')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per COPY/executemany batch.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first line.')
+def load_id_export_command(path, min_popularity, batch_size, restart):
+    """Bulk-load Movie rows from a TMDB daily ID export (gzipped JSON lines)."""
+    from bulk_loader import load_id_export
+    print(f"ID export loaded: {load_id_export(path, min_popularity, batch_size, resume=not restart)}")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index over the Movie table."""
+    from search_index import rebuild_search_index
+    print(f"Search index rebuilt over {rebuild_search_index()} movies")
+
+@app.cli.command('sync-catalogue')
+def sync_catalogue_command():
+    """Refresh Movie rows that TMDB's change feed reports as changed."""
+    from catalogue import sync_catalogue
+    print(f"Catalogue sync: {sync_catalogue()}")
+
+@app.cli.command('backfill-catalogue')
+def backfill_catalogue_command():
+    """Copy TMDB details into Movie rows that lack them."""
+    from catalogue import backfill_catalogue
+    print(f"Backfilled {backfill_catalogue()} movies")
 
 if __name__ == '__main__':
     create_tables()
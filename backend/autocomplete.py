@@ -0,0 +1,298 @@
+"""
+In-memory title autocomplete over the local Movie catalogue.
+
+Titles are indexed three ways:
+- a sorted array of word-start suffixes ("dark knight", "knight"), binary
+  searched for prefix matches
+- the precomputed top suggestions for one- and two-character prefixes,
+  whose ranges would otherwise be long
+- trigram postings for typo-tolerant fallback
+
+Suggestions are ranked by TMDB popularity.
+
+The index is rebuilt from the database every AUTOCOMPLETE_REBUILD_SECONDS,
+on a background thread (one at a time) while the old index keeps serving;
+only the first build runs on a request. Rebuilds read just the indexed
+columns, never ORM objects. In between the index polls for rows past the
+highest id it has seen and for rows whose fetched_at is newer than the
+latest it has seen. The second catches ID-export stubs whose details
+arrived in place, and re-titled refreshes. Polling the database also
+catches rows written by other workers.
+Writers swap in new containers instead of mutating shared ones, so lookups
+need no lock.
+"""
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '30'))
+AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv('AUTOCOMPLETE_REBUILD_SECONDS', '3600'))
+SHORT_PREFIX = 2
+MIN_SIMILARITY = 0.3
+
+Suggestion = namedtuple('Suggestion', ['id', 'title', 'year', 'poster_path', 'popularity'])
+
+
+def normalize_title(value):
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.findall(r'\w+', value))
+
+
+def title_keys(normalized):
+    """Every suffix of the title that starts at a word boundary."""
+    words = normalized.split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    """Prefix and trigram index of movie titles, ranked by popularity."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._movies = {}
+        self._keys = []
+        self._trigrams = {}
+        self._title_trigrams = {}
+        self._top = {}
+        self.max_id = 0
+        self.fetched_until = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+        self.lookups = 0
+        self.rebuilding = False
+
+    def build(self, movies):
+        """Replace the index with the given Movie rows."""
+        index = AutocompleteIndex()
+        index._add_all(movies)
+        with self._lock:
+            self._swap(index._movies, index._title_trigrams, index._keys, index._trigrams)
+            self.max_id = index.max_id
+            self.fetched_until = index.fetched_until
+            self.built_at = self.checked_at = time.time()
+
+    def add(self, movies):
+        """Index additional or updated Movie rows without rebuilding."""
+        with self._lock:
+            self._add_all(movies)
+
+    def _add_all(self, movies):
+        keys, postings, title_trigrams = [], {}, {}
+        added, retitled = {}, {}
+        for movie in movies:
+            normalized = normalize_title(movie.title)
+            self.max_id = max(self.max_id, movie.id)
+            fetched_at = getattr(movie, 'fetched_at', None)
+            if fetched_at and (self.fetched_until is None or fetched_at > self.fetched_until):
+                self.fetched_until = fetched_at
+            if not normalized:
+                continue
+            added[movie.tmdb_id] = Suggestion(
+                movie.tmdb_id, movie.title,
+                movie.release_date.year if movie.release_date else None,
+                movie.poster_path, movie.popularity or 0.0
+            )
+            previous = self._movies.get(movie.tmdb_id)
+            if previous is not None:
+                if previous.title == movie.title:
+                    # Already indexed under this title; only the suggestion changes
+                    continue
+                retitled[movie.tmdb_id] = normalize_title(previous.title)
+            keys.extend((key, movie.tmdb_id) for key in title_keys(normalized))
+            grams = trigrams(normalized)
+            title_trigrams[movie.tmdb_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, set()).add(movie.tmdb_id)
+        if not added:
+            return
+        movies_map = dict(self._movies)
+        movies_map.update(added)
+        base_keys = self._keys
+        if retitled:
+            base_keys = [key for key in base_keys if key[1] not in retitled]
+        if len(keys) > 64 or not base_keys:
+            sorted_keys = sorted(base_keys + keys)
+        else:
+            sorted_keys = list(base_keys)
+            for key in keys:
+                insort(sorted_keys, key)
+        trigram_map = dict(self._trigrams)
+        for tmdb_id, old_title in retitled.items():
+            for gram in trigrams(old_title):
+                if gram in trigram_map:
+                    trigram_map[gram] = trigram_map[gram] - {tmdb_id}
+        for gram, ids in postings.items():
+            trigram_map[gram] = frozenset(trigram_map.get(gram, frozenset()) | ids)
+        title_map = dict(self._title_trigrams)
+        title_map.update(title_trigrams)
+        self._swap(movies_map, title_map, sorted_keys, trigram_map)
+
+    def _swap(self, movies, title_trigrams, keys, trigram_map):
+        # Lookup tables first, so a reader that sees a new key can resolve it
+        self._movies = movies
+        self._title_trigrams = title_trigrams
+        self._keys = keys
+        self._trigrams = trigram_map
+        # Short-prefix rankings may now be missing the new titles
+        self._top = {}
+
+    def claim_rebuild(self):
+        """Mark a full rebuild as running; False when one already is."""
+        with self._lock:
+            if self.rebuilding:
+                return False
+            self.rebuilding = True
+            return True
+
+    def release_rebuild(self):
+        with self._lock:
+            self.rebuilding = False
+
+    def reset(self):
+        """Force a full rebuild on the next refresh_index() call."""
+        with self._lock:
+            self.built_at = 0.0
+
+    def _prefix_ids(self, prefix):
+        keys = self._keys
+        ids = set()
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            ids.add(keys[i][1])
+            i += 1
+        return ids
+
+    def _ranked(self, ids, limit):
+        movies = self._movies
+        return heapq.nlargest(limit, ids, key=lambda tmdb_id: movies[tmdb_id].popularity)
+
+    def _fuzzy(self, normalized, limit, exclude):
+        grams = trigrams(normalized)
+        counts = {}
+        for gram in grams:
+            for tmdb_id in self._trigrams.get(gram, ()):
+                counts[tmdb_id] = counts.get(tmdb_id, 0) + 1
+        movies, sizes = self._movies, self._title_trigrams
+        scored = []
+        for tmdb_id, shared in counts.items():
+            if tmdb_id in exclude:
+                continue
+            similarity = shared / (len(grams) + sizes[tmdb_id] - shared)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, movies[tmdb_id].popularity, tmdb_id))
+        return [tmdb_id for _, _, tmdb_id in heapq.nlargest(limit, scored)]
+
+    def suggest(self, query, limit=AUTOCOMPLETE_LIMIT):
+        """Top suggestions for a partial title: prefix matches first, then near misses."""
+        self.lookups += 1
+        normalized = normalize_title(query)
+        if not normalized:
+            return []
+        if len(normalized) <= SHORT_PREFIX:
+            top = self._top.get(normalized)
+            if top is None or len(top) < limit:
+                top = self._ranked(self._prefix_ids(normalized), max(limit, AUTOCOMPLETE_MAX_LIMIT))
+                self._top[normalized] = top
+            ids = top[:limit]
+        else:
+            ids = self._ranked(self._prefix_ids(normalized), limit)
+            if len(ids) < limit:
+                ids += self._fuzzy(normalized, limit - len(ids), set(ids))
+        movies = self._movies
+        return [movies[tmdb_id]._asdict() for tmdb_id in ids]
+
+    def memory_bytes(self):
+        """Approximate memory held by the index structures."""
+        size = sys.getsizeof(self._movies) + sys.getsizeof(self._keys) + sys.getsizeof(self._trigrams)
+        size += sys.getsizeof(self._title_trigrams)
+        for suggestion in self._movies.values():
+            size += sys.getsizeof(suggestion) + sys.getsizeof(suggestion.title)
+        for key in self._keys:
+            size += sys.getsizeof(key) + sys.getsizeof(key[0])
+        for gram, ids in self._trigrams.items():
+            size += sys.getsizeof(gram) + sys.getsizeof(ids)
+        return size
+
+    def stats(self):
+        return {
+            'movies': len(self._movies),
+            'keys': len(self._keys),
+            'trigrams': len(self._trigrams),
+            'memory_bytes': self.memory_bytes(),
+            'max_id': self.max_id,
+            'built_at': self.built_at,
+            'lookups': self.lookups
+        }
+
+
+def indexed_rows():
+    """
+    Query of the columns the index keeps, for Movie rows with fetched details;
+    stubs are skipped until the poll sees their fetched_at set.
+    """
+    from models import db, Movie
+    return db.session.query(
+        Movie.id, Movie.tmdb_id, Movie.title, Movie.release_date, Movie.poster_path, Movie.popularity,
+        Movie.fetched_at
+    ).filter(Movie.fetched_at.isnot(None))
+
+
+def rebuild_in_background(app, index):
+    """Thread body: rebuild the index in its own app context, then release the rebuild flag."""
+    try:
+        with app.app_context():
+            index.build(indexed_rows().all())
+    except Exception as e:
+        print(f"Autocomplete rebuild failed: {e}")
+    finally:
+        index.release_rebuild()
+
+
+def refresh_index(index, now=None):
+    """
+    Keep the index current: the first build runs here, later full rebuilds
+    start a background thread when the index is stale, and rows above the id
+    watermark are indexed at most every AUTOCOMPLETE_REFRESH_SECONDS.
+    Needs an app context.
+    """
+    from flask import current_app
+    from sqlalchemy import or_
+    from models import Movie
+    now = now or time.time()
+    if not index.built_at:
+        # Nothing to serve yet, so this request waits for the first build
+        if index.claim_rebuild():
+            try:
+                index.build(indexed_rows().all())
+            finally:
+                index.release_rebuild()
+        return index
+    if now - index.built_at >= AUTOCOMPLETE_REBUILD_SECONDS and index.claim_rebuild():
+        threading.Thread(target=rebuild_in_background, args=(current_app._get_current_object(), index),
+                         name='autocomplete-rebuild', daemon=True).start()
+    if now - index.checked_at >= AUTOCOMPLETE_REFRESH_SECONDS:
+        index.checked_at = now
+        recent = Movie.id > index.max_id
+        if index.fetched_until is not None:
+            recent = or_(recent, Movie.fetched_at > index.fetched_until)
+        index.add(indexed_rows().filter(recent).order_by(Movie.id).all())
+    return index
+
+
+# Module-level index shared by the routes
+autocomplete_index = AutocompleteIndex()
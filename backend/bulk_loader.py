@@ -0,0 +1,175 @@
+"""
+Bulk loader for TMDB's daily movie ID export.
+
+The export is a gzipped file with one JSON object per line, e.g.
+{"adult":false,"id":550,"original_title":"Fight Club","popularity":61.4,"video":false}.
+It is streamed and parsed lazily, filtered by a popularity cutoff, and
+inserted in large batches that skip movies already in the catalogue:
+- Postgres: COPY into a temporary staging table, then INSERT ... SELECT ...
+  ON CONFLICT DO NOTHING
+- SQLite: executemany with INSERT OR IGNORE
+
+Each batch commits together with a checkpoint of how many lines have been
+consumed, so an interrupted load resumes where it stopped. Loaded rows are
+stubs: they hold only the original-language title and popularity, and keep
+fetched_at NULL, which search, autocomplete, discover and ensure_movies()
+read as "no details yet" and skip or refetch. Details (and the localised
+title) arrive through backfill_catalogue(), the change-feed sync, or the
+first user action on the movie.
+"""
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from models import db
+
+ID_EXPORT_BATCH_SIZE = 10000
+TITLE_MAX_LENGTH = 200
+
+
+def read_id_export(path, skip=0):
+    """Yield (line_number, record) for each parseable line after the first skip lines."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as handle:
+        for number, line in enumerate(itertools.islice(handle, skip, None), start=skip + 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                continue
+
+
+def export_rows(records, min_popularity=0.0):
+    """
+    Turn export records into (tmdb_id, title, popularity) rows, dropping adult
+    and unpopular titles. The export only carries original_title; it stands in
+    until the details fetch replaces it.
+    """
+    for number, record in records:
+        popularity = record.get('popularity') or 0.0
+        title = (record.get('original_title') or '').strip()
+        if record.get('adult') or popularity < min_popularity or not title or record.get('id') is None:
+            yield number, None
+            continue
+        yield number, (int(record['id']), title[:TITLE_MAX_LENGTH], float(popularity))
+
+
+class _SQLiteWriter:
+    placeholder = '?'
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def insert(self, rows):
+        self.cursor.executemany(
+            'INSERT OR IGNORE INTO movie (tmdb_id, title, popularity) VALUES (?, ?, ?)', rows
+        )
+        # rowcount excludes the search-index trigger writes
+        return self.cursor.rowcount
+
+
+class _PostgresWriter:
+    placeholder = '%s'
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS movie_import '
+            '(tmdb_id INTEGER, title VARCHAR(200), popularity DOUBLE PRECISION)'
+        )
+
+    def insert(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        self.cursor.copy_expert('COPY movie_import (tmdb_id, title, popularity) FROM STDIN WITH (FORMAT csv)', buffer)
+        self.cursor.execute(
+            'INSERT INTO movie (tmdb_id, title, popularity) '
+            'SELECT DISTINCT ON (tmdb_id) tmdb_id, title, popularity FROM movie_import '
+            'ON CONFLICT (tmdb_id) DO NOTHING'
+        )
+        inserted = self.cursor.rowcount
+        self.cursor.execute('TRUNCATE movie_import')
+        return inserted
+
+
+def _save_position(cursor, placeholder, name, position):
+    now = datetime.utcnow()
+    cursor.execute(
+        f'UPDATE sync_checkpoint SET position = {placeholder}, synced_until = {placeholder}, '
+        f'updated_at = {placeholder} WHERE name = {placeholder}',
+        (position, now, now, name)
+    )
+    if cursor.rowcount == 0:
+        cursor.execute(
+            f'INSERT INTO sync_checkpoint (name, synced_until, position, updated_at) '
+            f'VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})',
+            (name, now, position, now)
+        )
+
+
+def _load_position(cursor, placeholder, name):
+    cursor.execute(f'SELECT position FROM sync_checkpoint WHERE name = {placeholder}', (name,))
+    row = cursor.fetchone()
+    return (row[0] or 0) if row else 0
+
+
+def load_id_export(path, min_popularity=0.0, batch_size=ID_EXPORT_BATCH_SIZE, resume=True, progress=print):
+    """
+    Stream an ID export into the movie table. Returns a summary dict.
+    With resume, lines consumed by an earlier run of the same file are skipped.
+    """
+    checkpoint = f'id_export:{os.path.basename(path)}'
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            writer = _PostgresWriter(cursor)
+        elif dialect == 'sqlite':
+            writer = _SQLiteWriter(cursor)
+        else:
+            raise NotImplementedError(f'The ID export loader does not support the {dialect} dialect')
+        start = _load_position(cursor, writer.placeholder, checkpoint) if resume else 0
+
+        started = time.monotonic()
+        position, read, inserted = start, 0, 0
+        batch = []
+
+        def flush():
+            nonlocal inserted
+            if batch:
+                inserted += writer.insert(batch)
+                batch.clear()
+            _save_position(cursor, writer.placeholder, checkpoint, position)
+            connection.commit()
+            elapsed = max(time.monotonic() - started, 1e-6)
+            progress(f'{position} lines, {inserted} movies inserted, {read / elapsed:,.0f} lines/s')
+
+        for number, row in export_rows(read_id_export(path, skip=start), min_popularity):
+            position = number
+            read += 1
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        return {
+            'path': path,
+            'resumed_from': start,
+            'lines': position,
+            'read': read,
+            'inserted': inserted,
+            'seconds': round(time.monotonic() - started, 2)
+        }
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
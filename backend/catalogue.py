@@ -0,0 +1,267 @@
+"""
+Local movie catalogue maintenance.
+
+Movie rows carry a denormalised copy of TMDB details (genres, release date,
+runtime, ...) so user lists render from the database alone. Rows are filled
+whenever a route already has a details payload in hand; backfill_catalogue()
+covers rows created before that, or whose details were never fetched.
+
+sync_catalogue() drops the cached TMDB payloads of the movies it refreshes,
+but only from the shared SQLite tier and the memory tier of the process
+running the sync. Other workers' in-memory LRUs keep serving the old
+details until their TTL (TMDB_CACHE_TTL_DETAILS) expires; the Movie rows
+themselves are current at once.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Movie, Genre, movie_genre, SyncCheckpoint, UserMovieState
+from tmdb import tmdb_client, fetch_movie_details_many, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+# Details older than this are re-copied the next time a route fetches them
+CATALOGUE_MAX_AGE = timedelta(days=int(os.getenv('CATALOGUE_MAX_AGE_DAYS', '7')))
+CATALOGUE_BATCH_SIZE = 50
+CATALOGUE_BATCH_TIMEOUT = 60
+# Change-feed sync: concurrent detail fetches per batch, and seconds between
+# scheduler runs (0 leaves the in-process scheduler off)
+CATALOGUE_SYNC_WORKERS = int(os.getenv('CATALOGUE_SYNC_WORKERS', '4'))
+CATALOGUE_SYNC_INTERVAL = int(os.getenv('CATALOGUE_SYNC_INTERVAL', '0'))
+# TMDB's /movie/changes accepts at most a 14 day window
+CHANGES_MAX_WINDOW = timedelta(days=14)
+SYNC_CHECKPOINT = 'tmdb_movie_changes'
+
+
+def needs_refresh(movie, now=None):
+    """True when a Movie row has no details yet or they are older than CATALOGUE_MAX_AGE."""
+    return movie.fetched_at is None or movie.fetched_at < (now or datetime.utcnow()) - CATALOGUE_MAX_AGE
+
+
+def refresh_from_details(movie, data):
+    """
+    Copy a details payload a route already fetched onto a stale Movie row.
+    Projected payloads without genres are ignored. Returns True when the row was updated.
+    """
+    if movie is None or not data or not isinstance(data.get('genres'), list) or not needs_refresh(movie):
+        return False
+    movie.apply_tmdb(data)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return False
+    return True
+
+
+def insert_ignoring_conflicts(table, rows):
+    """
+    INSERT rows, skipping any that collide with a unique key (SQLite and Postgres).
+    Returns the result, whose rowcount tells how many single-row inserts landed.
+    """
+    if not rows:
+        return None
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    else:
+        raise NotImplementedError(f'insert_ignoring_conflicts does not support the {dialect} dialect')
+    return db.session.execute(statement, rows)
+
+
+def ensure_movies(tmdb_ids, priority=PRIORITY_INTERACTIVE):
+    """
+    Resolve TMDB ids to Movie rows, creating the missing ones.
+
+    Known ids are read with one IN query; only the misses are fetched from
+    TMDB, then inserted with INSERT ... ON CONFLICT DO NOTHING so concurrent
+    requests for the same new movie cannot collide on tmdb_id. Rows without
+    details (ID-export stubs) are fetched too and filled in place; a stub
+    is still returned if its fetch fails. Nothing is committed: the rows
+    belong to the caller's transaction.
+
+    Returns a dict of tmdb_id -> Movie; ids TMDB does not know are left out.
+    """
+    ids = []
+    for tmdb_id in tmdb_ids:
+        try:
+            ids.append(int(tmdb_id))
+        except (TypeError, ValueError):
+            continue
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    movies = {movie.tmdb_id: movie for movie in Movie.query.filter(Movie.tmdb_id.in_(ids)).all()}
+    misses = [tmdb_id for tmdb_id in ids if tmdb_id not in movies or movies[tmdb_id].fetched_at is None]
+    if not misses:
+        return movies
+
+    # No fan-out deadline: the caller needs the row, so each fetch runs to the
+    # client's own connect/read timeouts and retries rather than being dropped
+    results = fetch_movie_details_many(misses, use_local=False, timeout=None, priority=priority)
+    payloads = [results[tmdb_id]['data'] for tmdb_id in misses
+                if results.get(tmdb_id, {}).get('data') and results[tmdb_id]['data'].get('title')]
+    for data in [data for data in payloads if data['id'] in movies]:
+        movies[data['id']].apply_tmdb(data)
+        payloads.remove(data)
+    if not payloads:
+        return movies
+
+    blank = dict.fromkeys(Movie.TMDB_COLUMNS)
+    insert_ignoring_conflicts(Movie.__table__, [
+        dict(blank, tmdb_id=data['id'], **Movie.tmdb_columns(data)) for data in payloads
+    ])
+    genres = {item['id']: item['name'] for data in payloads for item in data.get('genres') or []}
+    insert_ignoring_conflicts(Genre.__table__, [{'id': gid, 'name': name} for gid, name in genres.items()])
+    created = {movie.tmdb_id: movie for movie in Movie.query.filter(
+        Movie.tmdb_id.in_([data['id'] for data in payloads])).all()}
+    insert_ignoring_conflicts(movie_genre, [
+        {'movie_id': created[data['id']].id, 'genre_id': item['id']}
+        for data in payloads if data['id'] in created
+        for item in data.get('genres') or []
+    ])
+    for movie in created.values():
+        # Genres were linked after the rows were loaded
+        db.session.expire(movie, ['genres'])
+    movies.update(created)
+    return movies
+
+
+def ensure_movie(tmdb_id, priority=PRIORITY_INTERACTIVE):
+    """ensure_movies() for a single id; returns the Movie or None."""
+    movies = ensure_movies([tmdb_id], priority)
+    return next(iter(movies.values()), None)
+
+
+def backfill_catalogue(batch_size=CATALOGUE_BATCH_SIZE):
+    """
+    Fetch TMDB details for listed movies that have no Movie row and for rows
+    whose details were never fetched. Returns the number of rows written.
+    """
+    listed = {movie_id for (movie_id,) in db.session.query(UserMovieState.movie_id).distinct()}
+    known = dict(db.session.query(Movie.tmdb_id, Movie.fetched_at).all())
+    pending = sorted(listed - set(known)) + sorted(tmdb_id for tmdb_id, fetched in known.items() if fetched is None)
+
+    written = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        results = fetch_movie_details_many(batch, use_local=False, timeout=CATALOGUE_BATCH_TIMEOUT,
+                                           priority=PRIORITY_BACKGROUND)
+        rows = {movie.tmdb_id: movie for movie in Movie.query.filter(Movie.tmdb_id.in_(batch)).all()}
+        for movie_id in batch:
+            data = results.get(movie_id, {}).get('data')
+            if not data:
+                continue
+            if movie_id in rows:
+                rows[movie_id].apply_tmdb(data)
+            else:
+                db.session.add(Movie.from_tmdb(data))
+            written += 1
+        db.session.commit()
+    return written
+
+
+def changed_movie_ids(start, end):
+    """Collect the ids in TMDB's /movie/changes feed between two datetimes."""
+    ids = set()
+    page, total_pages = 1, 1
+    while page <= total_pages:
+        data = tmdb_client.get('movie/changes', {
+            'start_date': start.date().isoformat(),
+            'end_date': end.date().isoformat(),
+            'page': page
+        }, use_cache=False, priority=PRIORITY_BACKGROUND)
+        ids.update(item['id'] for item in data.get('results', []) if item.get('id') is not None)
+        total_pages = data.get('total_pages') or 1
+        page += 1
+    return ids
+
+
+def sync_catalogue(now=None, batch_size=CATALOGUE_BATCH_SIZE, max_workers=CATALOGUE_SYNC_WORKERS):
+    """
+    Refresh the Movie rows TMDB reports as changed since the last sync.
+
+    The change window starts at the stored checkpoint (or one day back on the
+    first run) and is clamped to the 14 days TMDB serves. Only changed movies
+    we hold are refetched, batch_size at a time with max_workers concurrent
+    requests, and each batch is committed on its own. The checkpoint moves
+    to the end of the window only when every movie was refreshed, so an
+    interrupted or failed run is retried from the same point.
+    """
+    now = now or datetime.utcnow()
+    checkpoint = db.session.get(SyncCheckpoint, SYNC_CHECKPOINT)
+    start = checkpoint.synced_until if checkpoint else now - timedelta(days=1)
+    start = max(start, now - CHANGES_MAX_WINDOW)
+
+    changed = sorted(changed_movie_ids(start, now))
+    held = []
+    for offset in range(0, len(changed), 500):
+        chunk = changed[offset:offset + 500]
+        held.extend(tmdb_id for (tmdb_id,) in
+                    db.session.query(Movie.tmdb_id).filter(Movie.tmdb_id.in_(chunk)).all())
+    held.sort()
+
+    refreshed = failed = 0
+    for offset in range(0, len(held), batch_size):
+        batch = held[offset:offset + batch_size]
+        for tmdb_id in batch:
+            # Drop cached payloads (and their projections) from this process and the disk tier
+            tmdb_client.invalidate(prefix=f'movie/{tmdb_id}?')
+        results = fetch_movie_details_many(batch, use_local=False, max_workers=max_workers,
+                                           timeout=CATALOGUE_BATCH_TIMEOUT, priority=PRIORITY_BACKGROUND)
+        rows = {movie.tmdb_id: movie for movie in Movie.query.filter(Movie.tmdb_id.in_(batch)).all()}
+        for tmdb_id in batch:
+            movie = rows.get(tmdb_id)
+            if movie is None:
+                # Deleted since the held query; nothing left to refresh
+                continue
+            result = results.get(tmdb_id) or {}
+            if result.get('data'):
+                movie.apply_tmdb(result['data'])
+                refreshed += 1
+            elif not str(result.get('error', '')).startswith('404'):
+                # A 404 means TMDB dropped the movie; anything else is retried next run
+                failed += 1
+        db.session.commit()
+
+    if not failed:
+        if checkpoint is None:
+            checkpoint = SyncCheckpoint(name=SYNC_CHECKPOINT, synced_until=now)
+            db.session.add(checkpoint)
+        else:
+            checkpoint.synced_until = now
+        db.session.commit()
+    return {
+        'window_start': start.isoformat(),
+        'window_end': now.isoformat(),
+        'changed': len(changed),
+        'held': len(held),
+        'refreshed': refreshed,
+        'failed': failed,
+        'checkpoint_advanced': not failed
+    }
+
+
+class CatalogueSyncScheduler(threading.Thread):
+    """Daemon thread running sync_catalogue() every interval seconds."""
+
+    def __init__(self, app, interval=CATALOGUE_SYNC_INTERVAL):
+        super().__init__(name='catalogue-sync', daemon=True)
+        self.app = app
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            started = time.monotonic()
+            try:
+                with self.app.app_context():
+                    summary = sync_catalogue()
+                print(f"Catalogue sync: {summary} in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"Catalogue sync failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,247 @@
+"""
+Local discover engine over the Movie catalogue.
+
+The catalogue is held as column-oriented NumPy arrays (genre bitmask,
+vote average, vote count, popularity, release day, language code) so the
+category filters and sort orders of TMDB's discover/movie are evaluated
+with a few vectorised comparisons instead of an upstream call per filter
+combination. Only rows with fetched details are included. Unfiltered
+listings always go to TMDB, since the catalogue holds the movies users
+touched (or ID-export stubs), not TMDB's whole ranking; filtered ones fall
+back to TMDB when they match too few local movies to be representative.
+
+The snapshot is rebuilt every DISCOVER_REBUILD_SECONDS on a background
+thread (one at a time) while the old one keeps serving; only the first
+build runs on a request.
+"""
+import math
+import os
+import threading
+import time
+from datetime import date
+import numpy as np
+
+DISCOVER_PAGE_SIZE = 20
+# TMDB never serves more than 500 pages of a listing
+DISCOVER_MAX_PAGES = 500
+# A query is answered locally only when it matches at least this many movies
+DISCOVER_MIN_MATCHES = int(os.getenv('DISCOVER_MIN_MATCHES', '200'))
+DISCOVER_REBUILD_SECONDS = int(os.getenv('DISCOVER_REBUILD_SECONDS', '600'))
+
+
+class DiscoverEngine:
+    """Vectorised filter-and-sort over an in-memory column snapshot of the catalogue."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+        self.built_at = 0.0
+        self.queries = 0
+        self.rebuilding = False
+
+    def build(self, rows, genre_links):
+        """
+        Replace the snapshot. rows are (tmdb_id, vote_average, vote_count,
+        popularity, release_date, original_language) tuples and genre_links
+        are (tmdb_id, genre_id) pairs.
+        """
+        rows = list(rows)
+        genre_ids = sorted({genre_id for _, genre_id in genre_links})[:64]
+        bits = {genre_id: np.uint64(1) << np.uint64(i) for i, genre_id in enumerate(genre_ids)}
+        languages = sorted({row[5] for row in rows if row[5]})
+        language_codes = {language: code for code, language in enumerate(languages, start=1)}
+
+        tmdb_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        position = {tmdb_id: i for i, tmdb_id in enumerate(tmdb_ids.tolist())}
+        genres = np.zeros(len(rows), dtype=np.uint64)
+        for tmdb_id, genre_id in genre_links:
+            if tmdb_id in position and genre_id in bits:
+                genres[position[tmdb_id]] |= bits[genre_id]
+
+        columns = {
+            'tmdb_id': tmdb_ids,
+            'genres': genres,
+            'vote_average': np.array([row[1] if row[1] is not None else np.nan for row in rows], dtype=np.float32),
+            'vote_count': np.array([row[2] or 0 for row in rows], dtype=np.int32),
+            'popularity': np.array([row[3] or 0.0 for row in rows], dtype=np.float32),
+            # Days since 0001-01-01; 0 when the release date is unknown
+            'release_day': np.array([row[4].toordinal() if row[4] else 0 for row in rows], dtype=np.int32),
+            'language': np.array([language_codes.get(row[5], 0) for row in rows], dtype=np.int16),
+            'genre_bits': bits,
+            'language_codes': language_codes
+        }
+        with self._lock:
+            self._columns = columns
+            self.built_at = time.time()
+
+    def claim_rebuild(self):
+        """Mark a rebuild as running; False when one already is."""
+        with self._lock:
+            if self.rebuilding:
+                return False
+            self.rebuilding = True
+            return True
+
+    def release_rebuild(self):
+        with self._lock:
+            self.rebuilding = False
+
+    def reset(self):
+        """Force a rebuild on the next refresh_engine() call."""
+        with self._lock:
+            self.built_at = 0.0
+
+    def _genre_mask(self, columns, with_genres):
+        """TMDB semantics: ',' requires every genre, '|' accepts any of them."""
+        any_of = '|' in with_genres
+        wanted = [int(part) for part in with_genres.replace('|', ',').split(',') if part.strip().isdigit()]
+        bits = columns['genre_bits']
+        combined = np.uint64(0)
+        for genre_id in wanted:
+            if genre_id in bits:
+                combined |= bits[genre_id]
+            elif not any_of:
+                return np.zeros(len(columns['genres']), dtype=bool)
+        if any_of:
+            return (columns['genres'] & combined) != 0
+        return (columns['genres'] & combined) == combined
+
+    def discover(self, with_genres=None, vote_average_gte=None, vote_average_lte=None,
+                 with_original_language=None, vote_count_gte=None, release_date_gte=None,
+                 sort_by='popularity.desc', page=1, per_page=DISCOVER_PAGE_SIZE):
+        """
+        Filter and sort the snapshot. Returns (tmdb_ids for the page, total matches),
+        or None when no snapshot has been built.
+        """
+        columns = self._columns
+        if columns is None:
+            return None
+        self.queries += 1
+        mask = np.ones(len(columns['tmdb_id']), dtype=bool)
+        if with_genres:
+            mask &= self._genre_mask(columns, with_genres)
+        if vote_average_gte is not None:
+            mask &= columns['vote_average'] >= vote_average_gte
+        if vote_average_lte is not None:
+            mask &= columns['vote_average'] <= vote_average_lte
+        if vote_count_gte is not None:
+            mask &= columns['vote_count'] >= vote_count_gte
+        if with_original_language:
+            mask &= columns['language'] == columns['language_codes'].get(with_original_language, -1)
+        if release_date_gte is not None:
+            mask &= columns['release_day'] >= release_date_gte.toordinal()
+
+        matched = np.flatnonzero(mask)
+        if sort_by == 'vote_average.desc':
+            primary = -np.nan_to_num(columns['vote_average'][matched], nan=-1.0)
+            secondary = -columns['vote_count'][matched]
+        elif sort_by == 'primary_release_date.asc':
+            primary = columns['release_day'][matched]
+            secondary = -columns['popularity'][matched]
+        else:
+            primary = -columns['popularity'][matched]
+            secondary = -columns['vote_count'][matched]
+        # lexsort sorts by the last key first; tmdb_id keeps pages stable
+        order = np.lexsort((columns['tmdb_id'][matched], secondary, primary))
+        start = (max(page, 1) - 1) * per_page
+        page_rows = matched[order[start:start + per_page]]
+        return columns['tmdb_id'][page_rows].tolist(), int(len(matched))
+
+    def stats(self):
+        columns = self._columns
+        return {
+            'movies': 0 if columns is None else int(len(columns['tmdb_id'])),
+            'memory_bytes': 0 if columns is None else int(sum(
+                value.nbytes for value in columns.values() if isinstance(value, np.ndarray)
+            )),
+            'built_at': self.built_at,
+            'queries': self.queries
+        }
+
+
+def build_engine(engine):
+    """Build the snapshot from the database (app context). Rows whose details were never fetched are left out."""
+    from models import db, Movie, movie_genre
+    rows = db.session.query(
+        Movie.tmdb_id, Movie.vote_average, Movie.vote_count, Movie.popularity,
+        Movie.release_date, Movie.original_language
+    ).filter(Movie.fetched_at.isnot(None)).all()
+    links = db.session.query(Movie.tmdb_id, movie_genre.c.genre_id).join(
+        movie_genre, movie_genre.c.movie_id == Movie.id
+    ).filter(Movie.fetched_at.isnot(None)).all()
+    engine.build(rows, links)
+
+
+def rebuild_in_background(app, engine):
+    """Thread body: rebuild the snapshot in its own app context, then release the rebuild flag."""
+    try:
+        with app.app_context():
+            build_engine(engine)
+    except Exception as e:
+        print(f"Discover rebuild failed: {e}")
+    finally:
+        engine.release_rebuild()
+
+
+def refresh_engine(engine, now=None):
+    """
+    Keep the snapshot current (app context): the first build runs here, and
+    once it is older than DISCOVER_REBUILD_SECONDS a background thread
+    rebuilds it while the old snapshot keeps serving.
+    """
+    from flask import current_app
+    now = now or time.time()
+    if not engine.built_at:
+        # Nothing to serve yet, so this request waits for the first build
+        if engine.claim_rebuild():
+            try:
+                build_engine(engine)
+            finally:
+                engine.release_rebuild()
+    elif now - engine.built_at >= DISCOVER_REBUILD_SECONDS and engine.claim_rebuild():
+        threading.Thread(target=rebuild_in_background, args=(current_app._get_current_object(), engine),
+                         name='discover-rebuild', daemon=True).start()
+    return engine
+
+
+def local_discover(engine, category, page=1, with_genres=None, vote_average_gte=None,
+                   vote_average_lte=None, with_original_language=None, today=None):
+    """
+    Answer a category listing from the engine, mirroring the TMDB parameters
+    the tmdb.get_*_movies helpers send. Returns (tmdb_ids, total) or None
+    when TMDB should be asked instead: for unfiltered listings, and when
+    local coverage is insufficient.
+    """
+    if not (with_genres or vote_average_gte is not None or vote_average_lte is not None
+            or with_original_language):
+        return None
+    options = {
+        'with_genres': with_genres,
+        'vote_average_gte': vote_average_gte,
+        'vote_average_lte': vote_average_lte,
+        'with_original_language': with_original_language,
+        'page': page
+    }
+    if category == 'popular':
+        options['sort_by'] = 'popularity.desc'
+    elif category == 'top-rated':
+        options.update(sort_by='vote_average.desc', vote_count_gte=1000)
+    elif category == 'upcoming':
+        options.update(sort_by='primary_release_date.asc', release_date_gte=today or date.today())
+    else:
+        return None
+    result = engine.discover(**options)
+    if result is None:
+        return None
+    ids, total = result
+    if total < DISCOVER_MIN_MATCHES or (max(page, 1) - 1) * DISCOVER_PAGE_SIZE >= total:
+        return None
+    return ids, total
+
+
+def total_pages(total, per_page=DISCOVER_PAGE_SIZE):
+    return min(max(math.ceil(total / per_page), 1), DISCOVER_MAX_PAGES)
+
+
+# Module-level engine shared by the routes
+discover_engine = DiscoverEngine()
@@ -5,6 +5,7 @@ Database initialization script for Render deployment
 import os
 import sys
 from app import app, db
+from migrations import upgrade_schema
 
 def check_environment():
     """Check if all required environment variables are set"""
@@ -32,10 +33,12 @@ def init_database():
             db.engine.execute("SELECT 1")
             print("✅ Database connection successful!")
             
-            # Create all tables
+            # Create all tables and add any new model columns
             print("🔄 Creating database tables...")
-            db.create_all()
+            added = upgrade_schema()
             print("✅ Database tables created successfully!")
+            if added:
+                print(f"✅ Added columns: {', '.join(added)}")
             return True
     except Exception as e:
         print(f"❌ Error with database: {e}")
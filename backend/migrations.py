@@ -0,0 +1,66 @@
+"""
+Lightweight schema upgrades.
+
+db.create_all() creates missing tables but never alters existing ones, so
+columns added to a model would be missing on a deployed database.
+upgrade_schema() creates any missing tables, adds missing columns and
+indexes to the existing ones, creates the search index, copies the legacy
+per-list tables into user_movie_state and fills newly added review counters
+and rating aggregates.
+"""
+from sqlalchemy import inspect, text
+from models import db
+from rating_stats import rebuild_rating_stats
+from reviews import decay_hot_scores, reconcile_review_counts
+from search_index import ensure_search_index
+from user_state import migrate_legacy_state
+
+
+def column_ddl(column, dialect):
+    """Render the ADD COLUMN clause for a model column."""
+    quote = dialect.identifier_preparer.quote
+    ddl = f'{quote(column.name)} {column.type.compile(dialect=dialect)}'
+    if column.server_default is not None:
+        default = column.server_default.arg
+        ddl += f' DEFAULT {getattr(default, "text", default)}'
+    if not column.nullable and not column.primary_key:
+        if column.server_default is None:
+            raise ValueError(f'{column.table.name}.{column.name} needs a server default to be added')
+        ddl += ' NOT NULL'
+    return ddl
+
+
+def upgrade_schema():
+    """Bring the database in line with the models; returns the columns and indexes added."""
+    engine = db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+    db.create_all()
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                conn.execute(text(
+                    f'ALTER TABLE {quote(table.name)} ADD COLUMN {column_ddl(column, engine.dialect)}'
+                ))
+                added.append(f'{table.name}.{column.name}')
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    added.append(index.name)
+    ensure_search_index()
+    if {'review.like_count', 'review.comment_count'} & set(added):
+        reconcile_review_counts()
+    if {'review.like_count', 'review.comment_count', 'review.hot_score'} & set(added):
+        decay_hot_scores()
+    migrated = migrate_legacy_state()
+    if migrated:
+        print(f'Migrated {migrated} rows into user_movie_state')
+    if migrated or 'movie_rating_stats' not in existing_tables:
+        rebuild_rating_stats()
+    return added
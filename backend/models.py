@@ -1,7 +1,11 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 db = SQLAlchemy()
 
+# Legacy per-list tables, superseded by UserMovieState. They are no longer
+# written and are kept only so upgrade_schema() can migrate existing rows.
+
 # WatchedItem model for tracking watched movies
 class WatchedItem(db.Model):
     __tablename__ = 'watched_item'
@@ -35,6 +39,105 @@ class WatchLaterItem(db.Model):
         db.UniqueConstraint('user_id', 'movie_id', name='unique_user_movie_watch_later'),
     )
 
+# UserMovieState model: one row per user and movie holding list membership and rating
+class UserMovieState(db.Model):
+    __tablename__ = 'user_movie_state'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    movie_id = db.Column(db.Integer, nullable=False)  # TMDB id, no ForeignKey
+    watched = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    liked = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    watch_later = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    rating = db.Column(db.Integer)
+    # When each flag was last set (None while unset) and when the rating was given
+    watched_at = db.Column(db.DateTime)
+    liked_at = db.Column(db.DateTime)
+    watch_later_at = db.Column(db.DateTime)
+    rated_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'movie_id', name='unique_user_movie_state'),
+        # Partial indexes serving each list's keyset pagination as an index range scan;
+        # the predicates match how each dialect renders the flag filter
+        db.Index('ix_user_movie_state_watched', 'user_id', 'watched_at', 'id',
+                 postgresql_where=db.text('watched'), sqlite_where=db.text('watched = 1')),
+        db.Index('ix_user_movie_state_liked', 'user_id', 'liked_at', 'id',
+                 postgresql_where=db.text('liked'), sqlite_where=db.text('liked = 1')),
+        db.Index('ix_user_movie_state_watch_later', 'user_id', 'watch_later_at', 'id',
+                 postgresql_where=db.text('watch_later'), sqlite_where=db.text('watch_later = 1')),
+    )
+
+    FLAGS = ('watched', 'liked', 'watch_later')
+
+    def set_flag(self, flag, value):
+        """Set or clear a list flag together with its timestamp."""
+        if flag not in self.FLAGS:
+            raise ValueError(f'Unknown flag {flag}')
+        if bool(getattr(self, flag)) == bool(value):
+            return
+        setattr(self, flag, bool(value))
+        setattr(self, f'{flag}_at', datetime.utcnow() if value else None)
+
+    def set_rating(self, rating):
+        self.rating = rating
+        self.rated_at = datetime.utcnow()
+
+    def is_empty(self):
+        """True when the row no longer records anything for the user."""
+        return self.rating is None and not any(getattr(self, flag) for flag in self.FLAGS)
+
+    def to_status(self):
+        return {
+            'rating': self.rating,
+            'watched': bool(self.watched),
+            'liked': bool(self.liked),
+            'watch_later': bool(self.watch_later)
+        }
+
+# MovieRatingStats model: running aggregate of MMDB users' ratings for a movie
+class MovieRatingStats(db.Model):
+    __tablename__ = 'movie_rating_stats'
+    movie_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # TMDB id, no ForeignKey
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum_squares = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Histogram: how many users gave 0, 1, ... 5 stars
+    bucket_0 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bucket_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bucket_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bucket_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bucket_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bucket_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+    BUCKETS = range(6)
+
+    def to_dict(self):
+        """Count, mean, standard deviation and histogram of the ratings."""
+        count = self.rating_count
+        average = self.rating_sum / count if count else None
+        stddev = None
+        if count:
+            stddev = max(self.rating_sum_squares / count - average * average, 0.0) ** 0.5
+        return {
+            'count': count,
+            'average': round(average, 2) if average is not None else None,
+            'stddev': round(stddev, 2) if stddev is not None else None,
+            'histogram': {str(bucket): getattr(self, f'bucket_{bucket}') for bucket in self.BUCKETS}
+        }
+
+# Genre model mirroring TMDB's genre list (id is the TMDB genre id)
+class Genre(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+
+movie_genre = db.Table(
+    'movie_genre',
+    db.Column('movie_id', db.Integer, db.ForeignKey('movie.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True)
+)
+
 # Movie model for storing movie details
 class Movie(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +146,95 @@ class Movie(db.Model):
     overview = db.Column(db.Text)
     poster_path = db.Column(db.String(200))
     vote_average = db.Column(db.Float)
+    # Denormalised TMDB details so list pages can render without calling TMDB
+    backdrop_path = db.Column(db.String(200))
+    release_date = db.Column(db.Date)
+    runtime = db.Column(db.Integer)
+    popularity = db.Column(db.Float)
+    vote_count = db.Column(db.Integer)
+    original_language = db.Column(db.String(10))
+    # When full details were last copied from TMDB; NULL marks an ID-export stub.
+    # Indexed for the autocomplete poll for recently filled rows
+    fetched_at = db.Column(db.DateTime, index=True)
+    genres = db.relationship('Genre', secondary=movie_genre, lazy='selectin', order_by='Genre.id')
+
+    # Scalar columns copied from a TMDB payload (tmdb_id and genres are handled separately)
+    TMDB_COLUMNS = ('title', 'overview', 'poster_path', 'backdrop_path', 'release_date', 'runtime',
+                    'popularity', 'vote_count', 'original_language', 'vote_average', 'fetched_at')
+
+    @staticmethod
+    def tmdb_columns(data):
+        """
+        Map a TMDB payload to Movie column values, for the keys it carries.
+        Only a details payload (one carrying 'genres') sets fetched_at.
+        """
+        values = {}
+        if data.get('title'):
+            values['title'] = data['title']
+        for name in ('overview', 'poster_path', 'backdrop_path', 'runtime', 'popularity', 'vote_count',
+                     'original_language'):
+            if name in data:
+                values[name] = data[name]
+        if 'vote_average' in data:
+            values['vote_average'] = data['vote_average'] or 0.0
+        if 'release_date' in data:
+            try:
+                values['release_date'] = datetime.strptime(data['release_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                values['release_date'] = None
+        if isinstance(data.get('genres'), list):
+            values['fetched_at'] = datetime.utcnow()
+        return values
+
+    @classmethod
+    def from_tmdb(cls, data):
+        """Create a Movie row from a TMDB movie payload."""
+        movie = cls(tmdb_id=data['id'])
+        movie.apply_tmdb(data)
+        return movie
+
+    def apply_tmdb(self, data):
+        """Copy the fields we keep from a TMDB payload onto this row."""
+        for name, value in self.tmdb_columns(data).items():
+            setattr(self, name, value)
+        if isinstance(data.get('genres'), list):
+            genres = []
+            for item in data['genres']:
+                genre = db.session.get(Genre, item['id'])
+                if genre is None:
+                    genre = Genre(id=item['id'], name=item['name'])
+                    db.session.add(genre)
+                elif genre.name != item['name']:
+                    genre.name = item['name']
+                genres.append(genre)
+            self.genres = genres
+        return self
+
+    def to_dict(self):
+        """Serialize in the shape of a TMDB movie payload (keyed by TMDB id)."""
+        return {
+            'id': self.tmdb_id,
+            'title': self.title,
+            'overview': self.overview,
+            'poster_path': self.poster_path,
+            'backdrop_path': self.backdrop_path,
+            'release_date': self.release_date.isoformat() if self.release_date else None,
+            'runtime': self.runtime,
+            'popularity': self.popularity,
+            'original_language': self.original_language,
+            'vote_average': self.vote_average,
+            'vote_count': self.vote_count,
+            'genres': [{'id': genre.id, 'name': genre.name} for genre in self.genres],
+            'genre_ids': [genre.id for genre in self.genres]
+        }
+
+# SyncCheckpoint model recording how far a background sync job has got
+class SyncCheckpoint(db.Model):
+    __tablename__ = 'sync_checkpoint'
+    name = db.Column(db.String(50), primary_key=True)
+    synced_until = db.Column(db.DateTime, nullable=False)
+    position = db.Column(db.BigInteger)  # records consumed, for jobs that resume mid-file
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
 # User model for storing user information
 class User(db.Model):
@@ -76,10 +268,19 @@ class Review(db.Model):
     movie_id = db.Column(db.Integer, db.ForeignKey('movie.id'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)  # Store rating in review as well for consistency
     comment = db.Column(db.Text, nullable=True)  # Review comment (optional)
+    # Denormalised counters, changed with atomic UPDATEs alongside the like/comment rows
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Time-decayed ranking for sort=top, refreshed on like/comment writes and by decay_hot_scores()
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
     __table_args__ = (
         db.UniqueConstraint('user_id', 'movie_id', name='unique_user_movie_review'),
+        # Keyset pagination of a movie's reviews by (created_at, id)
+        db.Index('ix_review_movie_created', 'movie_id', 'created_at', 'id'),
+        # Top-N of a movie's reviews by hot_score is a scan of this index
+        db.Index('ix_review_movie_hot', 'movie_id', 'hot_score', 'created_at', 'id'),
     )
 
 # ReviewLike model for storing user likes on reviews
@@ -103,12 +304,21 @@ class ReviewComment(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
+    __table_args__ = (
+        # Keyset pagination of a review's comments by (created_at, id)
+        db.Index('ix_review_comment_review_created', 'review_id', 'created_at', 'id'),
+    )
+    # Fetch the server-set timestamps in the INSERT/UPDATE (RETURNING on
+    # Postgres) so a comment can be serialized without a refresh query
+    __mapper_args__ = {'eager_defaults': True}
+
 
 # Add relationships after all classes are defined
 User.watch_later_items = db.relationship('WatchLaterItem', backref='user', lazy=True)
 User.liked_items = db.relationship('LikedItem', backref='user', lazy=True)
 User.watched_items = db.relationship('WatchedItem', backref='user', lazy=True)
 User.ratings = db.relationship('Rating', backref='user', lazy=True)
+User.movie_states = db.relationship('UserMovieState', backref='user', lazy=True)
 User.reviews = db.relationship('Review', backref='user', lazy=True)
 User.review_likes = db.relationship('ReviewLike', backref='user', lazy=True)
 User.review_comments = db.relationship('ReviewComment', backref='user', lazy=True)
@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is ordered by a tuple of columns ending in a unique one, and the
+next page starts strictly after the last row's values for those columns,
+so a page costs an index range scan however deep it is. The cursor handed
+to clients is the base64url-encoded JSON of those values.
+
+Datetime values are not compared as decoded from the cursor: SQLite stores
+server-default timestamps as text without microseconds, which never equals
+the bound form of the same instant. The seek reads them back from the
+cursor's row instead, falling back to the cursor's value if it was deleted.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import func, select, tuple_
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'t': value.isoformat()}
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def _decode_value(value):
+    if set(value) == {'t'}:
+        return datetime.fromisoformat(value['t'])
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps(list(values), default=_encode_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Inverse of encode_cursor(); raises ValueError unless it holds size values."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload, object_hook=_decode_value)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return tuple(values)
+
+
+def keyset_page(query, columns, key, limit, cursor=None, descending=False):
+    """
+    One page of query ordered by columns, all ascending or all descending,
+    starting after the cursor. key(row) returns a row's values for columns.
+    Returns (rows, next cursor or None).
+    """
+    if cursor:
+        after = decode_cursor(cursor, len(columns))
+        anchor = [
+            func.coalesce(select(column).where(columns[-1] == after[-1]).correlate(None).scalar_subquery(), value)
+            if isinstance(value, datetime) else value
+            for column, value in zip(columns, after)
+        ]
+        position, anchor = tuple_(*columns), tuple_(*anchor)
+        query = query.filter(position < anchor if descending else position > anchor)
+    query = query.order_by(None).order_by(*[column.desc() if descending else column for column in columns])
+    # One extra row tells whether another page follows
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
@@ -0,0 +1,75 @@
+"""
+Per-movie aggregates of MMDB users' ratings.
+
+movie_rating_stats holds, per TMDB id, the number of ratings, their sum and
+sum of squares (so mean and standard deviation need no scan) and a 0-5 star
+histogram. Every rating change applies its old/new delta with one atomic
+UPDATE in the rater's transaction; rebuild_rating_stats() recomputes the
+whole table from user_movie_state for backfills.
+"""
+from sqlalchemy import case, cast, delete, func, insert, select, update, Integer
+from catalogue import insert_ignoring_conflicts
+from models import db, MovieRatingStats, UserMovieState
+
+
+def rating_bucket(rating):
+    return min(max(int(rating), 0), 5)
+
+
+def rating_delta(old, new):
+    """Column increments for a rating changing from old to new (either may be None)."""
+    delta = {'rating_count': 0, 'rating_sum': 0, 'rating_sum_squares': 0}
+    for rating, sign in ((old, -1), (new, 1)):
+        if rating is None:
+            continue
+        delta['rating_count'] += sign
+        delta['rating_sum'] += sign * rating
+        delta['rating_sum_squares'] += sign * rating * rating
+        bucket = f'bucket_{rating_bucket(rating)}'
+        delta[bucket] = delta.get(bucket, 0) + sign
+    return {column: value for column, value in delta.items() if value}
+
+
+def apply_rating_change(movie_id, old, new):
+    """Apply a rating change to the movie's aggregate; nothing is committed."""
+    delta = rating_delta(old, new)
+    if not delta:
+        return
+    statement = update(MovieRatingStats).where(MovieRatingStats.movie_id == int(movie_id)).values({
+        column: getattr(MovieRatingStats, column) + value for column, value in delta.items()
+    }).execution_options(synchronize_session=False)
+    if db.session.execute(statement).rowcount:
+        return
+    # First rating for this movie: create the zeroed row, then apply
+    insert_ignoring_conflicts(MovieRatingStats.__table__, [{'movie_id': int(movie_id)}])
+    db.session.execute(statement)
+
+
+def movie_rating_stats(movie_id):
+    """The aggregate as a dict, with zero counts for a movie nobody has rated."""
+    stats = db.session.get(MovieRatingStats, int(movie_id))
+    return (stats or MovieRatingStats(
+        rating_count=0, rating_sum=0, rating_sum_squares=0,
+        **{f'bucket_{bucket}': 0 for bucket in MovieRatingStats.BUCKETS}
+    )).to_dict()
+
+
+def rebuild_rating_stats():
+    """Recompute every movie's aggregate from user_movie_state; returns the number of movies."""
+    rating = UserMovieState.rating
+    bucket = cast(rating, Integer)
+    columns = [
+        UserMovieState.movie_id,
+        func.count(rating),
+        func.sum(rating),
+        func.sum(rating * rating)
+    ] + [func.sum(case((bucket == value, 1), else_=0)) for value in MovieRatingStats.BUCKETS]
+    names = ['movie_id', 'rating_count', 'rating_sum', 'rating_sum_squares'] + [
+        f'bucket_{value}' for value in MovieRatingStats.BUCKETS
+    ]
+    db.session.execute(delete(MovieRatingStats))
+    db.session.execute(insert(MovieRatingStats).from_select(
+        names, select(*columns).where(rating.isnot(None)).group_by(UserMovieState.movie_id)
+    ))
+    db.session.commit()
+    return db.session.query(func.count(MovieRatingStats.movie_id)).scalar()
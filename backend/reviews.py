@@ -0,0 +1,265 @@
+"""
+Review listings.
+
+A page of a movie's reviews is read with one query: authors are joined,
+like and comment counts are columns on the review, and whether the viewer
+liked each review is a correlated EXISTS. Pages are keyset-paginated on the
+sort key followed by (created_at, id).
+
+Review.like_count and Review.comment_count are kept current with atomic
+UPDATE ... SET like_count = like_count + 1 statements issued in the same
+transaction as the like or comment row; reconcile_review_counts() recomputes
+them in bulk should they ever drift.
+
+Comments on a review are listed the same way: one query with the author
+joined, keyset-paginated on (created_at, id) oldest first.
+
+Review.hot_score ranks sort=top: likes and comments divided by the review's
+age raised to HOT_GRAVITY, as on link aggregators. It is recomputed in the
+UPDATE that moves a counter, and decay_hot_scores() ages every review in
+batches. Age stops counting at HOT_MAX_AGE, so older reviews settle on a
+fixed score and the decay job stops rewriting them.
+"""
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, delete, exists, false, func, select, update
+from catalogue import insert_ignoring_conflicts
+from models import db, User, Review, ReviewLike, ReviewComment
+from pagination import keyset_page
+
+REVIEW_PAGE_SIZE = 20
+REVIEW_MAX_PAGE_SIZE = 100
+COMMENT_PAGE_SIZE = 50
+COMMENT_MAX_PAGE_SIZE = 200
+# sort name -> (leading sort column name or None, descending)
+REVIEW_SORTS = {
+    'newest': (None, True),
+    'oldest': (None, False),
+    'highest_rated': ('rating', True),
+    'lowest_rated': ('rating', False),
+    'most_liked': ('like_count', True),
+    'top': ('hot_score', True)
+}
+HOT_GRAVITY = 1.8
+HOT_COMMENT_WEIGHT = 2
+HOT_MAX_AGE = timedelta(days=30)
+HOT_DECAY_BATCH = 1000
+# Relative change below which the decay job leaves a stored score alone
+HOT_TOLERANCE = 1e-6
+
+
+def review_query(movie_id, viewer_id=None):
+    """Rows of (Review, author, user_has_liked) for a local Movie id."""
+    if viewer_id:
+        user_has_liked = exists().where(and_(
+            ReviewLike.review_id == Review.id, ReviewLike.user_id == int(viewer_id)
+        ))
+    else:
+        user_has_liked = false()
+    return db.session.query(
+        Review,
+        User.username.label('author'),
+        user_has_liked.label('user_has_liked')
+    ).outerjoin(User, User.id == Review.user_id).filter(Review.movie_id == movie_id)
+
+
+def review_page(movie_id, viewer_id=None, sort='newest', limit=REVIEW_PAGE_SIZE, cursor=None):
+    """
+    One page of a movie's reviews; raises ValueError for an unknown sort or
+    a malformed cursor. Returns (rows, next cursor or None).
+    """
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f'Unknown sort {sort}')
+    leading, descending = REVIEW_SORTS[sort]
+    columns = [Review.created_at, Review.id]
+    if leading:
+        columns.insert(0, getattr(Review, leading))
+
+    def key(row):
+        return tuple(getattr(row.Review, column.key) for column in columns)
+
+    return keyset_page(review_query(movie_id, viewer_id), columns, key, limit, cursor, descending)
+
+
+def all_reviews(movie_id, viewer_id=None):
+    """Every review for a movie, newest first (the unpaginated listing)."""
+    return review_query(movie_id, viewer_id).order_by(Review.created_at.desc(), Review.id.desc()).all()
+
+
+def serialize_review(row):
+    review = row.Review
+    return {
+        'id': review.id,
+        'author': row.author or 'Unknown',
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at.isoformat() if review.created_at else None,
+        'updated_at': review.updated_at.isoformat() if review.updated_at else None,
+        'like_count': review.like_count,
+        'comment_count': review.comment_count,
+        'user_has_liked': bool(row.user_has_liked)
+    }
+
+
+def comment_query(review_id):
+    """Rows of (ReviewComment, author) for a review."""
+    return db.session.query(
+        ReviewComment,
+        User.username.label('author')
+    ).outerjoin(User, User.id == ReviewComment.user_id).filter(ReviewComment.review_id == review_id)
+
+
+def comment_page(review_id, limit=COMMENT_PAGE_SIZE, cursor=None):
+    """
+    One page of a review's comments, oldest first; raises ValueError for a
+    malformed cursor. Returns (rows, next cursor or None).
+    """
+    columns = [ReviewComment.created_at, ReviewComment.id]
+
+    def key(row):
+        return row.ReviewComment.created_at, row.ReviewComment.id
+
+    return keyset_page(comment_query(review_id), columns, key, limit, cursor)
+
+
+def all_comments(review_id):
+    """Every comment on a review, oldest first (the unpaginated listing)."""
+    return comment_query(review_id).order_by(ReviewComment.created_at, ReviewComment.id).all()
+
+
+def serialize_comment(comment, author):
+    # 'author' is what the write routes have always returned, 'username' what the listing has
+    author = author or 'Unknown'
+    return {
+        'id': comment.id,
+        'username': author,
+        'author': author,
+        'comment': comment.comment,
+        'created_at': comment.created_at.isoformat() if comment.created_at else None,
+        'updated_at': comment.updated_at.isoformat() if comment.updated_at else None
+    }
+
+
+def hot_decay(created_at, now=None):
+    """Age factor of the hot score; age is capped at HOT_MAX_AGE."""
+    age = timedelta(0)
+    if created_at is not None:
+        age = min(max((now or datetime.utcnow()) - created_at, timedelta(0)), HOT_MAX_AGE)
+    return (age.total_seconds() / 3600 + 2) ** -HOT_GRAVITY
+
+
+def hot_score(like_count, comment_count, created_at, now=None):
+    """Hot score of a review; the +1 lets unengaged reviews rank by recency."""
+    return (like_count + HOT_COMMENT_WEIGHT * comment_count + 1) * hot_decay(created_at, now)
+
+
+def _adjust_counter(review_id, column, delta):
+    # SET expressions read the row's old values, so the score is built from the adjusted counts
+    counts = {'like_count': Review.like_count, 'comment_count': Review.comment_count}
+    counts[column] = counts[column] + delta
+    review = db.session.get(Review, review_id)
+    decay = hot_decay(review.created_at if review else None)
+    db.session.execute(
+        update(Review).where(Review.id == review_id).values({
+            column: counts[column],
+            'hot_score': (counts['like_count'] + HOT_COMMENT_WEIGHT * counts['comment_count'] + 1) * decay
+        }),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def flip_review_like(review_id, user_id):
+    """
+    Like or unlike a review for the user, adjusting like_count in the same
+    transaction; the delete-or-insert needs no prior read and is safe under
+    concurrent toggles. Nothing is committed. Returns True when now liked.
+    """
+    removed = db.session.execute(
+        delete(ReviewLike).where(ReviewLike.review_id == review_id, ReviewLike.user_id == int(user_id)),
+        execution_options={'synchronize_session': False}
+    )
+    if removed.rowcount:
+        _adjust_counter(review_id, 'like_count', -removed.rowcount)
+        return False
+    added = insert_ignoring_conflicts(ReviewLike.__table__, [{'user_id': int(user_id), 'review_id': review_id}])
+    if added.rowcount:
+        _adjust_counter(review_id, 'like_count', added.rowcount)
+    return True
+
+
+def add_comment(review_id, user_id, text):
+    """Add a comment and bump comment_count; nothing is committed."""
+    comment = ReviewComment(user_id=user_id, review_id=review_id, comment=text)
+    db.session.add(comment)
+    db.session.flush()
+    _adjust_counter(review_id, 'comment_count', 1)
+    return comment
+
+
+def delete_comment(comment):
+    """Delete a comment and lower comment_count; nothing is committed."""
+    review_id = comment.review_id
+    db.session.delete(comment)
+    db.session.flush()
+    _adjust_counter(review_id, 'comment_count', -1)
+
+
+def decay_hot_scores(batch_size=HOT_DECAY_BATCH, now=None):
+    """
+    Recompute hot_score for every review, batch_size rows per transaction in
+    id order, writing only the scores that changed. A review whose counters
+    moved since it was read is skipped; its write already refreshed the
+    score. Returns the number of reviews updated.
+    """
+    now = now or datetime.utcnow()
+    table = Review.__table__
+    statement = update(table).where(
+        table.c.id == bindparam('review_id'),
+        table.c.like_count == bindparam('likes'),
+        table.c.comment_count == bindparam('comments')
+    ).values(hot_score=bindparam('score'))
+    last_id, updated = 0, 0
+    while True:
+        rows = db.session.query(
+            Review.id, Review.like_count, Review.comment_count, Review.created_at, Review.hot_score
+        ).filter(Review.id > last_id).order_by(Review.id).limit(batch_size).all()
+        if not rows:
+            break
+        changes = []
+        for row in rows:
+            score = hot_score(row.like_count, row.comment_count, row.created_at, now)
+            if not math.isclose(score, row.hot_score, rel_tol=HOT_TOLERANCE):
+                changes.append({'review_id': row.id, 'likes': row.like_count,
+                                'comments': row.comment_count, 'score': score})
+        if changes:
+            updated += db.session.execute(statement, changes).rowcount
+        db.session.commit()
+        last_id = rows[-1].id
+    return updated
+
+
+def reconcile_review_counts():
+    """
+    Recompute like_count and comment_count for every review, and hot_score
+    from the corrected counts in the same UPDATE. Returns the number of
+    reviews corrected.
+    """
+    likes = select(func.count(ReviewLike.id)).where(ReviewLike.review_id == Review.id).scalar_subquery()
+    comments = select(func.count(ReviewComment.id)).where(ReviewComment.review_id == Review.id).scalar_subquery()
+    drifted = db.session.query(Review.id, Review.created_at).filter(
+        (Review.like_count != likes) | (Review.comment_count != comments)
+    ).all()
+    if drifted:
+        # The age factor needs a power function SQLite lacks, so it is bound per row
+        now = datetime.utcnow()
+        table = Review.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('review_id')).values(
+                like_count=likes,
+                comment_count=comments,
+                hot_score=(likes + HOT_COMMENT_WEIGHT * comments + 1) * bindparam('decay')
+            ),
+            [{'review_id': row.id, 'decay': hot_decay(row.created_at, now)} for row in drifted]
+        )
+    db.session.commit()
+    return len(drifted)
@@ -1,10 +1,19 @@
 import os
+import math
 import requests
 from datetime import datetime
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
-from models import db, User, Movie, Rating, Review, WatchLaterItem, WatchedItem, LikedItem, ReviewLike, ReviewComment
-from tmdb import fetch_movie_details, get_popular_movies, get_top_rated_movies, get_upcoming_movies, get_movie_genres, get_available_languages, get_user_region
+from autocomplete import autocomplete_index, refresh_index, AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT
+from catalogue import ensure_movie, refresh_from_details
+from discover import discover_engine, refresh_engine, local_discover, total_pages
+from migrations import upgrade_schema
+from rating_stats import movie_rating_stats
+from reviews import review_page, all_reviews, serialize_review, hot_score, flip_review_like, comment_page, all_comments, serialize_comment, add_comment, delete_comment, REVIEW_PAGE_SIZE, REVIEW_MAX_PAGE_SIZE, COMMENT_PAGE_SIZE, COMMENT_MAX_PAGE_SIZE
+from search_index import search_local, is_title_match, merge_results, SEARCH_LOCAL_MIN_HITS
+from models import db, User, Movie, Review, ReviewComment, UserMovieState
+from user_state import get_state, ensure_state, rate, toggle_flag, user_status, user_statuses, list_query, list_page, state_counts, STATUS_BATCH_LIMIT, LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE
+from tmdb import tmdb_client, fanout_executor, project_fields, is_upstream_failure, TMDB_API_KEY, TMDB_BASE_URL, TMDB_DETAILS_LANGUAGE, get_popular_movies, get_top_rated_movies, get_upcoming_movies, get_movie_genres, get_available_languages, get_user_region
 
 # Define blueprints
 auth_bp = Blueprint('auth', __name__)
@@ -30,10 +39,11 @@ def health_check():
 def initialize_database():
     """Initialize database tables - use this once for production setup"""
     try:
-        db.create_all()
+        added = upgrade_schema()
         return jsonify({
             'status': 'success',
-            'message': 'Database tables created successfully'
+            'message': 'Database tables created successfully',
+            'columns_added': added
         })
     except Exception as e:
         return jsonify({
@@ -41,65 +51,116 @@ def initialize_database():
             'message': f'Failed to create database tables: {str(e)}'
         }), 500
 
-# TMDB configuration
-TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
-TMDB_API_KEY = os.getenv('TMDB_API_KEY')
+# Runtime metrics for the shared TMDB client
+@movie_bp.route('/metrics', methods=['GET'])
+def tmdb_metrics():
+    """Return TMDB client counters (requests, latency, connection reuse) and local index sizes."""
+    return jsonify({
+        'tmdb': tmdb_client.stats(),
+        'autocomplete': autocomplete_index.stats(),
+        'discover': discover_engine.stats()
+    })
+
+# Default projections: the TMDB fields the Vue views actually render
+MOVIE_DETAIL_FIELDS = (
+    'id', 'title', 'tagline', 'overview', 'poster_path', 'backdrop_path', 'release_date',
+    'runtime', 'genres', 'vote_average', 'vote_count', 'original_language', 'popularity', 'status',
+    'mmdb_rating'
+)
+MOVIE_LIST_FIELDS = (
+    'id', 'title', 'overview', 'poster_path', 'backdrop_path', 'release_date',
+    'vote_average', 'vote_count', 'genre_ids', 'original_language', 'popularity'
+)
+
+def requested_fields(default):
+    """Resolve the ?fields= projection for a route; fields=all disables trimming."""
+    value = request.args.get('fields')
+    if value is None:
+        return default
+    if value.strip().lower() == 'all':
+        return None
+    fields = tuple(name.strip() for name in value.split(',') if name.strip())
+    return fields or default
+
+@movie_bp.before_request
+def reset_tmdb_request_state():
+    tmdb_client.reset_request_state(route=request.endpoint)
+
+@movie_bp.after_request
+def flag_stale_response(response):
+    """Flag responses built from fallback data while TMDB is unavailable."""
+    source = g.get('stale_source') or ('cache' if tmdb_client.served_stale() else None)
+    if source:
+        response.headers['X-TMDB-Stale'] = source
+    return response
+
+def local_movie_page(query, page, per_page=20):
+    """
+    Build a TMDB-style results page from a Movie query (degraded mode).
+    Rows without fetched details (ID-export stubs) are left out.
+    """
+    g.stale_source = 'local'
+    query = query.filter(Movie.fetched_at.isnot(None))
+    total = query.count()
+    movies = query.offset((max(page, 1) - 1) * per_page).limit(per_page).all()
+    return {
+        'page': page,
+        'results': [movie.to_dict() for movie in movies],
+        'total_pages': max(math.ceil(total / per_page), 1),
+        'total_results': total
+    }
+
+def tmdb_error_response(error):
+    """Map a TMDB client exception to a JSON error response."""
+    status = 502
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        if 400 <= error.response.status_code < 500:
+            status = error.response.status_code
+    return jsonify({'error': str(error)}), status
+
+def optional_user_id():
+    """Return the JWT identity when a valid token is present, otherwise None."""
+    try:
+        from flask_jwt_extended import verify_jwt_in_request
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except:
+        return None
+
+def movie_reviews_page(movie_pk, current_user_id=None):
+    """
+    Serialize one page of a local Movie's reviews from the request's ?sort=,
+    ?limit= and ?cursor= arguments. Returns (reviews, next cursor); raises
+    ValueError for an unknown sort or a malformed cursor.
+    """
+    if movie_pk is None:
+        return [], None
+    limit = min(max(request.args.get('limit', REVIEW_PAGE_SIZE, type=int), 1), REVIEW_MAX_PAGE_SIZE)
+    rows, next_cursor = review_page(
+        movie_pk, current_user_id, request.args.get('sort', 'newest'), limit, request.args.get('cursor')
+    )
+    return [serialize_review(row) for row in rows], next_cursor
 
 # Add /api/movie/<int:movie_id>/reviews route after blueprint definitions
 @movie_bp.route('/<int:movie_id>/reviews', methods=['GET'])
 def get_movie_reviews(movie_id):
     """
-    Return reviews for a movie from local database with interaction data
+    Return a page of reviews for a movie from the local database with interaction data.
+    ?sort= is one of REVIEW_SORTS (default newest); ?limit= and ?cursor= page
+    through the results. ?all=1 returns every review as an array, newest first.
     """
-    current_user_id = None
     # Get current user if authenticated (optional for viewing reviews)
+    current_user_id = optional_user_id()
+    # Only the primary key is needed, which also skips loading the genres
+    movie_pk = db.session.query(Movie.id).filter_by(tmdb_id=movie_id).scalar()
+    if request.args.get('all', '').lower() in ('1', 'true'):
+        rows = all_reviews(movie_pk, current_user_id) if movie_pk is not None else []
+        return jsonify([serialize_review(row) for row in rows])
     try:
-        from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-        verify_jwt_in_request(optional=True)
-        current_user_id = get_jwt_identity()
-    except:
-        pass
-    
-    # Find the movie in local database
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
-    if not movie:
-        return jsonify([])
-    
-    # Get all reviews for this movie
-    reviews = Review.query.filter_by(movie_id=movie.id).order_by(Review.created_at.desc()).all()
-    review_list = []
-    
-    for review in reviews:
-        user = User.query.get(review.user_id)
-        
-        # Count likes for this review
-        like_count = ReviewLike.query.filter_by(review_id=review.id).count()
-        
-        # Count comments for this review
-        comment_count = ReviewComment.query.filter_by(review_id=review.id).count()
-        
-        # Check if current user has liked this review
-        user_has_liked = False
-        if current_user_id:
-            user_has_liked = ReviewLike.query.filter_by(
-                user_id=current_user_id, 
-                review_id=review.id
-            ).first() is not None
-        
-        review_data = {
-            'id': review.id,
-            'author': user.username if user else 'Unknown',
-            'rating': review.rating,
-            'comment': review.comment,
-            'created_at': review.created_at.isoformat() if review.created_at else None,
-            'updated_at': review.updated_at.isoformat() if review.updated_at else None,
-            'like_count': like_count,
-            'comment_count': comment_count,
-            'user_has_liked': user_has_liked
-        }
-        review_list.append(review_data)
-    
-    return jsonify(review_list)
+        reviews, next_cursor = movie_reviews_page(movie_pk, current_user_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': reviews, 'next_cursor': next_cursor})
 
 @movie_bp.route('/<int:movie_id>/reviews', methods=['POST'])
 
@@ -117,30 +178,15 @@ def submit_movie_review(movie_id):
     if not rating or rating < 1 or rating > 5:
         return jsonify({'error': 'Rating must be between 1 and 5'}), 400
     
-    # Find or create movie in local DB
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    # Find or create movie in local DB; it is committed with the changes below
+    movie = ensure_movie(movie_id)
     if not movie:
-        movie_data = fetch_movie_details(movie_id)
-        if not movie_data:
-            return jsonify({'error': 'Movie not found'}), 404
-        movie = Movie(
-            tmdb_id=movie_id,
-            title=movie_data['title'],
-            overview=movie_data.get('overview', ''),
-            poster_path=movie_data.get('poster_path', ''),
-            vote_average=movie_data.get('vote_average', 0.0)
-        )
-        db.session.add(movie)
-        db.session.commit()
+        return jsonify({'error': 'Movie not found'}), 404
     
-    # Update or create rating
-    existing_rating = Rating.query.filter_by(user_id=user_id, movie_id=movie.id).first()
-    if existing_rating:
-        existing_rating.rating = rating
-        existing_rating.updated_at = db.func.now()
-    else:
-        new_rating = Rating(user_id=user_id, movie_id=movie.id, rating=rating)
-        db.session.add(new_rating)
+    # Update the rating and auto-mark as watched when reviewing
+    state = ensure_state(user_id, movie_id, lock=True)
+    rate(state, rating)
+    state.set_flag('watched', True)
     
     # Update or create review (if comment provided)
     if comment:
@@ -150,15 +196,10 @@ def submit_movie_review(movie_id):
             existing_review.comment = comment
             existing_review.updated_at = db.func.now()
         else:
-            new_review = Review(user_id=user_id, movie_id=movie.id, rating=rating, comment=comment)
+            new_review = Review(user_id=user_id, movie_id=movie.id, rating=rating, comment=comment,
+                                hot_score=hot_score(0, 0, None))
             db.session.add(new_review)
     
-    # Auto-mark as watched when reviewing
-    watched_item = WatchedItem.query.filter_by(user_id=user_id, movie_id=movie_id).first()
-    if not watched_item:
-        watched_item = WatchedItem(user_id=user_id, movie_id=movie_id)
-        db.session.add(watched_item)
-    
     try:
         db.session.commit()
         return jsonify({'message': 'Review submitted successfully'}), 200
@@ -166,66 +207,81 @@ def submit_movie_review(movie_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to submit review'}), 500
 
+def serialize_movie_list(rows, flag):
+    """
+    Serialize (UserMovieState, Movie) pairs from one of the user's movie lists
+    ('watched', 'liked', 'watch_later'); TMDB is never called. Movies whose row
+    has no details yet are returned with 'enriched': False until the catalogue
+    is backfilled; movies with no Movie row at all are skipped by the join.
+    """
+    movies = []
+    for state, movie in rows:
+        movie_info = movie.to_dict()
+        added_at = getattr(state, f'{flag}_at')
+        movie_info['added_at'] = added_at.isoformat() if added_at else None
+        movie_info['enriched'] = movie.fetched_at is not None
+        movies.append(movie_info)
+    return movies
+
+def movie_list_response(user_id, flag):
+    """
+    Respond with one page of a user's list: ?limit= (default LIST_PAGE_SIZE)
+    and the opaque ?cursor= from the previous page's next_cursor.
+    ?all=1 keeps the old unpaginated array response for existing clients.
+    """
+    if request.args.get('all', '').lower() in ('1', 'true'):
+        return jsonify(serialize_movie_list(list_query(user_id, flag), flag))
+    limit = min(max(request.args.get('limit', LIST_PAGE_SIZE, type=int), 1), LIST_MAX_PAGE_SIZE)
+    try:
+        rows, next_cursor = list_page(user_id, flag, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'results': serialize_movie_list(rows, flag),
+        'next_cursor': next_cursor,
+        'limit': limit
+    })
+
 # Add a catch-all OPTIONS handler for all /api/user/* routes
 @user_bp.route('/<path:path>', methods=['OPTIONS'])
 
 def user_options(path):
     return '', 200
 
+# Batch status API for decorating movie grids
+@user_bp.route('/status', methods=['POST'])
+
+@jwt_required()
+def get_movie_statuses():
+    """
+    Return the user's list membership and rating for many movies at once.
+    Request JSON: { "movie_ids": [550, 680, ...] } (at most STATUS_BATCH_LIMIT ids)
+    Response: { "statuses": { "550": { "rating": 4, "watched": true, "liked": false, "watch_later": false }, ... } }
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    movie_ids = data.get('movie_ids')
+    if not isinstance(movie_ids, list) or not all(
+            isinstance(movie_id, int) and not isinstance(movie_id, bool) for movie_id in movie_ids):
+        return jsonify({'error': 'movie_ids must be a list of TMDB ids'}), 400
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if len(movie_ids) > STATUS_BATCH_LIMIT:
+        return jsonify({'error': f'At most {STATUS_BATCH_LIMIT} movie_ids per request'}), 400
+
+    statuses = user_statuses(user_id, movie_ids)
+    return jsonify({'statuses': {str(movie_id): status for movie_id, status in statuses.items()}})
+
  # Watched movies API
 @user_bp.route('/watched', methods=['GET', 'OPTIONS'])
 
 @jwt_required()
 def get_watched():
     """
-    Return detailed info for all movies in the user's watched list.
-    If a movie is not in the local Movie table, fetch from TMDB and add it.
+    Return a page of the movies in the user's watched list (?limit=, ?cursor=),
+    or every movie with ?all=1.
     """
     user_id = get_jwt_identity()
-    watched_items = WatchedItem.query.filter_by(user_id=user_id).all()
-    movies = []
-    for item in watched_items:
-        # item.movie_id contains TMDB ID, not local database ID
-        movie = Movie.query.filter_by(tmdb_id=item.movie_id).first()
-        if not movie:
-            # If the movie is not in the local DB, try to fetch from TMDB and add it
-            try:
-                movie_data = fetch_movie_details(item.movie_id)
-                if movie_data:
-                    movie = Movie(
-                        tmdb_id=movie_data['id'],
-                        title=movie_data['title'],
-                        overview=movie_data.get('overview', ''),
-                        poster_path=movie_data.get('poster_path', ''),
-                        vote_average=movie_data.get('vote_average', 0.0)
-                    )
-                    db.session.add(movie)
-                    db.session.commit()
-            except:
-                continue
-        if movie:
-            movie_info = {
-                'id': movie.tmdb_id,
-                'title': movie.title,
-                'overview': movie.overview,
-                'poster_path': movie.poster_path,
-                'vote_average': movie.vote_average,
-                'added_at': item.added_at.isoformat() if hasattr(item, 'added_at') else None
-            }
-            
-            # Try to get genres from TMDB but don't block if it fails
-            try:
-                movie_data = fetch_movie_details(movie.tmdb_id)
-                if movie_data and 'genres' in movie_data:
-                    movie_info['genres'] = movie_data['genres']
-                elif movie_data and 'genre_ids' in movie_data:
-                    movie_info['genre_ids'] = movie_data['genre_ids']
-            except:
-                # If TMDB request fails, just continue without genres
-                pass
-            
-            movies.append(movie_info)
-    return jsonify(movies)
+    return movie_list_response(user_id, 'watched')
 # --- Toggle watched status for a movie for the current user ---
 @user_bp.route('/watched', methods=['POST'])
 
@@ -242,33 +298,12 @@ def toggle_watched():
     if not movie_id:
         return jsonify({'error': 'Missing movie_id'}), 400
 
-    # Find or create movie in local DB
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    # Find or create movie in local DB; it is committed with the changes below
+    movie = ensure_movie(movie_id)
     if not movie:
-        movie_data = fetch_movie_details(movie_id)
-        if not movie_data:
-            return jsonify({'error': 'Movie not found'}), 404
-        movie = Movie(
-            tmdb_id=movie_id,
-            title=movie_data['title'],
-            overview=movie_data.get('overview', ''),
-            poster_path=movie_data.get('poster_path', ''),
-            vote_average=movie_data.get('vote_average', 0.0)
-        )
-        db.session.add(movie)
-        db.session.commit()
+        return jsonify({'error': 'Movie not found'}), 404
 
-    # Check if already in watched
-    watched = WatchedItem.query.filter_by(user_id=user_id, movie_id=movie_id).first()
-    if watched:
-        db.session.delete(watched)
-        db.session.commit()
-        return jsonify({'watched': False})
-    else:
-        watched = WatchedItem(user_id=user_id, movie_id=movie_id)
-        db.session.add(watched)
-        db.session.commit()
-        return jsonify({'watched': True})
+    return jsonify({'watched': toggle_flag(user_id, movie_id, 'watched')})
 
 @movie_bp.route('/popular', methods=['GET'])
 def popular_movies_route():
@@ -276,46 +311,155 @@ def popular_movies_route():
     try:
         page = request.args.get('page', 1, type=int)
         
-        url = f'{TMDB_BASE_URL}/movie/popular'
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'en-GB',
-            'page': page
-        }
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        try:
+            data = tmdb_client.get('movie/popular', {
+                'language': 'en-GB',
+                'page': page
+            }, fields=requested_fields(MOVIE_LIST_FIELDS))
+        except requests.RequestException as e:
+            if not is_upstream_failure(e):
+                raise
+            data = local_movie_page(Movie.query.order_by(Movie.vote_average.desc().nullslast()), page)
         
         if 'results' in data:
-            data['results'] = data['results'][:20]
+            data = dict(data, results=data['results'][:20])
         
         return jsonify(data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def search_page(items, source, fields):
+    """Wrap local search results in a TMDB-style results page."""
+    return project_fields({
+        'page': 1,
+        'results': items,
+        'total_pages': 1,
+        'total_results': len(items),
+        'source': source
+    }, fields)
+
+@movie_bp.route('/autocomplete', methods=['GET'])
+def autocomplete_movies():
+    """Title suggestions from the in-memory catalogue index; never calls TMDB."""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', AUTOCOMPLETE_LIMIT, type=int), 1), AUTOCOMPLETE_MAX_LIMIT)
+    refresh_index(autocomplete_index)
+    return jsonify({'query': query, 'results': autocomplete_index.suggest(query, limit)})
+
 @movie_bp.route('/search', methods=['GET'])
 def search_movies():
-    """Search for movies by query string using TMDB."""
-    query = request.args.get('query', '')
-    response = requests.get(
-        f'{TMDB_BASE_URL}/search/movie',
-        params={
-            'api_key': TMDB_API_KEY,
+    """
+    Search for movies by query string.
+    mode=hybrid (default) answers from the local full-text index when it has
+    enough title matches and otherwise merges in TMDB results; mode=local and
+    mode=tmdb use a single source.
+    """
+    query = request.args.get('query', '').strip()
+    mode = request.args.get('mode', 'hybrid')
+    fields = requested_fields(MOVIE_LIST_FIELDS)
+    if not query:
+        return jsonify(search_page([], 'local', fields))
+
+    local = [] if mode == 'tmdb' else search_local(query)
+    title_hits = [movie for movie in local if is_title_match(query, movie.title)]
+    if mode == 'local' or (mode == 'hybrid' and len(title_hits) >= SEARCH_LOCAL_MIN_HITS):
+        return jsonify(search_page([movie.to_dict() for movie in local], 'local', fields))
+
+    try:
+        data = tmdb_client.get('search/movie', {
             'query': query,
             'language': 'en-GB'
-        }
-    )
-    return jsonify(response.json())
+        }, fields=fields)
+    except requests.RequestException as e:
+        if not is_upstream_failure(e):
+            return tmdb_error_response(e)
+        g.stale_source = 'local'
+        return jsonify(search_page([movie.to_dict() for movie in local], 'local', fields))
+    local_items = project_fields({'results': [movie.to_dict() for movie in title_hits]}, fields)['results']
+    return jsonify(dict(
+        data,
+        results=merge_results(local_items, data.get('results', [])),
+        source='hybrid' if title_hits else 'tmdb'
+    ))
 
 @movie_bp.route('/<int:movie_id>', methods=['GET'])
 def get_movie_details(movie_id):
     """Return details for a specific movie by TMDB id."""
-    response = requests.get(
-        f'{TMDB_BASE_URL}/movie/{movie_id}',
-        params={'api_key': TMDB_API_KEY, 'language': 'en-GB'}
+    fields = requested_fields(MOVIE_DETAIL_FIELDS)
+    try:
+        data = tmdb_client.get(f'movie/{movie_id}', {'language': TMDB_DETAILS_LANGUAGE}, fields=fields)
+        refresh_from_details(Movie.query.filter_by(tmdb_id=movie_id).first(), data)
+    except requests.RequestException as e:
+        movie = Movie.query.filter_by(tmdb_id=movie_id).first() if is_upstream_failure(e) else None
+        if not movie:
+            return tmdb_error_response(e)
+        g.stale_source = 'local'
+        data = movie.to_dict()
+    # MMDB users' rating aggregate is local, so it is projected here rather than by tmdb_client
+    if fields is None or 'mmdb_rating' in fields:
+        data = dict(data, mmdb_rating=movie_rating_stats(movie_id))
+    return jsonify(data)
+
+# The page document carries credits and videos from the same upstream call
+MOVIE_PAGE_FIELDS = MOVIE_DETAIL_FIELDS + ('credits', 'videos')
+PAGE_CAST_LIMIT = 12
+PAGE_CREW_JOBS = ('Director', 'Screenplay', 'Writer', 'Original Music Composer')
+
+def fetch_movie_page_details(movie_id, route):
+    """Fetch details with credits and videos; runs on the fan-out pool."""
+    tmdb_client.reset_request_state(route=route)
+    data = tmdb_client.get(
+        f'movie/{movie_id}',
+        {'language': TMDB_DETAILS_LANGUAGE, 'append_to_response': 'credits,videos'},
+        fields=MOVIE_PAGE_FIELDS
     )
-    return jsonify(response.json())
+    return data, tmdb_client.served_stale()
+
+def trim_page_credits(data):
+    """Keep the top-billed cast and key crew; full credits run to hundreds of rows."""
+    credits = data.get('credits')
+    if not isinstance(credits, dict):
+        return data
+    return dict(data, credits={
+        'cast': (credits.get('cast') or [])[:PAGE_CAST_LIMIT],
+        'crew': [c for c in credits.get('crew') or [] if c.get('job') in PAGE_CREW_JOBS]
+    })
+
+@movie_bp.route('/<int:movie_id>/page', methods=['GET'])
+def get_movie_page(movie_id):
+    """
+    Return everything the movie detail view needs in one document:
+    TMDB details (with credits and videos), the first page of reviews with
+    the cursor for the next one, MMDB users' rating aggregate and the user's
+    state. The TMDB call runs on the fan-out pool while the local queries run here.
+    """
+    details = fanout_executor.submit(fetch_movie_page_details, movie_id, request.endpoint)
+
+    current_user_id = optional_user_id()
+    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    rows, reviews_next_cursor = review_page(movie.id, current_user_id) if movie else ([], None)
+    user_state = user_status(current_user_id, movie_id) if current_user_id else None
+    mmdb_rating = movie_rating_stats(movie_id)
+
+    try:
+        data, stale = details.result()
+        if stale:
+            g.stale_source = 'cache'
+        refresh_from_details(movie, data)
+        data = trim_page_credits(data)
+    except requests.RequestException as e:
+        if not (movie and is_upstream_failure(e)):
+            return tmdb_error_response(e)
+        g.stale_source = 'local'
+        data = movie.to_dict()
+
+    return jsonify({
+        'movie': data,
+        'reviews': [serialize_review(row) for row in rows],
+        'reviews_next_cursor': reviews_next_cursor,
+        'mmdb_rating': mmdb_rating,
+        'user_state': user_state
+    })
 
 @movie_bp.route('/category/<category>', methods=['GET'])
 def get_movies_by_category(category):
@@ -327,6 +471,7 @@ def get_movies_by_category(category):
     vote_average_gte = request.args.get('vote_average_gte', type=float)
     vote_average_lte = request.args.get('vote_average_lte', type=float)
     with_original_language = request.args.get('with_original_language')
+    fields = requested_fields(MOVIE_LIST_FIELDS)
     
     category_mapping = {
         'popular': 'popular',
@@ -338,6 +483,21 @@ def get_movies_by_category(category):
     if category not in category_mapping:
         return jsonify({'error': 'Invalid category'}), 400
     
+    # Answer filtered listings from the in-process discover engine when the catalogue covers the query
+    refresh_engine(discover_engine)
+    local = local_discover(discover_engine, category, page, with_genres, vote_average_gte,
+                           vote_average_lte, with_original_language)
+    if local:
+        ids, total = local
+        movies = {movie.tmdb_id: movie for movie in Movie.query.filter(Movie.tmdb_id.in_(ids)).all()}
+        return jsonify(project_fields({
+            'page': page,
+            'results': [movies[tmdb_id].to_dict() for tmdb_id in ids if tmdb_id in movies],
+            'total_pages': total_pages(total),
+            'total_results': total,
+            'source': 'local'
+        }, fields))
+    
     try:
         # Use discover endpoint for filtered results
         if category == 'popular':
@@ -346,7 +506,8 @@ def get_movies_by_category(category):
                 with_genres=with_genres,
                 vote_average_gte=vote_average_gte,
                 vote_average_lte=vote_average_lte,
-                with_original_language=with_original_language
+                with_original_language=with_original_language,
+                fields=fields
             )
         elif category == 'top-rated':
             data = get_top_rated_movies(
@@ -354,7 +515,8 @@ def get_movies_by_category(category):
                 with_genres=with_genres,
                 vote_average_gte=vote_average_gte,
                 vote_average_lte=vote_average_lte,
-                with_original_language=with_original_language
+                with_original_language=with_original_language,
+                fields=fields
             )
         elif category == 'upcoming':
             # Get user's region based on IP address for region-specific upcoming movies
@@ -365,18 +527,31 @@ def get_movies_by_category(category):
                 vote_average_gte=vote_average_gte,
                 vote_average_lte=vote_average_lte,
                 with_original_language=with_original_language,
-                region=user_region
+                region=user_region,
+                fields=fields
             )
         else:  # now-playing - fallback to original API
             tmdb_category = category_mapping[category]
-            url = f'{TMDB_BASE_URL}/movie/{tmdb_category}'
-            params = {
-                'api_key': TMDB_API_KEY,
-                'language': 'en-GB',
-                'page': page
-            }
-            response = requests.get(url, params=params)
-            data = response.json()
+            try:
+                data = tmdb_client.get(f'movie/{tmdb_category}', {
+                    'language': 'en-GB',
+                    'page': page
+                }, fields=fields)
+            except requests.RequestException:
+                data = None
+
+        if data is None:
+            # TMDB unavailable and nothing cached: serve from the local catalogue
+            query = Movie.query
+            if vote_average_gte is not None:
+                query = query.filter(Movie.vote_average >= vote_average_gte)
+            if vote_average_lte is not None:
+                query = query.filter(Movie.vote_average <= vote_average_lte)
+            if category == 'top-rated':
+                query = query.order_by(Movie.vote_average.desc().nullslast())
+            else:
+                query = query.order_by(Movie.id.desc())
+            data = local_movie_page(query, page)
         
         if data and 'results' in data:
             results = data['results']
@@ -420,54 +595,11 @@ def get_available_languages_route():
 @jwt_required()
 def get_likes():
     """
-    Return detailed info for all movies in the user's likes.
-    If a movie is not in the local Movie table, fetch from TMDB and add it.
+    Return a page of the movies in the user's likes (?limit=, ?cursor=),
+    or every movie with ?all=1.
     """
     user_id = get_jwt_identity()
-    liked_items = LikedItem.query.filter_by(user_id=user_id).all()
-    movies = []
-    for item in liked_items:
-        # item.movie_id contains TMDB ID, not local database ID
-        movie = Movie.query.filter_by(tmdb_id=item.movie_id).first()
-        if not movie:
-            # Fetch from TMDB and add to DB
-            try:
-                movie_data = fetch_movie_details(item.movie_id)
-                if movie_data:
-                    movie = Movie(
-                        tmdb_id=movie_data['id'],
-                        title=movie_data['title'],
-                        overview=movie_data.get('overview', ''),
-                        poster_path=movie_data.get('poster_path', ''),
-                        vote_average=movie_data.get('vote_average', 0.0)
-                    )
-                    db.session.add(movie)
-                    db.session.commit()
-            except:
-                continue
-        if movie:
-            movie_info = {
-                'id': movie.tmdb_id,
-                'title': movie.title,
-                'overview': movie.overview,
-                'poster_path': movie.poster_path,
-                'vote_average': movie.vote_average,
-                'added_at': item.added_at.isoformat() if hasattr(item, 'added_at') else None
-            }
-            
-            # Try to get genres from TMDB but don't block if it fails
-            try:
-                movie_data = fetch_movie_details(movie.tmdb_id)
-                if movie_data and 'genres' in movie_data:
-                    movie_info['genres'] = movie_data['genres']
-                elif movie_data and 'genre_ids' in movie_data:
-                    movie_info['genre_ids'] = movie_data['genre_ids']
-            except:
-                # If TMDB request fails, just continue without genres
-                pass
-            
-            movies.append(movie_info)
-    return jsonify(movies)
+    return movie_list_response(user_id, 'liked')
 
 @user_bp.route('/likes', methods=['POST'])
 
@@ -484,66 +616,12 @@ def toggle_like():
     if not movie_id:
         return jsonify({'error': 'Missing movie_id'}), 400
 
-    # Find or create movie in local DB
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    # Find or create movie in local DB; it is committed with the changes below
+    movie = ensure_movie(movie_id)
     if not movie:
-        movie_data = fetch_movie_details(movie_id)
-        if not movie_data:
-            return jsonify({'error': 'Movie not found'}), 404
-        movie = Movie(
-            tmdb_id=movie_id,
-            title=movie_data['title'],
-            overview=movie_data.get('overview', ''),
-            poster_path=movie_data.get('poster_path', ''),
-            vote_average=movie_data.get('vote_average', 0.0)
-        )
-        db.session.add(movie)
-        db.session.commit()
+        return jsonify({'error': 'Movie not found'}), 404
 
-    # Check if already liked
-    liked = LikedItem.query.filter_by(user_id=user_id, movie_id=movie_id).first()
-    if liked:
-        db.session.delete(liked)
-        db.session.commit()
-        return jsonify({'added': False})
-    else:
-        liked = LikedItem(user_id=user_id, movie_id=movie_id)
-        db.session.add(liked)
-        db.session.commit()
-        return jsonify({'added': True})
-    """
-    Return detailed info for all movies in the user's watch later list.
-    If a movie is not in the local Movie table, fetch from TMDB and add it.
-    """
-    user_id = get_jwt_identity()
-    watch_later_items = WatchLaterItem.query.filter_by(user_id=user_id).all()
-    movies = []
-    for item in watch_later_items:
-        # Try to get movie from local DB
-        movie = Movie.query.filter_by(tmdb_id=item.movie_id).first()
-        if not movie:
-            # Fetch from TMDB and add to DB
-            movie_data = fetch_movie_details(item.movie_id)
-            if movie_data:
-                movie = Movie(
-                    tmdb_id=movie_data['id'],
-                    title=movie_data['title'],
-                    overview=movie_data.get('overview', ''),
-                    poster_path=movie_data.get('poster_path', ''),
-                    vote_average=movie_data.get('vote_average', 0.0)
-                )
-                db.session.add(movie)
-                db.session.commit()
-        if movie:
-            movies.append({
-                'id': movie.tmdb_id,
-                'title': movie.title,
-                'overview': movie.overview,
-                'poster_path': movie.poster_path,
-                'vote_average': movie.vote_average,
-                'added_at': item.added_at.isoformat()
-            })
-    return jsonify(movies)
+    return jsonify({'added': toggle_flag(user_id, movie_id, 'liked')})
 
 
 
@@ -611,39 +689,14 @@ def toggle_watch_later(movie_id):
     user_id = get_jwt_identity()
     user = User.query.get_or_404(user_id)
     
-    # Find movie
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    # Find or create movie in local DB; it is committed with the changes below
+    movie = ensure_movie(movie_id)
     if not movie:
-        # If movie not in database, fetch from TMDB and add it
-        movie_data = fetch_movie_details(movie_id)
-        if not movie_data:
-            return jsonify({'error': 'Movie not found'}), 404
-            
-        movie = Movie(
-            tmdb_id=movie_id,
-            title=movie_data['title'],
-            overview=movie_data.get('overview', ''),
-            poster_path=movie_data.get('poster_path', ''),
-            vote_average=movie_data.get('vote_average', 0.0)
-        )
-        db.session.add(movie)
-        db.session.commit()
-    
-    # Check if movie is already in watch later list
-    watch_later_item = WatchLaterItem.query.filter_by(
-        user_id=user_id, movie_id=movie_id
-    ).first()
+        return jsonify({'error': 'Movie not found'}), 404
     
-    if watch_later_item:
-        db.session.delete(watch_later_item)
-        db.session.commit()
-        return jsonify({'message': 'Removed from watch later', 'added': False})
-    
-    watch_later_item = WatchLaterItem(user_id=user_id, movie_id=movie_id)
-    db.session.add(watch_later_item)
-    db.session.commit()
-    
-    return jsonify({'message': 'Added to watch later', 'added': True})
+    if toggle_flag(user_id, movie_id, 'watch_later'):
+        return jsonify({'message': 'Added to watch later', 'added': True})
+    return jsonify({'message': 'Removed from watch later', 'added': False})
 
 @user_bp.route('/watch-later', methods=['GET', 'OPTIONS'])
 
@@ -653,35 +706,7 @@ def get_watch_later():
     user = User.query.get_or_404(user_id)
     
     # Get user's watch later movies
-    watch_later_items = WatchLaterItem.query.filter_by(user_id=user_id).all()
-    movies = []
-    
-    for item in watch_later_items:
-        movie = Movie.query.filter_by(tmdb_id=item.movie_id).first()
-        if movie:
-            movie_info = {
-                'id': movie.tmdb_id,
-                'title': movie.title,
-                'overview': movie.overview,
-                'poster_path': movie.poster_path,
-                'vote_average': movie.vote_average,
-                'added_at': item.added_at.isoformat()
-            }
-            
-            # Try to get genres from TMDB but don't block if it fails
-            try:
-                movie_data = fetch_movie_details(movie.tmdb_id)
-                if movie_data and 'genres' in movie_data:
-                    movie_info['genres'] = movie_data['genres']
-                elif movie_data and 'genre_ids' in movie_data:
-                    movie_info['genre_ids'] = movie_data['genre_ids']
-            except:
-                # If TMDB request fails, just continue without genres
-                pass
-            
-            movies.append(movie_info)
-    
-    return jsonify(movies)
+    return movie_list_response(user_id, 'watch_later')
 
 
 @user_bp.route('/change-password', methods=['PUT'])
@@ -754,13 +779,16 @@ def toggle_watchlist(movie_id):
 def get_profile():
     user_id = get_jwt_identity()
     user = User.query.get_or_404(user_id)
+    counts = state_counts(user_id)
     
     return jsonify({
         'id': user.id,
         'username': user.username,
         'email': user.email,
-        'watch_later_count': WatchLaterItem.query.filter_by(user_id=user_id).count(),
-        'ratings_count': Rating.query.filter_by(user_id=user_id).count()
+        'watched_count': counts['watched'],
+        'liked_count': counts['liked'],
+        'watch_later_count': counts['watch_later'],
+        'ratings_count': counts['rated']
     })
 
 # --- Movie rating routes ---
@@ -783,38 +811,14 @@ def rate_movie(movie_id):
     if not (0 <= rating_value <= 5):
         return jsonify({'error': 'Rating must be between 0 and 5'}), 400
     
-    # Find or create movie in local DB
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
+    # Find or create movie in local DB; it is committed with the changes below
+    movie = ensure_movie(movie_id)
     if not movie:
-        movie_data = fetch_movie_details(movie_id)
-        if not movie_data:
-            return jsonify({'error': 'Movie not found'}), 404
-        movie = Movie(
-            tmdb_id=movie_id,
-            title=movie_data['title'],
-            overview=movie_data.get('overview', ''),
-            poster_path=movie_data.get('poster_path', ''),
-            vote_average=movie_data.get('vote_average', 0.0)
-        )
-        db.session.add(movie)
-        db.session.commit()
-    
-    # Check if user has already rated this movie
-    existing_rating = Rating.query.filter_by(
-        user_id=user_id, movie_id=movie.id
-    ).first()
+        return jsonify({'error': 'Movie not found'}), 404
     
-    if existing_rating:
-        # Update existing rating
-        existing_rating.rating = rating_value
-    else:
-        # Create new rating
-        new_rating = Rating(
-            user_id=user_id,
-            movie_id=movie.id,
-            rating=rating_value
-        )
-        db.session.add(new_rating)
+    # Create or update the user's rating
+    state = ensure_state(user_id, movie_id, lock=True)
+    rate(state, rating_value)
     
     # IMPORTANT: Also update the rating in Review table if a review exists
     existing_review = Review.query.filter_by(
@@ -828,16 +832,7 @@ def rate_movie(movie_id):
     
     # Auto-add to watched list when rating a movie (if rating > 0)
     if rating_value > 0:
-        existing_watched = WatchedItem.query.filter_by(
-            user_id=user_id, movie_id=movie_id
-        ).first()
-        
-        if not existing_watched:
-            watched_item = WatchedItem(
-                user_id=user_id,
-                movie_id=movie_id
-            )
-            db.session.add(watched_item)
+        state.set_flag('watched', True)
     
     db.session.commit()
     
@@ -856,18 +851,11 @@ def get_movie_rating(movie_id):
     """
     user_id = get_jwt_identity()
     
-    # Find movie in local DB
-    movie = Movie.query.filter_by(tmdb_id=movie_id).first()
-    if not movie:
-        return jsonify({'rating': None})
-    
     # Get user's rating for this movie
-    rating = Rating.query.filter_by(
-        user_id=user_id, movie_id=movie.id
-    ).first()
+    state = get_state(user_id, movie_id)
     
     return jsonify({
-        'rating': rating.rating if rating else None
+        'rating': state.rating if state else None
     })
 
 @user_bp.route('/reviews', methods=['GET', 'OPTIONS'])
@@ -900,25 +888,27 @@ def get_user_reviews():
         reviews.append(review_data)
     
     # Also include ratings without reviews for completeness
-    ratings_without_reviews = db.session.query(Rating, Movie).join(
-        Movie, Rating.movie_id == Movie.id
+    ratings_without_reviews = db.session.query(UserMovieState, Movie).join(
+        Movie, UserMovieState.movie_id == Movie.tmdb_id
     ).filter(
-        Rating.user_id == user_id,
-        ~Rating.movie_id.in_(
+        UserMovieState.user_id == user_id,
+        UserMovieState.rating.isnot(None),
+        ~Movie.id.in_(
             db.session.query(Review.movie_id).filter_by(user_id=user_id)
         )
     ).all()
     
-    for rating, movie in ratings_without_reviews:
+    for state, movie in ratings_without_reviews:
+        rated_at = state.rated_at.isoformat() if state.rated_at else None
         review_data = {
-            'id': f"rating_{rating.id}",  # Distinguish from review IDs
+            'id': f"rating_{state.id}",  # Distinguish from review IDs
             'movie_id': movie.tmdb_id,
             'movie_title': movie.title,
             'movie_poster': movie.poster_path,
-            'rating': rating.rating,
+            'rating': state.rating,
             'comment': None,  # No comment for ratings without reviews
-            'created_at': rating.created_at.isoformat() if rating.created_at else None,
-            'updated_at': rating.updated_at.isoformat() if rating.updated_at else None
+            'created_at': rated_at,
+            'updated_at': rated_at
         }
         reviews.append(review_data)
     
@@ -942,57 +932,37 @@ def toggle_review_like(review_id):
     if not review:
         return jsonify({'error': 'Review not found'}), 404
     
-    # Check if user has already liked this review
-    existing_like = ReviewLike.query.filter_by(
-        user_id=user_id, 
-        review_id=review_id
-    ).first()
-    
-    if existing_like:
-        # Unlike: remove the like
-        db.session.delete(existing_like)
-        db.session.commit()
-        liked = False
-    else:
-        # Like: add a new like
-        new_like = ReviewLike(user_id=user_id, review_id=review_id)
-        db.session.add(new_like)
-        db.session.commit()
-        liked = True
-    
-    # Get updated like count
-    like_count = ReviewLike.query.filter_by(review_id=review_id).count()
+    # Like or unlike; like_count is updated in the same transaction
+    liked = flip_review_like(review_id, user_id)
+    db.session.commit()
     
     return jsonify({
         'liked': liked,
-        'like_count': like_count
+        'like_count': review.like_count
     })
 
 @movie_bp.route('/reviews/<int:review_id>/comments', methods=['GET'])
 def get_review_comments(review_id):
     """
-    Get all comments for a specific review
+    Get a page of comments for a specific review, oldest first, with their
+    authors. ?limit= and ?cursor= page through them; ?all=1 returns every
+    comment as an array.
     """
     # Check if review exists
-    review = Review.query.get(review_id)
-    if not review:
+    if db.session.query(Review.id).filter_by(id=review_id).scalar() is None:
         return jsonify({'error': 'Review not found'}), 404
     
-    # Get all comments for this review
-    comments = ReviewComment.query.filter_by(review_id=review_id).order_by(ReviewComment.created_at.asc()).all()
-    comment_list = []
-    
-    for comment in comments:
-        user = User.query.get(comment.user_id)
-        comment_data = {
-            'id': comment.id,
-            'username': user.username if user else 'Unknown',
-            'comment': comment.comment,
-            'created_at': comment.created_at.isoformat() if comment.created_at else None
-        }
-        comment_list.append(comment_data)
-    
-    return jsonify(comment_list)
+    if request.args.get('all', '').lower() in ('1', 'true'):
+        return jsonify([serialize_comment(row.ReviewComment, row.author) for row in all_comments(review_id)])
+    limit = min(max(request.args.get('limit', COMMENT_PAGE_SIZE, type=int), 1), COMMENT_MAX_PAGE_SIZE)
+    try:
+        rows, next_cursor = comment_page(review_id, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'results': [serialize_comment(row.ReviewComment, row.author) for row in rows],
+        'next_cursor': next_cursor
+    })
 
 @movie_bp.route('/reviews/<int:review_id>/comments', methods=['POST'])
 
@@ -1008,29 +978,20 @@ def add_review_comment(review_id):
     if not comment_text:
         return jsonify({'error': 'Comment text is required'}), 400
     
-    # Check if review exists
-    review = Review.query.get(review_id)
-    if not review:
+    # Check the review exists and fetch the author's name in the same query
+    found = db.session.query(Review, User.username).outerjoin(
+        User, User.id == int(user_id)
+    ).filter(Review.id == review_id).first()
+    if not found:
         return jsonify({'error': 'Review not found'}), 404
     
-    # Create new comment
-    new_comment = ReviewComment(
-        user_id=user_id,
-        review_id=review_id,
-        comment=comment_text
-    )
-    
-    db.session.add(new_comment)
+    # Create new comment; comment_count is updated in the same transaction
+    new_comment = add_comment(review_id, user_id, comment_text)
+    # Serialized before commit, which would expire the loaded row
+    comment_data = serialize_comment(new_comment, found.username)
     db.session.commit()
     
-    # Return the new comment
-    user = User.query.get(user_id)
-    return jsonify({
-        'id': new_comment.id,
-        'author': user.username if user else 'Unknown',
-        'comment': new_comment.comment,
-        'created_at': new_comment.created_at.isoformat()
-    }), 201
+    return jsonify(comment_data), 201
 
 # Review comment management routes
 @movie_bp.route('/review-comments/<int:comment_id>', methods=['PUT'])
@@ -1042,10 +1003,13 @@ def update_review_comment(comment_id):
     user_id = get_jwt_identity()
     data = request.get_json()
     
-    # Check if comment exists and belongs to current user
-    comment = ReviewComment.query.filter_by(id=comment_id, user_id=user_id).first()
-    if not comment:
+    # Check if comment exists and belongs to current user, joining the author's name
+    found = db.session.query(ReviewComment, User.username).outerjoin(
+        User, User.id == ReviewComment.user_id
+    ).filter(ReviewComment.id == comment_id, ReviewComment.user_id == int(user_id)).first()
+    if not found:
         return jsonify({'error': 'Comment not found or you do not have permission to edit it'}), 404
+    comment = found.ReviewComment
     
     # Validate input
     comment_text = data.get('comment', '').strip()
@@ -1055,18 +1019,12 @@ def update_review_comment(comment_id):
     # Update comment
     comment.comment = comment_text
     comment.updated_at = db.func.now()
+    db.session.flush()
     
+    comment_data = serialize_comment(comment, found.username)
     db.session.commit()
     
-    # Return updated comment
-    user = User.query.get(user_id)
-    return jsonify({
-        'id': comment.id,
-        'author': user.username if user else 'Unknown',
-        'comment': comment.comment,
-        'created_at': comment.created_at.isoformat(),
-        'updated_at': comment.updated_at.isoformat()
-    })
+    return jsonify(comment_data)
 
 @movie_bp.route('/review-comments/<int:comment_id>', methods=['DELETE'])
 @jwt_required()
@@ -1081,8 +1039,8 @@ def delete_review_comment(comment_id):
     if not comment:
         return jsonify({'error': 'Comment not found or you do not have permission to delete it'}), 404
     
-    # Delete the comment
-    db.session.delete(comment)
+    # Delete the comment and lower the review's comment_count
+    delete_comment(comment)
     db.session.commit()
     
     return jsonify({'message': 'Comment deleted successfully'})
@@ -1115,11 +1073,10 @@ def update_review(review_id):
     review.comment = comment if comment else None
     review.updated_at = db.func.now()
     
-    # Also update the rating record
-    rating_record = Rating.query.filter_by(user_id=user_id, movie_id=review.movie_id).first()
-    if rating_record:
-        rating_record.rating = rating
-        rating_record.updated_at = db.func.now()
+    # Also update the user's rating
+    state = get_state(user_id, review.movie.tmdb_id, lock=True)
+    if state and state.rating is not None:
+        rate(state, rating)
     
     db.session.commit()
     
@@ -0,0 +1,134 @@
+"""
+Full-text search over the local Movie catalogue.
+
+Postgres uses a GIN expression index over a weighted tsvector of title and
+overview; SQLite uses an external-content FTS5 table kept in step with the
+movie table by triggers. Both are maintained by the database on every
+insert and update, so only a schema change or corruption needs a rebuild.
+Rows without fetched details (ID-export stubs) are never returned.
+"""
+import os
+import re
+from sqlalchemy import event, inspect, text
+from models import db, Movie
+
+SEARCH_LIMIT = 20
+# Hybrid search answers locally once this many results match on title
+SEARCH_LOCAL_MIN_HITS = int(os.getenv('SEARCH_LOCAL_MIN_HITS', '5'))
+
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(overview, '')), 'B')"
+)
+
+SQLITE_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movie_fts USING fts5("
+    "title, overview, content='movie', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_ai AFTER INSERT ON movie BEGIN "
+    "INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview); END",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_ad AFTER DELETE ON movie BEGIN "
+    "INSERT INTO movie_fts(movie_fts, rowid, title, overview) "
+    "VALUES ('delete', old.id, old.title, old.overview); END",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_au AFTER UPDATE OF title, overview ON movie BEGIN "
+    "INSERT INTO movie_fts(movie_fts, rowid, title, overview) "
+    "VALUES ('delete', old.id, old.title, old.overview); "
+    "INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview); END",
+)
+
+
+def query_terms(query):
+    """Lowercased word tokens of a search string; punctuation never reaches the SQL."""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def create_search_index(connection):
+    """Create the dialect's index objects if missing; returns True when something was created."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS movie_search_idx ON movie USING GIN (({PG_VECTOR}))'))
+        return False
+    if dialect == 'sqlite':
+        existed = inspect(connection).has_table('movie_fts')
+        for statement in SQLITE_INDEX_DDL:
+            connection.execute(text(statement))
+        if not existed:
+            # Index rows that were already in the movie table
+            connection.execute(text("INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')"))
+        return not existed
+    return False
+
+
+def ensure_search_index():
+    """Create the search index on an existing database (upgrade_schema calls this)."""
+    with db.engine.begin() as connection:
+        return create_search_index(connection)
+
+
+def rebuild_search_index():
+    """Rebuild the search index from the movie table."""
+    with db.engine.begin() as connection:
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            connection.execute(text('REINDEX INDEX movie_search_idx'))
+        elif dialect == 'sqlite':
+            create_search_index(connection)
+            connection.execute(text("INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')"))
+    return Movie.query.count()
+
+
+@event.listens_for(Movie.__table__, 'after_create')
+def create_index_with_table(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(Movie.__table__, 'before_drop')
+def drop_index_with_table(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS movie_fts'))
+
+
+def search_local(query, limit=SEARCH_LIMIT):
+    """
+    Ranked prefix search over title and overview. Title matches weigh more
+    than overview matches. Returns Movie rows, best first.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        rows = db.session.execute(text(
+            f'SELECT id FROM movie, to_tsquery(\'english\', :q) query '
+            f'WHERE ({PG_VECTOR}) @@ query AND fetched_at IS NOT NULL '
+            f'ORDER BY ts_rank_cd({PG_VECTOR}, query) DESC, vote_average DESC NULLS LAST LIMIT :limit'
+        ), {'q': ' & '.join(f'{term}:*' for term in terms), 'limit': limit})
+    elif dialect == 'sqlite':
+        rows = db.session.execute(text(
+            'SELECT movie_fts.rowid FROM movie_fts JOIN movie ON movie.id = movie_fts.rowid '
+            'WHERE movie_fts MATCH :q AND movie.fetched_at IS NOT NULL '
+            'ORDER BY bm25(movie_fts, 10.0, 1.0) LIMIT :limit'
+        ), {'q': ' '.join(f'"{term}"*' for term in terms), 'limit': limit})
+    else:
+        like = Movie.query.filter(Movie.title.ilike(f'%{query}%'), Movie.fetched_at.isnot(None))
+        return like.order_by(Movie.vote_average.desc()).limit(limit).all()
+    ids = [row[0] for row in rows]
+    movies = {movie.id: movie for movie in Movie.query.filter(Movie.id.in_(ids)).all()} if ids else {}
+    return [movies[movie_id] for movie_id in ids if movie_id in movies]
+
+
+def is_title_match(query, title):
+    """True when every query term prefixes a word of the title (a 'good' hit)."""
+    words = query_terms(title)
+    return all(any(word.startswith(term) for word in words) for term in query_terms(query))
+
+
+def merge_results(local, remote, limit=SEARCH_LIMIT):
+    """Local results first, then TMDB results not already listed, deduplicated by id."""
+    merged, seen = [], set()
+    for item in list(local) + list(remote):
+        if item.get('id') in seen:
+            continue
+        seen.add(item.get('id'))
+        merged.append(item)
+    return merged[:limit]
@@ -0,0 +1,68 @@
+"""
+Unit tests for the in-memory title autocomplete index
+"""
+import unittest
+from collections import namedtuple
+from datetime import date
+from autocomplete import AutocompleteIndex, normalize_title
+
+FakeMovie = namedtuple('FakeMovie', ['id', 'tmdb_id', 'title', 'release_date', 'poster_path', 'popularity'])
+
+
+def movie(row_id, tmdb_id, title, popularity, year=2000):
+    return FakeMovie(row_id, tmdb_id, title, date(year, 1, 1), f'/{tmdb_id}.jpg', popularity)
+
+
+class TestAutocompleteIndex(unittest.TestCase):
+    """Test cases for prefix, fuzzy and incremental lookups"""
+
+    def setUp(self):
+        self.index = AutocompleteIndex()
+        self.index.build([
+            movie(1, 155, 'The Dark Knight', 90.0, 2008),
+            movie(2, 49026, 'The Dark Knight Rises', 70.0, 2012),
+            movie(3, 550, 'Fight Club', 60.0, 1999),
+            movie(4, 1, 'Amélie', 30.0, 2001),
+            movie(5, 2, 'Darkman', 5.0, 1990)
+        ])
+
+    def test_prefix_matches_any_word_ranked_by_popularity(self):
+        """Test prefixes match word starts and rank by popularity"""
+        self.assertEqual([s['id'] for s in self.index.suggest('dark')], [155, 49026, 2])
+        self.assertEqual(self.index.suggest('knight ri')[0]['id'], 49026)
+        self.assertEqual([s['id'] for s in self.index.suggest('d', limit=2)], [155, 49026])
+        self.assertEqual(self.index.suggest('amelie')[0]['title'], 'Amélie')
+        self.assertEqual(self.index.suggest('fight')[0]['year'], 1999)
+
+    def test_typos_fall_back_to_trigrams(self):
+        """Test misspelt queries still find the closest titles"""
+        self.assertEqual(self.index.suggest('fihgt club')[0]['id'], 550)
+        self.assertEqual(self.index.suggest('zzzzzz'), [])
+
+    def test_incremental_add_and_stats(self):
+        """Test rows added later are searchable and the footprint is reported"""
+        before = self.index.stats()['memory_bytes']
+        self.index.suggest('f')
+        self.index.add([movie(6, 680, 'Fargo', 80.0)])
+
+        self.assertEqual([s['id'] for s in self.index.suggest('f')], [680, 550])
+        stats = self.index.stats()
+        self.assertEqual(stats['movies'], 6)
+        self.assertEqual(stats['max_id'], 6)
+        self.assertGreater(stats['memory_bytes'], before)
+
+    def test_updated_rows_replace_their_entries(self):
+        """Test re-adding a row updates its suggestion and drops the old title's keys"""
+        self.index.add([movie(3, 550, 'Fight Club', 65.0, 1999)])
+        self.assertEqual(self.index.suggest('fight')[0]['popularity'], 65.0)
+        self.index.add([movie(4, 1, 'Le Fabuleux Destin', 30.0, 2001)])
+        self.assertEqual(self.index.suggest('amelie'), [])
+        self.assertEqual(self.index.suggest('fabuleux')[0]['id'], 1)
+        self.assertEqual(self.index.stats()['movies'], 5)
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title('  Amélie:  Le Fabuleux—Destin! '), 'amelie le fabuleux destin')
+
+
+if __name__ == '__main__':
+    unittest.main()
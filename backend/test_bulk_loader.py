@@ -0,0 +1,82 @@
+"""
+Unit tests for the TMDB ID export bulk loader
+"""
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from flask import Flask
+from models import db, Movie, SyncCheckpoint
+from bulk_loader import load_id_export
+
+
+def create_test_app():
+    """Create Flask app for testing"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+class TestIdExportLoader(unittest.TestCase):
+    """Test cases for streaming, batching and resuming an ID export"""
+
+    def setUp(self):
+        self.app = create_test_app()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Movie(tmdb_id=5, title='Existing Title', popularity=99.0))
+            db.session.commit()
+        handle, self.path = tempfile.mkstemp(suffix='.json.gz')
+        os.close(handle)
+        with gzip.open(self.path, 'wt', encoding='utf-8') as export:
+            for movie_id in range(1, 31):
+                export.write(json.dumps({
+                    'adult': movie_id == 7, 'id': movie_id, 'original_title': f'Movie {movie_id}',
+                    'popularity': movie_id / 10, 'video': False
+                }) + '\n')
+            export.write('not json\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_load_applies_cutoff_and_skips_existing(self):
+        """Test adult and unpopular titles are skipped and existing rows kept"""
+        messages = []
+        with self.app.app_context():
+            summary = load_id_export(self.path, min_popularity=0.5, batch_size=8, progress=messages.append)
+
+            self.assertEqual(summary['read'], 30)
+            # ids 5..30 pass the cutoff, minus the adult id 7 and the existing id 5
+            self.assertEqual(summary['inserted'], 24)
+            self.assertEqual(Movie.query.count(), 25)
+            self.assertEqual(Movie.query.filter_by(tmdb_id=5).first().title, 'Existing Title')
+            self.assertIsNone(Movie.query.filter_by(tmdb_id=7).first())
+        self.assertEqual(len(messages), 4)
+
+    def test_interrupted_load_resumes_from_checkpoint(self):
+        """Test a second run continues after the last committed batch"""
+        def interrupt(message):
+            raise KeyboardInterrupt
+
+        with self.app.app_context():
+            with self.assertRaises(KeyboardInterrupt):
+                load_id_export(self.path, batch_size=10, progress=interrupt)
+            self.assertEqual(Movie.query.count(), 10)
+            checkpoint = db.session.get(SyncCheckpoint, f'id_export:{os.path.basename(self.path)}')
+            self.assertEqual(checkpoint.position, 11)
+
+            summary = load_id_export(self.path, batch_size=10, progress=lambda message: None)
+            self.assertEqual(summary['resumed_from'], 11)
+            self.assertEqual(summary['read'], 19)
+            self.assertEqual(Movie.query.count(), 29)
+
+
+if __name__ == '__main__':
+    unittest.main()
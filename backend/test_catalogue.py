@@ -0,0 +1,241 @@
+"""
+Unit tests for the local movie catalogue helpers
+"""
+import unittest
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from unittest.mock import patch
+from flask import Flask
+from models import db, Movie, Genre, SyncCheckpoint
+import tmdb
+from tmdb import tmdb_client
+from catalogue import ensure_movies, ensure_movie, sync_catalogue, SYNC_CHECKPOINT
+
+
+def create_test_app():
+    """Create Flask app for testing"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def details(movie_id, title, genres=()):
+    """A TMDB details payload for the fetch mock"""
+    return {'data': {'id': movie_id, 'title': title, 'release_date': '1999-10-15',
+                     'genres': [{'id': gid, 'name': name} for gid, name in genres]},
+            'source': 'tmdb', 'error': None}
+
+
+class TestEnsureMovies(unittest.TestCase):
+    """Test cases for the bulk Movie upsert"""
+
+    def setUp(self):
+        self.app = create_test_app()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Movie(tmdb_id=550, title='Fight Club', fetched_at=datetime(2024, 1, 1)))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    @patch('catalogue.fetch_movie_details_many')
+    def test_known_ids_are_not_fetched(self, mock_fetch):
+        """Test ids already in the catalogue resolve without calling TMDB"""
+        with self.app.app_context():
+            movies = ensure_movies([550, '550'])
+        mock_fetch.assert_not_called()
+        self.assertEqual(list(movies), [550])
+
+    @patch('catalogue.fetch_movie_details_many')
+    def test_misses_are_inserted_in_callers_transaction(self, mock_fetch):
+        """Test only misses are fetched and new rows are not committed"""
+        mock_fetch.return_value = {
+            680: details(680, 'Pulp Fiction', [(80, 'Crime'), (53, 'Thriller')]),
+            13: details(13, 'Forrest Gump', [(18, 'Drama')]),
+            0: {'data': None, 'source': None, 'error': '404'}
+        }
+        with self.app.app_context():
+            movies = ensure_movies([550, 680, 13, 0, 'x'])
+            self.assertEqual(mock_fetch.call_args[0][0], [680, 13, 0])
+            self.assertEqual(set(movies), {550, 680, 13})
+            self.assertEqual(sorted(genre.name for genre in movies[680].genres), ['Crime', 'Thriller'])
+            self.assertIsNotNone(movies[13].fetched_at)
+            db.session.rollback()
+            self.assertIsNone(Movie.query.filter_by(tmdb_id=680).first())
+
+    @patch('catalogue.fetch_movie_details_many')
+    def test_stub_rows_are_filled_in_place(self, mock_fetch):
+        """Test ID-export stubs are fetched and updated, and still returned when the fetch fails"""
+        mock_fetch.return_value = {
+            77: details(77, 'Spirited Away', [(16, 'Animation')]),
+            78: {'data': None, 'source': None, 'error': 'timeout'}
+        }
+        with self.app.app_context():
+            db.session.add_all([Movie(tmdb_id=77, title='千と千尋の神隠し'), Movie(tmdb_id=78, title='Stub')])
+            db.session.commit()
+            movies = ensure_movies([550, 77, 78])
+            self.assertEqual(mock_fetch.call_args[0][0], [77, 78])
+            self.assertEqual(movies[77].title, 'Spirited Away')
+            self.assertIsNotNone(movies[77].fetched_at)
+            self.assertEqual([genre.name for genre in movies[77].genres], ['Animation'])
+            self.assertEqual(movies[78].title, 'Stub')
+            self.assertEqual(Movie.query.count(), 3)
+
+    @patch('tmdb.tmdb_client.get')
+    def test_slow_fetch_is_not_dropped(self, mock_get):
+        """Test a miss is created even when TMDB answers after the fan-out deadline"""
+        def slow_get(path, params=None, **kwargs):
+            time.sleep(0.2)
+            return details(77, 'Slow Movie')['data']
+        mock_get.side_effect = slow_get
+        fetch_many = tmdb.fetch_movie_details_many
+
+        def short_deadline(ids, **kwargs):
+            # Stand-in for TMDB_FANOUT_DEADLINE, shorter than the response
+            kwargs.setdefault('timeout', 0.05)
+            return fetch_many(ids, **kwargs)
+
+        with self.app.app_context(), patch('catalogue.fetch_movie_details_many', side_effect=short_deadline):
+            movie = ensure_movie(77)
+            self.assertIsNotNone(movie)
+            self.assertEqual(movie.title, 'Slow Movie')
+
+    @patch('catalogue.fetch_movie_details_many')
+    def test_concurrent_insert_does_not_conflict(self, mock_fetch):
+        """Test a row inserted by another request meanwhile is reused, not duplicated"""
+        def fetch(ids, **kwargs):
+            # Another request creates the movie while TMDB is being called
+            with db.engine.begin() as conn:
+                conn.execute(Movie.__table__.insert(), {'tmdb_id': 680, 'title': 'Pulp Fiction'})
+            return {680: details(680, 'Pulp Fiction', [(80, 'Crime')])}
+        mock_fetch.side_effect = fetch
+
+        with self.app.app_context():
+            movie = ensure_movie(680)
+            db.session.commit()
+            self.assertEqual(movie.title, 'Pulp Fiction')
+            self.assertEqual(Movie.query.filter_by(tmdb_id=680).count(), 1)
+            self.assertEqual(Genre.query.count(), 1)
+
+
+class StubChangesHandler(BaseHTTPRequestHandler):
+    """TMDB stand-in serving a two-page change feed and movie details"""
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    pages = {1: [550, 680], 2: [13]}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests_seen.append((url.path, query))
+        status, body = 200, None
+        if url.path == '/3/movie/changes':
+            page = int(query['page'][0])
+            body = {'page': page, 'total_pages': len(self.pages),
+                    'results': [{'id': movie_id, 'adult': False} for movie_id in self.pages[page]]}
+        elif url.path == '/3/movie/550':
+            body = {'id': 550, 'title': 'Fight Club', 'vote_average': 8.8, 'poster_path': '/new.jpg',
+                    'genres': [{'id': 18, 'name': 'Drama'}]}
+        else:
+            status, body = 404, {'status_message': 'The resource you requested could not be found.'}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCatalogueSync(unittest.TestCase):
+    """Test cases for the change-feed catalogue sync against a stub TMDB server"""
+
+    def setUp(self):
+        tmdb_client.invalidate()
+        tmdb_client.breaker.reset()
+        StubChangesHandler.requests_seen = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubChangesHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = patch.object(tmdb_client, 'base_url',
+                                     f'http://127.0.0.1:{self.server.server_address[1]}/3')
+        self.base_url.start()
+        self.app = create_test_app()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Movie(tmdb_id=550, title='Fight Club', vote_average=8.4, poster_path='/old.jpg'))
+            db.session.add(Movie(tmdb_id=13, title='Forrest Gump', vote_average=8.5))
+            db.session.commit()
+
+    def tearDown(self):
+        self.base_url.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        tmdb_client.invalidate()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_sync_refreshes_only_changed_movies_we_hold(self):
+        """Test changed rows are refetched, unknown ids skipped and the checkpoint stored"""
+        now = datetime(2024, 5, 20, 12, 0)
+        with self.app.app_context():
+            summary = sync_catalogue(now=now, batch_size=1)
+
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            self.assertEqual(movie.vote_average, 8.8)
+            self.assertEqual(movie.poster_path, '/new.jpg')
+            self.assertIsNotNone(movie.fetched_at)
+            self.assertEqual(db.session.get(SyncCheckpoint, SYNC_CHECKPOINT).synced_until, now)
+
+        self.assertEqual(summary['changed'], 3)
+        self.assertEqual(summary['held'], 2)
+        self.assertEqual(summary['refreshed'], 1)
+        self.assertTrue(summary['checkpoint_advanced'])
+        paths = [path for path, query in StubChangesHandler.requests_seen]
+        self.assertNotIn('/3/movie/680', paths)
+        self.assertEqual(paths.count('/3/movie/changes'), 2)
+
+    def test_sync_skips_rows_deleted_mid_run(self):
+        """Test a held movie deleted before its batch is re-read does not abort the run"""
+        now = datetime(2024, 5, 20, 12, 0)
+
+        def fetch(ids, **kwargs):
+            with db.engine.begin() as conn:
+                conn.execute(Movie.__table__.delete().where(Movie.__table__.c.tmdb_id == 13))
+            return {tmdb_id: details(tmdb_id, f'Movie {tmdb_id}') for tmdb_id in ids}
+
+        with self.app.app_context(), patch('catalogue.fetch_movie_details_many', side_effect=fetch):
+            summary = sync_catalogue(now=now)
+            self.assertEqual(Movie.query.filter_by(tmdb_id=550).one().title, 'Movie 550')
+
+        self.assertEqual(summary['refreshed'], 1)
+        self.assertTrue(summary['checkpoint_advanced'])
+
+    def test_sync_resumes_from_checkpoint(self):
+        """Test the change window starts at the stored checkpoint"""
+        now = datetime(2024, 5, 20, 12, 0)
+        with self.app.app_context():
+            db.session.add(SyncCheckpoint(name=SYNC_CHECKPOINT, synced_until=now - timedelta(days=3)))
+            db.session.commit()
+            summary = sync_catalogue(now=now)
+
+        path, query = StubChangesHandler.requests_seen[0]
+        self.assertEqual(query['start_date'], ['2024-05-17'])
+        self.assertEqual(query['end_date'], ['2024-05-20'])
+        self.assertEqual(summary['window_start'], '2024-05-17T12:00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Unit tests for the local discover engine
+"""
+import unittest
+from datetime import date
+from unittest.mock import patch
+from discover import DiscoverEngine, local_discover, total_pages
+
+ROWS = [
+    # tmdb_id, vote_average, vote_count, popularity, release_date, original_language
+    (550, 8.4, 26000, 60.0, date(1999, 10, 15), 'en'),
+    (680, 8.5, 27000, 70.0, date(1994, 9, 10), 'en'),
+    (13, 8.5, 26000, 90.0, date(1994, 7, 6), 'en'),
+    (129, 8.5, 15000, 80.0, date(2001, 7, 20), 'ja'),
+    (900, None, 0, 5.0, date(2030, 1, 1), 'fr'),
+    (901, 6.0, 10, 1.0, None, 'fr')
+]
+LINKS = [(550, 18), (680, 80), (680, 53), (13, 18), (13, 35), (129, 16), (129, 14), (900, 18)]
+
+
+class TestDiscoverEngine(unittest.TestCase):
+    """Test cases for vectorised discover filters and sort orders"""
+
+    def setUp(self):
+        self.engine = DiscoverEngine()
+        self.engine.build(ROWS, LINKS)
+
+    def test_popularity_sort_and_paging(self):
+        """Test the default sort and page slicing"""
+        self.assertEqual(self.engine.discover(per_page=3), ([13, 129, 680], 6))
+        self.assertEqual(self.engine.discover(page=2, per_page=3), ([550, 900, 901], 6))
+
+    def test_filters_match_tmdb_semantics(self):
+        """Test genre AND/OR, vote range and language filters"""
+        self.assertEqual(self.engine.discover(with_genres='18,35')[0], [13])
+        self.assertEqual(self.engine.discover(with_genres='80|16')[0], [129, 680])
+        self.assertEqual(self.engine.discover(with_genres='18,999')[0], [])
+        self.assertEqual(self.engine.discover(vote_average_gte=8.45, vote_average_lte=9)[0], [13, 129, 680])
+        self.assertEqual(self.engine.discover(with_original_language='fr')[0], [900, 901])
+        self.assertEqual(self.engine.discover(with_original_language='de')[0], [])
+
+    def test_top_rated_and_upcoming_orders(self):
+        """Test vote-average ordering with a vote floor, and upcoming release order"""
+        ids, total = self.engine.discover(sort_by='vote_average.desc', vote_count_gte=1000)
+        self.assertEqual(ids, [680, 13, 129, 550])
+        ids, _ = self.engine.discover(sort_by='primary_release_date.asc', release_date_gte=date(2000, 1, 1))
+        self.assertEqual(ids, [129, 900])
+
+    def test_local_discover_requires_coverage(self):
+        """Test queries matching too few movies are left to TMDB"""
+        self.assertIsNone(local_discover(self.engine, 'popular'))
+        with patch('discover.DISCOVER_MIN_MATCHES', 1):
+            self.assertEqual(local_discover(self.engine, 'top-rated', with_genres='18'), ([13, 550], 2))
+            self.assertIsNone(local_discover(self.engine, 'popular', with_genres='18', page=2))
+            # TMDB's own ranking is never replaced by the catalogue's subset
+            self.assertIsNone(local_discover(self.engine, 'popular'))
+            self.assertIsNone(local_discover(self.engine, 'now-playing'))
+        self.assertIsNone(local_discover(DiscoverEngine(), 'popular'))
+        self.assertEqual(total_pages(0), 1)
+        self.assertEqual(total_pages(10**6), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,9 @@ from datetime import datetime
 from werkzeug.security import check_password_hash
 from flask import Flask
 from flask_jwt_extended import JWTManager
-from models import db, User, Movie, Rating, Review, WatchLaterItem, LikedItem
+from sqlalchemy import inspect, text
+from models import db, User, Movie, Genre, Rating, Review, WatchLaterItem, LikedItem
+from migrations import upgrade_schema
 
 
 def create_test_app():
@@ -114,6 +116,47 @@ class TestDatabaseModels(unittest.TestCase):
             self.assertEqual(saved_movie.title, 'Fight Club')
             self.assertEqual(saved_movie.vote_average, 8.4)
 
+    def test_movie_from_tmdb_payload(self):
+        """Test Movie rows copy the denormalised TMDB details"""
+        payload = {
+            'id': 680, 'title': 'Pulp Fiction', 'release_date': '1994-09-10', 'runtime': 154,
+            'popularity': 61.2, 'original_language': 'en',
+            'genres': [{'id': 80, 'name': 'Crime'}, {'id': 53, 'name': 'Thriller'}]
+        }
+        with self.app.app_context():
+            db.session.add(Movie.from_tmdb(payload))
+            db.session.add(Movie.from_tmdb(dict(payload, id=500, title='Reservoir Dogs')))
+            db.session.commit()
+
+            movie = Movie.query.filter_by(tmdb_id=680).first()
+            self.assertIsNotNone(movie.fetched_at)
+            self.assertEqual(Genre.query.count(), 2)
+            data = movie.to_dict()
+            self.assertEqual(data['release_date'], '1994-09-10')
+            self.assertEqual(data['genre_ids'], [53, 80])
+
+    def test_upgrade_schema_adds_missing_columns(self):
+        """Test upgrade_schema adds new model columns to an existing table"""
+        with self.app.app_context():
+            db.drop_all()
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    'CREATE TABLE movie (id INTEGER PRIMARY KEY, tmdb_id INTEGER NOT NULL UNIQUE, '
+                    'title VARCHAR(200) NOT NULL, overview TEXT, poster_path VARCHAR(200), vote_average FLOAT)'
+                ))
+            added = upgrade_schema()
+
+            self.assertIn('movie.fetched_at', added)
+            self.assertIn('movie.runtime', added)
+            columns = {column['name'] for column in inspect(db.engine).get_columns('movie')}
+            self.assertTrue({'release_date', 'popularity', 'original_language'} <= columns)
+            self.assertEqual(upgrade_schema(), [])
+
+            # Indexes added to a model after its table exists are created too
+            with db.engine.begin() as conn:
+                conn.execute(text('DROP INDEX ix_user_movie_state_liked'))
+            self.assertEqual(upgrade_schema(), ['ix_user_movie_state_liked'])
+
     def test_rating_model_creation(self):
         """Test Rating model creation and relationships"""
         with self.app.app_context():
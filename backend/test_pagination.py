@@ -0,0 +1,28 @@
+"""
+Unit tests for keyset pagination cursors
+"""
+import unittest
+from datetime import datetime
+from pagination import encode_cursor, decode_cursor
+
+
+class TestCursor(unittest.TestCase):
+    """Test cases for encode_cursor/decode_cursor"""
+
+    def test_round_trip_keeps_datetimes(self):
+        """Test datetimes and plain values survive the round trip"""
+        values = (4, datetime(2024, 5, 6, 7, 8, 9, 123456), 42)
+        cursor = encode_cursor(values)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor, 3), values)
+
+    def test_invalid_cursor(self):
+        """Test malformed or wrongly sized cursors raise ValueError"""
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor', 2)
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor((1, 2, 3)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
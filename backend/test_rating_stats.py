@@ -0,0 +1,79 @@
+"""
+Unit tests for per-movie rating aggregates
+"""
+import unittest
+from flask import Flask
+from models import db, User, MovieRatingStats, UserMovieState
+from rating_stats import rating_delta, apply_rating_change, movie_rating_stats, rebuild_rating_stats
+from user_state import ensure_state, rate
+
+
+class TestRatingStats(unittest.TestCase):
+    """Test cases for rating_stats"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)]
+        for user in self.users:
+            user.set_password('testpassword')
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_rating_delta(self):
+        """Test a changed rating moves one count between buckets and leaves rating_count alone"""
+        self.assertEqual(rating_delta(None, 4), {
+            'rating_count': 1, 'rating_sum': 4, 'rating_sum_squares': 16, 'bucket_4': 1
+        })
+        self.assertEqual(rating_delta(4, 2), {
+            'rating_sum': -2, 'rating_sum_squares': -12, 'bucket_4': -1, 'bucket_2': 1
+        })
+        self.assertEqual(rating_delta(3, 3), {})
+
+    def test_rate_keeps_stats_in_step(self):
+        """Test rating and re-rating through rate() matches a full rebuild"""
+        for user, rating in zip(self.users, (5, 3, 4)):
+            rate(ensure_state(user.id, 550), rating)
+        rate(ensure_state(self.users[1].id, 550), 1)
+        db.session.commit()
+
+        stats = movie_rating_stats(550)
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['average'], 3.33)
+        self.assertEqual(stats['histogram'], {'0': 0, '1': 1, '2': 0, '3': 0, '4': 1, '5': 1})
+        self.assertEqual(rebuild_rating_stats(), 1)
+        self.assertEqual(movie_rating_stats(550), stats)
+
+    def test_unrated_movie(self):
+        """Test a movie nobody rated reports zeros without creating a row"""
+        stats = movie_rating_stats(680)
+        self.assertEqual((stats['count'], stats['average']), (0, None))
+        self.assertEqual(MovieRatingStats.query.count(), 0)
+
+    def test_rebuild_replaces_drifted_rows(self):
+        """Test rebuild recomputes from user_movie_state and drops movies with no ratings"""
+        db.session.add(UserMovieState(user_id=self.users[0].id, movie_id=550, rating=2))
+        db.session.add(UserMovieState(user_id=self.users[1].id, movie_id=550, rating=4))
+        db.session.add(UserMovieState(user_id=self.users[2].id, movie_id=680, watched=True))
+        db.session.commit()
+        apply_rating_change(680, None, 5)
+        db.session.commit()
+
+        self.assertEqual(rebuild_rating_stats(), 1)
+        self.assertEqual(movie_rating_stats(550)['count'], 2)
+        self.assertEqual(movie_rating_stats(550)['stddev'], 1.0)
+        self.assertEqual(movie_rating_stats(680)['count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
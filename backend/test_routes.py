@@ -4,10 +4,18 @@ Unit tests for Flask API routes
 import unittest
 import json
 import os
+import requests
+import threading
+from datetime import datetime, timedelta
 from unittest.mock import patch, Mock
 from flask import Flask
+from sqlalchemy import event, update
 from flask_jwt_extended import JWTManager
-from models import db, User, Movie, Rating, Review
+from models import db, User, Movie, Review, ReviewLike, ReviewComment, UserMovieState
+from tmdb import tmdb_client
+from autocomplete import autocomplete_index, AUTOCOMPLETE_REBUILD_SECONDS
+from discover import discover_engine, refresh_engine, DISCOVER_REBUILD_SECONDS
+from reviews import decay_hot_scores, hot_score, reconcile_review_counts
 
 
 def create_test_app():
@@ -37,6 +45,10 @@ class TestMovieAPI(unittest.TestCase):
     
     def setUp(self):
         """Set up test fixtures before each test method"""
+        tmdb_client.invalidate()
+        tmdb_client.breaker.reset()
+        autocomplete_index.reset()
+        discover_engine.reset()
         # Create test Flask app
         self.app = create_test_app()
         self.client = self.app.test_client()
@@ -58,7 +70,8 @@ class TestMovieAPI(unittest.TestCase):
                 title='Fight Club',
                 overview='A ticking-time-bomb insomniac...',
                 vote_average=8.4,
-                poster_path='/pB8BM7pdSp6B6Ih7QZ4DrQ3PmJK.jpg'
+                poster_path='/pB8BM7pdSp6B6Ih7QZ4DrQ3PmJK.jpg',
+                fetched_at=datetime(2024, 1, 1)
             )
             db.session.add(self.test_movie)
             db.session.commit()
@@ -86,7 +99,7 @@ class TestMovieAPI(unittest.TestCase):
         self.assertIn('status', data)
         self.assertEqual(data['status'], 'healthy')
 
-    @patch('routes.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_get_popular_movies(self, mock_get):
         """Test popular movies endpoint"""
         # Arrange
@@ -114,7 +127,7 @@ class TestMovieAPI(unittest.TestCase):
         self.assertIn('results', data)
         self.assertEqual(len(data['results']), 1)
 
-    @patch('routes.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_search_movies(self, mock_get):
         """Test movie search endpoint"""
         # Arrange
@@ -140,6 +153,249 @@ class TestMovieAPI(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('results', data)
 
+    def test_autocomplete_picks_up_new_movies(self):
+        """Test autocomplete answers from the catalogue and indexes rows added later"""
+        with patch.object(tmdb_client, 'get') as mock_get:
+            first = json.loads(self.client.get('/api/movie/autocomplete?q=fig').data)
+            with self.app.app_context():
+                db.session.add(Movie(tmdb_id=10, title='Fight Night', popularity=1.0, fetched_at=datetime.utcnow()))
+                # ID-export stubs stay out of the index until their details arrive
+                db.session.add(Movie(tmdb_id=11, title='Fight Stub', popularity=50.0))
+                db.session.commit()
+            with patch('autocomplete.AUTOCOMPLETE_REFRESH_SECONDS', 0):
+                second = json.loads(self.client.get('/api/movie/autocomplete?q=fight&limit=5').data)
+
+        mock_get.assert_not_called()
+        self.assertEqual([movie['id'] for movie in first['results']], [550])
+        self.assertEqual([movie['id'] for movie in second['results']], [10, 550])
+
+        # The stub keeps its id when its details arrive; the fetched_at poll finds it
+        with self.app.app_context():
+            Movie.query.filter_by(tmdb_id=11).one().apply_tmdb({'title': 'Fight Stub', 'genres': []})
+            db.session.commit()
+        with patch('autocomplete.AUTOCOMPLETE_REFRESH_SECONDS', 0):
+            third = json.loads(self.client.get('/api/movie/autocomplete?q=fight&limit=5').data)
+        self.assertEqual([movie['id'] for movie in third['results']], [11, 10, 550])
+
+    def test_autocomplete_rebuilds_in_background(self):
+        """Test a stale index is rebuilt once, off the request, from column rows only"""
+        self.client.get('/api/movie/autocomplete?q=fig')
+        with self.app.app_context():
+            db.session.add(Movie(tmdb_id=10, title='Fight Night', popularity=1.0, fetched_at=datetime.utcnow()))
+            db.session.commit()
+        threads, statements = [], []
+        real_thread = threading.Thread
+
+        def start_thread(*args, **kwargs):
+            thread = real_thread(*args, **kwargs)
+            threads.append(thread)
+            return thread
+
+        def count(*args):
+            statements.append(args[2])
+
+        autocomplete_index.built_at -= AUTOCOMPLETE_REBUILD_SECONDS
+        with self.app.app_context(), patch('autocomplete.threading.Thread', side_effect=start_thread):
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                autocomplete_index.rebuilding = True
+                # A rebuild already running: the old index keeps serving
+                stale = json.loads(self.client.get('/api/movie/autocomplete?q=fight&limit=5').data)
+                autocomplete_index.rebuilding = False
+                self.client.get('/api/movie/autocomplete?q=fight&limit=5')
+                self.client.get('/api/movie/autocomplete?q=fight&limit=5')
+                for thread in threads:
+                    thread.join(5)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+
+        self.assertEqual([movie['id'] for movie in stale['results']], [550])
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(autocomplete_index.rebuilding)
+        self.assertFalse([statement for statement in statements if 'genre' in statement])
+        fresh = json.loads(self.client.get('/api/movie/autocomplete?q=fight&limit=5').data)
+        self.assertEqual([movie['id'] for movie in fresh['results']], [10, 550])
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_category_served_by_local_discover(self, mock_get):
+        """Test filtered category pages come from the catalogue once it covers the query"""
+        with self.app.app_context():
+            db.session.add(Movie.from_tmdb({'id': 680, 'title': 'Pulp Fiction', 'vote_average': 8.5,
+                                            'vote_count': 27000, 'popularity': 70.0, 'original_language': 'en',
+                                            'genres': [{'id': 80, 'name': 'Crime'}]}))
+            db.session.add(Movie.from_tmdb({'id': 13, 'title': 'Forrest Gump', 'vote_average': 8.5,
+                                            'vote_count': 26000, 'popularity': 90.0, 'original_language': 'en',
+                                            'genres': [{'id': 18, 'name': 'Drama'}]}))
+            # An ID-export stub: no details fetched, so never a discover result
+            db.session.add(Movie(tmdb_id=77, title='Export 77', popularity=99.0, vote_average=9.0,
+                                 original_language='en'))
+            db.session.commit()
+
+        with patch('discover.DISCOVER_MIN_MATCHES', 1):
+            response = self.client.get('/api/movie/category/popular?with_genres=80&vote_average_gte=8')
+            mock_get.assert_not_called()
+            stubs = json.loads(self.client.get('/api/movie/category/popular?vote_average_gte=8').data)
+        data = json.loads(response.data)
+        self.assertEqual(data['source'], 'local')
+        self.assertEqual([movie['id'] for movie in data['results']], [680])
+        self.assertEqual(data['total_results'], 1)
+        self.assertEqual([movie['id'] for movie in stubs['results']], [13, 680, 550])
+
+    def test_discover_rebuilds_in_background(self):
+        """Test a stale discover snapshot is rebuilt once, off the request, while the old one serves"""
+        with self.app.app_context():
+            refresh_engine(discover_engine)
+            db.session.add(Movie.from_tmdb({'id': 680, 'title': 'Pulp Fiction', 'vote_average': 8.5,
+                                            'popularity': 70.0, 'genres': [{'id': 80, 'name': 'Crime'}]}))
+            db.session.commit()
+            threads = []
+            real_thread = threading.Thread
+
+            def start_thread(*args, **kwargs):
+                thread = real_thread(*args, **kwargs)
+                threads.append(thread)
+                return thread
+
+            discover_engine.built_at -= DISCOVER_REBUILD_SECONDS
+            with patch('discover.threading.Thread', side_effect=start_thread):
+                discover_engine.rebuilding = True
+                refresh_engine(discover_engine)
+                # A rebuild already running: the old snapshot keeps serving
+                self.assertEqual(discover_engine.stats()['movies'], 1)
+                discover_engine.rebuilding = False
+                refresh_engine(discover_engine)
+                refresh_engine(discover_engine)
+                for thread in threads:
+                    thread.join(5)
+
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(discover_engine.rebuilding)
+        self.assertEqual(discover_engine.stats()['movies'], 2)
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_search_hybrid_merges_local_and_tmdb(self, mock_get):
+        """Test search answers locally with enough hits and otherwise merges TMDB results"""
+        mock_response = Mock()
+        mock_response.json.return_value = {
+            'page': 1,
+            'results': [{'id': 550, 'title': 'Fight Club'}, {'id': 807, 'title': 'Se7en'}],
+            'total_results': 2
+        }
+        mock_get.return_value = mock_response
+
+        with patch('routes.SEARCH_LOCAL_MIN_HITS', 1):
+            local = json.loads(self.client.get('/api/movie/search?query=fight').data)
+        mock_get.assert_not_called()
+        self.assertEqual(local['source'], 'local')
+        self.assertEqual([movie['id'] for movie in local['results']], [550])
+
+        merged = json.loads(self.client.get('/api/movie/search?query=fight').data)
+        self.assertEqual(merged['source'], 'hybrid')
+        self.assertEqual([movie['id'] for movie in merged['results']], [550, 807])
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_movie_details_default_projection(self, mock_get):
+        """Test details are trimmed to the rendered fields unless fields= overrides it"""
+        mock_response = Mock()
+        mock_response.json.return_value = {
+            'id': 550,
+            'title': 'Fight Club',
+            'runtime': 139,
+            'production_companies': [{'id': 508, 'name': 'Regency Enterprises'}],
+            'spoken_languages': [{'iso_639_1': 'en'}]
+        }
+        mock_get.return_value = mock_response
+
+        trimmed = json.loads(self.client.get('/api/movie/550').data)
+        custom = json.loads(self.client.get('/api/movie/550?fields=id,title').data)
+        full = json.loads(self.client.get('/api/movie/550?fields=all').data)
+
+        self.assertEqual(trimmed, {'id': 550, 'title': 'Fight Club', 'runtime': 139, 'mmdb_rating': {
+            'count': 0, 'average': None, 'stddev': None, 'histogram': {str(star): 0 for star in range(6)}
+        }})
+        self.assertEqual(custom, {'id': 550, 'title': 'Fight Club'})
+        self.assertIn('production_companies', full)
+        metrics = json.loads(self.client.get('/api/movie/metrics').data)
+        self.assertGreater(metrics['tmdb']['projection']['movie.get_movie_details']['bytes_saved'], 0)
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_movie_details_fall_back_to_local_catalogue(self, mock_get):
+        """Test details are served from the Movie table when TMDB is down"""
+        mock_get.side_effect = requests.ConnectionError('TMDB down')
+
+        response = self.client.get('/api/movie/550')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('X-TMDB-Stale'), 'local')
+        self.assertEqual(json.loads(response.data)['title'], 'Fight Club')
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_degraded_listings_skip_stub_rows(self, mock_get):
+        """Test listings served from the catalogue while TMDB is down leave out ID-export stubs"""
+        mock_get.side_effect = requests.ConnectionError('TMDB down')
+        with self.app.app_context():
+            db.session.add(Movie(tmdb_id=13, title='Forrest Gump', fetched_at=datetime(2024, 1, 1)))
+            for tmdb_id in range(900, 925):
+                db.session.add(Movie(tmdb_id=tmdb_id, title=f'Export {tmdb_id}', popularity=1.0))
+            db.session.commit()
+
+        for url in ('/api/movie/popular', '/api/movie/category/popular', '/api/movie/category/top-rated'):
+            response = self.client.get(url)
+            data = json.loads(response.data)
+            self.assertEqual(response.headers.get('X-TMDB-Stale'), 'local', url)
+            self.assertEqual(sorted(movie['id'] for movie in data['results']), [13, 550], url)
+            self.assertEqual(data['total_results'], 2, url)
+        # Rated rows come before unrated ones on every dialect
+        top = json.loads(self.client.get('/api/movie/category/top-rated').data)
+        self.assertEqual([movie['id'] for movie in top['results']], [550, 13])
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_movie_details_unknown_movie_when_tmdb_down(self, mock_get):
+        """Test an unavailable TMDB with no local row returns a gateway error"""
+        mock_get.side_effect = requests.ConnectionError('TMDB down')
+        response = self.client.get('/api/movie/999')
+        self.assertEqual(response.status_code, 502)
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_movie_page_document(self, mock_get):
+        """Test the page endpoint returns details, reviews and user state together"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            'id': 550,
+            'title': 'Fight Club',
+            'production_companies': [{'id': 508}],
+            'credits': {
+                'cast': [{'name': f'Actor {i}'} for i in range(30)],
+                'crew': [{'name': 'David Fincher', 'job': 'Director'}, {'name': 'Grip', 'job': 'Grip'}]
+            },
+            'videos': {'results': [{'key': 'abc', 'site': 'YouTube'}]}
+        }
+        mock_get.return_value = mock_response
+        with self.app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            db.session.add(Review(user_id=user.id, movie_id=movie.id, rating=4, comment='Great'))
+            db.session.add(UserMovieState(user_id=user.id, movie_id=550, rating=4, watched=True))
+            db.session.commit()
+        token = self.get_auth_token()
+
+        response = self.client.get('/api/movie/550/page',
+                                   headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args[1]['params']['append_to_response'], 'credits,videos')
+        self.assertNotIn('production_companies', data['movie'])
+        self.assertEqual(len(data['movie']['credits']['cast']), 12)
+        self.assertEqual(data['movie']['credits']['crew'], [{'name': 'David Fincher', 'job': 'Director'}])
+        self.assertEqual(data['reviews'][0]['comment'], 'Great')
+        self.assertEqual(data['user_state'], {'rating': 4, 'watched': True, 'liked': False, 'watch_later': False})
+
+        anonymous = json.loads(self.client.get('/api/movie/550/page').data)
+        self.assertIsNone(anonymous['user_state'])
+
     def test_rate_movie_unauthorized(self):
         """Test rating a movie without authentication"""
         response = self.client.post('/api/movie/550/rate', json={
@@ -154,14 +410,14 @@ class TestMovieAPI(unittest.TestCase):
         headers = {'Authorization': f'Bearer {token}'}
         
         # Rate the movie
-        with patch('routes.fetch_movie_details') as mock_fetch:
-            mock_fetch.return_value = {
+        with patch('catalogue.fetch_movie_details_many') as mock_fetch:
+            mock_fetch.return_value = {550: {'data': {
                 'id': 550,
                 'title': 'Fight Club',
                 'overview': 'Test overview',
                 'poster_path': '/test.jpg',
                 'vote_average': 8.4
-            }
+            }, 'source': 'tmdb', 'error': None}}
             
             response = self.client.post('/api/movie/550/rate', 
                                       json={'rating': 4},
@@ -171,6 +427,410 @@ class TestMovieAPI(unittest.TestCase):
         data = json.loads(response.data)
         self.assertTrue(data['success'])
         self.assertEqual(data['rating'], 4)
+        with self.app.app_context():
+            state = UserMovieState.query.filter_by(movie_id=550).one()
+            self.assertEqual(state.to_status(), {'rating': 4, 'watched': True, 'liked': False, 'watch_later': False})
+
+    def test_rating_routes_update_movie_rating_stats(self):
+        """Test rate, review and review edits fold their rating change into mmdb_rating"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        self.client.post('/api/movie/550/rate', json={'rating': 2}, headers=headers)
+        self.client.post('/api/movie/550/reviews', json={'rating': 4, 'comment': 'Better second time'},
+                         headers=headers)
+        with self.app.app_context():
+            review_id = Review.query.one().id
+        self.client.put(f'/api/movie/reviews/{review_id}', json={'rating': 5, 'comment': 'Classic'}, headers=headers)
+
+        with patch('tmdb.tmdb_client.get') as mock_get:
+            mock_get.return_value = {'id': 550, 'title': 'Fight Club'}
+            data = json.loads(self.client.get('/api/movie/550').data)
+        self.assertEqual(data['mmdb_rating']['count'], 1)
+        self.assertEqual(data['mmdb_rating']['average'], 5)
+        self.assertEqual(data['mmdb_rating']['histogram']['5'], 1)
+        self.assertEqual(sum(data['mmdb_rating']['histogram'].values()), 1)
+
+    def test_list_toggles_share_one_state_row(self):
+        """Test like and watch-later toggles update a single user_movie_state row"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        liked = self.client.post('/api/user/likes', json={'movie_id': 550}, headers=headers)
+        later = self.client.post('/api/movie/550/watch-later', headers=headers)
+        self.assertTrue(json.loads(liked.data)['added'])
+        self.assertTrue(json.loads(later.data)['added'])
+        with self.app.app_context():
+            self.assertEqual(UserMovieState.query.count(), 1)
+        likes = json.loads(self.client.get('/api/user/likes', headers=headers).data)
+        self.assertEqual([movie['id'] for movie in likes['results']], [550])
+        profile = json.loads(self.client.get('/api/user/profile', headers=headers).data)
+        self.assertEqual((profile['liked_count'], profile['watch_later_count'], profile['watched_count']), (1, 1, 0))
+
+        self.client.post('/api/user/likes', json={'movie_id': 550}, headers=headers)
+        self.client.post('/api/movie/550/watch-later', headers=headers)
+        with self.app.app_context():
+            # A row that records nothing is removed
+            self.assertEqual(UserMovieState.query.count(), 0)
+
+    def test_batch_status_uses_one_query(self):
+        """Test /user/status answers a whole grid with a constant number of queries"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            db.session.add(UserMovieState(user_id=user.id, movie_id=550, rating=5, watched=True))
+            db.session.add(UserMovieState(user_id=user.id, movie_id=680, liked=True))
+            db.session.commit()
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                response = self.client.post('/api/user/status', json={'movie_ids': list(range(600, 620)) + [550, 680, 550]},
+                                            headers=headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+
+        self.assertEqual(response.status_code, 200)
+        statuses = json.loads(response.data)['statuses']
+        self.assertEqual(len(statuses), 22)
+        self.assertEqual(statuses['550'], {'rating': 5, 'watched': True, 'liked': False, 'watch_later': False})
+        self.assertTrue(statuses['680']['liked'])
+        self.assertEqual(statuses['600'], {'rating': None, 'watched': False, 'liked': False, 'watch_later': False})
+        self.assertEqual(len(statements), 1)
+
+        self.assertEqual(self.client.post('/api/user/status', json={'movie_ids': '550'}, headers=headers).status_code, 400)
+        too_many = self.client.post('/api/user/status', json={'movie_ids': list(range(501))}, headers=headers)
+        self.assertEqual(too_many.status_code, 400)
+
+    def test_watched_list_renders_from_catalogue(self):
+        """Test list items are served from Movie rows without calling TMDB"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            # A row whose details were never fetched still renders, unenriched
+            Movie.query.filter_by(tmdb_id=550).one().fetched_at = None
+            db.session.add(Movie.from_tmdb({
+                'id': 680, 'title': 'Pulp Fiction', 'release_date': '1994-09-10', 'runtime': 154,
+                'genres': [{'id': 80, 'name': 'Crime'}]
+            }))
+            db.session.add(UserMovieState(user_id=user.id, movie_id=550, watched=True))
+            db.session.add(UserMovieState(user_id=user.id, movie_id=680, watched=True))
+            db.session.commit()
+        token = self.get_auth_token()
+
+        with patch.object(tmdb_client, 'get') as mock_get:
+            response = self.client.get('/api/user/watched',
+                                       headers={'Authorization': f'Bearer {token}'})
+
+        mock_get.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        movies = {movie['id']: movie for movie in json.loads(response.data)['results']}
+        self.assertFalse(movies[550]['enriched'])
+        self.assertEqual(movies[550]['genres'], [])
+        self.assertTrue(movies[680]['enriched'])
+        self.assertEqual(movies[680]['genres'], [{'id': 80, 'name': 'Crime'}])
+        self.assertEqual(movies[680]['release_date'], '1994-09-10')
+        self.assertEqual(movies[680]['runtime'], 154)
+
+    def test_movie_reviews_one_query_per_page(self):
+        """Test review pages cost a constant number of queries and page by cursor"""
+        with self.app.app_context():
+            viewer = User.query.filter_by(username='testuser').first()
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            created = datetime(2024, 1, 1)
+            for i in range(6):
+                author = User(username=f'critic{i}', email=f'critic{i}@example.com', password_hash='x')
+                db.session.add(author)
+                db.session.flush()
+                review = Review(user_id=author.id, movie_id=movie.id, rating=i % 5 + 1, comment=f'Review {i}',
+                                created_at=created + timedelta(hours=i))
+                db.session.add(review)
+                db.session.flush()
+                for liker in User.query.filter(User.username.like('critic%')).limit(i):
+                    db.session.add(ReviewLike(user_id=liker.id, review_id=review.id))
+                db.session.add(ReviewComment(user_id=viewer.id, review_id=review.id, comment='Agreed'))
+                if i == 2:
+                    db.session.add(ReviewLike(user_id=viewer.id, review_id=review.id))
+            db.session.commit()
+            # The rows above bypassed the counters
+            self.assertEqual(reconcile_review_counts(), 6)
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                first = json.loads(self.client.get('/api/movie/550/reviews?limit=4', headers=headers).data)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        # The Movie lookup and the review page itself
+        self.assertEqual(len(statements), 2)
+
+        self.assertEqual([review['comment'] for review in first['results']],
+                         ['Review 5', 'Review 4', 'Review 3', 'Review 2'])
+        self.assertEqual(first['results'][0]['author'], 'critic5')
+        self.assertEqual(first['results'][0]['comment_count'], 1)
+        self.assertEqual([review['user_has_liked'] for review in first['results']], [False, False, False, True])
+        second = json.loads(self.client.get(f'/api/movie/550/reviews?limit=4&cursor={first["next_cursor"]}',
+                                            headers=headers).data)
+        self.assertEqual([review['comment'] for review in second['results']], ['Review 1', 'Review 0'])
+        self.assertIsNone(second['next_cursor'])
+
+        liked = json.loads(self.client.get('/api/movie/550/reviews?sort=most_liked&limit=2').data)
+        self.assertEqual([review['like_count'] for review in liked['results']], [5, 4])
+        more = json.loads(self.client.get(f'/api/movie/550/reviews?sort=most_liked&cursor={liked["next_cursor"]}').data)
+        # Review 2 also has the viewer's like; ties fall back to newest first
+        self.assertEqual([(review['comment'], review['like_count']) for review in more['results']],
+                         [('Review 3', 3), ('Review 2', 3), ('Review 1', 1), ('Review 0', 0)])
+        legacy = json.loads(self.client.get('/api/movie/550/reviews?all=1').data)
+        self.assertEqual(len(legacy), 6)
+        self.assertEqual(self.client.get('/api/movie/550/reviews?sort=loudest').status_code, 400)
+
+    def walk_pages(self, url):
+        """Follow next_cursor from url to the end, returning every result's id"""
+        ids, page = [], json.loads(self.client.get(url).data)
+        ids.extend(item['id'] for item in page['results'])
+        while page['next_cursor'] and len(ids) < 50:
+            page = json.loads(self.client.get(f'{url}&cursor={page["next_cursor"]}').data)
+            ids.extend(item['id'] for item in page['results'])
+        return ids
+
+    def test_review_pages_over_server_default_timestamps(self):
+        """Test review pages reach every row when created_at comes from the database"""
+        with self.app.app_context():
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            review_ids = []
+            for i in range(5):
+                author = User(username=f'critic{i}', email=f'critic{i}@example.com', password_hash='x')
+                db.session.add(author)
+                db.session.flush()
+                review = Review(user_id=author.id, movie_id=movie.id, rating=3, comment=f'Review {i}')
+                db.session.add(review)
+                db.session.flush()
+                review_ids.append(review.id)
+            db.session.commit()
+
+        self.assertEqual(self.walk_pages('/api/movie/550/reviews?limit=2'), review_ids[::-1])
+        self.assertEqual(self.walk_pages('/api/movie/550/reviews?sort=oldest&limit=2'), review_ids)
+
+    def test_comment_pages_over_server_default_timestamps(self):
+        """Test comment pages reach every comment when created_at comes from the database"""
+        with self.app.app_context():
+            viewer = User.query.filter_by(username='testuser').first()
+            review = Review(user_id=viewer.id, movie_id=Movie.query.filter_by(tmdb_id=550).one().id, rating=4)
+            db.session.add(review)
+            db.session.flush()
+            comment_ids = []
+            for i in range(5):
+                comment = ReviewComment(user_id=viewer.id, review_id=review.id, comment=f'Comment {i}')
+                db.session.add(comment)
+                db.session.flush()
+                comment_ids.append(comment.id)
+            db.session.commit()
+            review_id = review.id
+
+        self.assertEqual(self.walk_pages(f'/api/movie/reviews/{review_id}/comments?limit=2'), comment_ids)
+
+    def test_top_reviews_by_hot_score(self):
+        """Test sort=top follows the decayed hot score, which likes refresh and the decay job ages"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            # (age, likes): an old well-liked review, a fresh quiet one, a day-old liked one, an ancient one
+            for i, (age, likes) in enumerate([(timedelta(days=20), 3), (timedelta(hours=1), 0),
+                                               (timedelta(days=1), 2), (timedelta(days=400), 0)]):
+                author = User(username=f'critic{i}', email=f'critic{i}@example.com', password_hash='x')
+                db.session.add(author)
+                db.session.flush()
+                db.session.add(Review(user_id=author.id, movie_id=movie.id, rating=4, comment=f'Review {i}',
+                                      like_count=likes, created_at=now - age))
+            db.session.commit()
+            self.assertEqual(decay_hot_scores(batch_size=3, now=now), 4)
+            self.assertEqual(decay_hot_scores(batch_size=3, now=now), 0)
+            # Past HOT_MAX_AGE a score no longer decays, so a later run leaves those rows alone
+            self.assertEqual(decay_hot_scores(now=now + timedelta(days=30)), 3)
+            decay_hot_scores(now=now)
+            ancient_id = Review.query.filter_by(comment='Review 3').one().id
+
+        top = json.loads(self.client.get('/api/movie/550/reviews?sort=top&limit=2').data)
+        self.assertEqual([review['comment'] for review in top['results']], ['Review 1', 'Review 2'])
+        rest = json.loads(self.client.get(f'/api/movie/550/reviews?sort=top&cursor={top["next_cursor"]}').data)
+        self.assertEqual([review['comment'] for review in rest['results']], ['Review 0', 'Review 3'])
+
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        for _ in range(4):
+            self.client.post(f'/api/movie/reviews/{ancient_id}/comments', json={'comment': 'Still great'},
+                             headers=headers)
+        top = json.loads(self.client.get('/api/movie/550/reviews?sort=top').data)
+        self.assertEqual([review['comment'] for review in top['results']][2:], ['Review 3', 'Review 0'])
+
+    def test_review_comments_page_with_joined_authors(self):
+        """Test comment pages cost a constant number of queries and writes do not re-read the author"""
+        with self.app.app_context():
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            author = User(username='critic', email='critic@example.com', password_hash='x')
+            db.session.add(author)
+            db.session.flush()
+            review = Review(user_id=author.id, movie_id=movie.id, rating=4, comment='Classic')
+            db.session.add(review)
+            db.session.flush()
+            for i in range(5):
+                db.session.add(ReviewComment(user_id=author.id, review_id=review.id, comment=f'Comment {i}',
+                                             created_at=datetime(2024, 1, 1) + timedelta(hours=i)))
+            db.session.commit()
+            review_id = review.id
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                first = json.loads(self.client.get(f'/api/movie/reviews/{review_id}/comments?limit=3').data)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        # The Review lookup and the comment page itself
+        self.assertEqual(len(statements), 2)
+        self.assertEqual([comment['comment'] for comment in first['results']], ['Comment 0', 'Comment 1', 'Comment 2'])
+        self.assertEqual(first['results'][0]['username'], 'critic')
+        second = json.loads(self.client.get(
+            f'/api/movie/reviews/{review_id}/comments?limit=3&cursor={first["next_cursor"]}').data)
+        self.assertEqual([comment['comment'] for comment in second['results']], ['Comment 3', 'Comment 4'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(json.loads(self.client.get(f'/api/movie/reviews/{review_id}/comments?all=1').data)), 5)
+        self.assertEqual(self.client.get(f'/api/movie/reviews/{review_id}/comments?cursor=bad').status_code, 400)
+
+        statements.clear()
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                added = json.loads(self.client.post(f'/api/movie/reviews/{review_id}/comments',
+                                                    json={'comment': 'Agreed'}, headers=headers).data)
+                edited = json.loads(self.client.put(f'/api/movie/review-comments/{added["id"]}',
+                                                    json={'comment': 'Edited'}, headers=headers).data)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual((added['author'], added['username']), ('testuser', 'testuser'))
+        self.assertIsNotNone(added['created_at'])
+        self.assertEqual((edited['author'], edited['comment']), ('testuser', 'Edited'))
+        # Each write reads the user only in its joined lookup
+        self.assertEqual(len([statement for statement in statements if 'user.username' in statement]), 2)
+
+    def test_review_counters_follow_likes_and_comments(self):
+        """Test like and comment routes keep Review.like_count/comment_count current"""
+        with self.app.app_context():
+            author = User(username='critic', email='critic@example.com', password_hash='x')
+            db.session.add(author)
+            db.session.flush()
+            review = Review(user_id=author.id, movie_id=Movie.query.filter_by(tmdb_id=550).one().id,
+                            rating=5, comment='Classic')
+            db.session.add(review)
+            db.session.commit()
+            review_id = review.id
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        liked = json.loads(self.client.post(f'/api/movie/reviews/{review_id}/like', headers=headers).data)
+        self.assertEqual(liked, {'liked': True, 'like_count': 1})
+        comment = json.loads(self.client.post(f'/api/movie/reviews/{review_id}/comments',
+                                              json={'comment': 'Agreed'}, headers=headers).data)
+        self.client.post(f'/api/movie/reviews/{review_id}/comments', json={'comment': 'Twice'}, headers=headers)
+        with self.app.app_context():
+            review = db.session.get(Review, review_id)
+            self.assertEqual((review.like_count, review.comment_count), (1, 2))
+
+        unliked = json.loads(self.client.post(f'/api/movie/reviews/{review_id}/like', headers=headers).data)
+        self.assertEqual(unliked, {'liked': False, 'like_count': 0})
+        self.client.delete(f'/api/movie/review-comments/{comment["id"]}', headers=headers)
+        with self.app.app_context():
+            review = db.session.get(Review, review_id)
+            self.assertEqual((review.like_count, review.comment_count), (0, 1))
+            self.assertEqual(reconcile_review_counts(), 0)
+
+            # Drifted counters are corrected together with the hot score they feed
+            db.session.execute(update(Review).where(Review.id == review_id)
+                               .values(like_count=40, comment_count=9, hot_score=99.0))
+            db.session.commit()
+            self.assertEqual(reconcile_review_counts(), 1)
+            db.session.expire_all()
+            review = db.session.get(Review, review_id)
+            self.assertEqual((review.like_count, review.comment_count), (0, 1))
+            self.assertAlmostEqual(review.hot_score, hot_score(0, 1, review.created_at), places=4)
+
+    def test_watch_later_keyset_pagination(self):
+        """Test lists page by cursor in (added_at, id) order, with ?all=1 returning the whole array"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            added = datetime(2024, 1, 1)
+            for tmdb_id in range(1, 6):
+                db.session.add(Movie(tmdb_id=tmdb_id, title=f'Movie {tmdb_id}'))
+                # Movies 2 and 3 share a timestamp, so the id breaks the tie
+                db.session.add(UserMovieState(user_id=user.id, movie_id=tmdb_id, watch_later=True,
+                                              watch_later_at=added + timedelta(days=min(tmdb_id, 2))))
+            db.session.commit()
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        seen, cursor = [], None
+        while True:
+            url = '/api/user/watch-later?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            page = json.loads(self.client.get(url, headers=headers).data)
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(movie['id'] for movie in page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [1, 2, 3, 4, 5])
+
+        legacy = json.loads(self.client.get('/api/user/watchlist?all=1', headers=headers).data)
+        self.assertEqual([movie['id'] for movie in legacy], [1, 2, 3, 4, 5])
+        bad = self.client.get('/api/user/watch-later?cursor=not-a-cursor', headers=headers)
+        self.assertEqual(bad.status_code, 400)
+
+    @patch('tmdb.tmdb_client.session.get')
+    def test_movie_details_refresh_catalogue_row(self, mock_get):
+        """Test fetched details are copied onto the stale local Movie row"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            'id': 550, 'title': 'Fight Club', 'runtime': 139, 'original_language': 'en',
+            'genres': [{'id': 18, 'name': 'Drama'}]
+        }
+        mock_get.return_value = mock_response
+
+        self.client.get('/api/movie/550')
+
+        with self.app.app_context():
+            movie = Movie.query.filter_by(tmdb_id=550).first()
+            self.assertIsNotNone(movie.fetched_at)
+            self.assertEqual(movie.runtime, 139)
+            self.assertEqual([genre.name for genre in movie.genres], ['Drama'])
+
+    def test_details_many_serves_local_rows(self):
+        """Test the batch API answers from the Movie table before calling TMDB"""
+        from tmdb import fetch_movie_details_many
+        with self.app.app_context():
+            db.session.add(Movie(tmdb_id=77, title='Export 77'))
+            db.session.commit()
+            with patch.object(tmdb_client, 'get', side_effect=lambda path, *args, **kwargs: {'id': path}) as mock_get:
+                result = fetch_movie_details_many([550, 680, 550, 77])
+
+        self.assertEqual(result[550]['source'], 'local')
+        self.assertEqual(result[550]['data']['title'], 'Fight Club')
+        self.assertEqual(result[680]['source'], 'tmdb')
+        # A stub row is not details, so TMDB is asked
+        self.assertEqual(result[77]['source'], 'tmdb')
+        self.assertEqual(mock_get.call_count, 2)
 
     def test_get_movie_rating_unauthorized(self):
         """Test getting movie rating without authentication"""
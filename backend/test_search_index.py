@@ -0,0 +1,78 @@
+"""
+Unit tests for the local full-text movie search
+"""
+import unittest
+from datetime import datetime
+from flask import Flask
+from models import db, Movie
+from search_index import search_local, rebuild_search_index, is_title_match, merge_results
+
+FETCHED = datetime(2024, 1, 1)
+
+
+def create_test_app():
+    """Create Flask app for testing"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+class TestSearchIndex(unittest.TestCase):
+    """Test cases for the FTS5-backed catalogue search"""
+
+    def setUp(self):
+        self.app = create_test_app()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Movie(tmdb_id=550, title='Fight Club', overview='An insomniac office worker starts a club.',
+                      fetched_at=FETCHED),
+                Movie(tmdb_id=13, title='Forrest Gump', overview='A man with a low IQ witnesses history.',
+                      fetched_at=FETCHED),
+                Movie(tmdb_id=1, title='The Club', overview='A fight breaks out among the members.',
+                      fetched_at=FETCHED),
+                # An ID-export stub (no details yet) is never a search result
+                Movie(tmdb_id=2, title='Fight Club Originale')
+            ])
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_ranked_prefix_search(self):
+        """Test partial words match and title hits outrank overview hits"""
+        with self.app.app_context():
+            titles = [movie.title for movie in search_local('fig clu')]
+            self.assertEqual(titles, ['Fight Club', 'The Club'])
+            self.assertEqual(search_local('"); DROP TABLE movie; --'), [])
+
+    def test_index_follows_inserts_and_updates(self):
+        """Test triggers keep the index in step with the movie table"""
+        with self.app.app_context():
+            db.session.add(Movie(tmdb_id=680, title='Pulp Fiction', fetched_at=FETCHED))
+            db.session.commit()
+            self.assertEqual([movie.tmdb_id for movie in search_local('pulp')], [680])
+
+            movie = Movie.query.filter_by(tmdb_id=13).first()
+            movie.title = 'Forrest Gump (Remastered)'
+            db.session.commit()
+            self.assertEqual([movie.tmdb_id for movie in search_local('remastered')], [13])
+
+            self.assertEqual(rebuild_search_index(), 5)
+            self.assertEqual(len(search_local('club')), 2)
+
+    def test_title_match_and_merge(self):
+        """Test good-hit detection and deduplicated merging"""
+        self.assertTrue(is_title_match('fight cl', 'Fight Club'))
+        self.assertFalse(is_title_match('fight', 'The Club'))
+        merged = merge_results([{'id': 550}, {'id': 1}], [{'id': 550}, {'id': 807}])
+        self.assertEqual([item['id'] for item in merged], [550, 1, 807])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,15 +2,29 @@
 Unit tests for TMDB API functions
 """
 import unittest
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, Mock
 import requests
+from tmdb_cache import TieredCache, make_cache_key
 from tmdb import (
+    TMDBClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimiter,
+    parse_retry_after,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BACKGROUND,
+    tmdb_client,
     fetch_movie_details, 
     search_movies, 
     get_popular_movies, 
     get_top_rated_movies,
     get_upcoming_movies,
-    get_movie_genres
+    get_movie_genres,
+    fetch_movie_details_many
 )
 
 
@@ -19,6 +33,8 @@ class TestTMDBFunctions(unittest.TestCase):
     
     def setUp(self):
         """Set up test fixtures before each test method"""
+        tmdb_client.invalidate()
+        tmdb_client.breaker.reset()
         self.sample_movie_data = {
             'id': 550,
             'title': 'Fight Club',
@@ -37,7 +53,7 @@ class TestTMDBFunctions(unittest.TestCase):
             'total_results': 1
         }
 
-    @patch('tmdb.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_fetch_movie_details_success(self, mock_get):
         """Test successful movie details fetch"""
         # Arrange
@@ -55,7 +71,7 @@ class TestTMDBFunctions(unittest.TestCase):
         self.assertEqual(result['vote_average'], 8.4)
         mock_get.assert_called_once()
 
-    @patch('tmdb.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_fetch_movie_details_api_error(self, mock_get):
         """Test movie details fetch with API error"""
         # Arrange
@@ -67,7 +83,7 @@ class TestTMDBFunctions(unittest.TestCase):
         # Assert
         self.assertIsNone(result)
 
-    @patch('tmdb.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_search_movies_success(self, mock_get):
         """Test successful movie search"""
         # Arrange
@@ -84,7 +100,7 @@ class TestTMDBFunctions(unittest.TestCase):
         self.assertEqual(len(result['results']), 1)
         self.assertEqual(result['results'][0]['title'], 'Fight Club')
 
-    @patch('tmdb.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_get_popular_movies_with_filters(self, mock_get):
         """Test get popular movies with rating filters"""
         # Arrange
@@ -110,7 +126,7 @@ class TestTMDBFunctions(unittest.TestCase):
         self.assertIn('vote_average.lte', kwargs['params'])
         self.assertIn('with_genres', kwargs['params'])
 
-    @patch('tmdb.requests.get')
+    @patch('tmdb.tmdb_client.session.get')
     def test_get_upcoming_movies_date_filter(self, mock_get):
         """Test upcoming movies includes future date filter"""
         # Arrange
@@ -136,12 +152,45 @@ class TestTMDBFunctions(unittest.TestCase):
         self.assertIsNone(result)
         
         # Test with negative number
-        with patch('tmdb.requests.get') as mock_get:
+        with patch('tmdb.tmdb_client.session.get') as mock_get:
             mock_get.side_effect = requests.RequestException("Invalid ID")
             result = fetch_movie_details(-1)
             self.assertIsNone(result)
 
-    @patch('tmdb.requests.get')
+    def test_details_many_respects_deadline(self):
+        """Test slow lookups are reported as timeouts once the deadline passes"""
+        def get(path, params=None, use_cache=True, priority=None):
+            if path == 'movie/13':
+                time.sleep(0.5)
+            return {'id': int(path.split('/')[1])}
+
+        with patch.object(tmdb_client, 'get', side_effect=get) as mock_get:
+            started = time.time()
+            result = fetch_movie_details_many([550, 13, '550', 680], use_local=False, timeout=0.2)
+
+        self.assertLess(time.time() - started, 0.45)
+        self.assertEqual(set(result), {550, 13, 680})
+        self.assertEqual(result[550], {'data': {'id': 550}, 'source': 'tmdb', 'error': None})
+        self.assertEqual(result[13]['error'], 'timeout')
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_details_many_uses_cache_and_reports_errors(self):
+        """Test cached ids skip TMDB and failures are reported per id"""
+        tmdb_client.cache.set(make_cache_key('movie/550', {'language': 'en-GB'}), self.sample_movie_data, ttl=60)
+
+        def get(path, params=None, use_cache=True, priority=None):
+            raise requests.HTTPError('404 Client Error')
+
+        with patch.object(tmdb_client, 'get', side_effect=get) as mock_get:
+            result = fetch_movie_details_many([550, 0], use_local=False, max_workers=2)
+
+        self.assertEqual(result[550]['source'], 'cache')
+        self.assertEqual(result[550]['data']['title'], 'Fight Club')
+        self.assertIsNone(result[0]['data'])
+        self.assertIn('404', result[0]['error'])
+        mock_get.assert_called_once()
+
+    @patch('tmdb.tmdb_client.session.get')
     def test_empty_search_query(self, mock_get):
         """Test search with empty query"""
         # Arrange
@@ -158,6 +207,264 @@ class TestTMDBFunctions(unittest.TestCase):
         self.assertEqual(len(result['results']), 0)
 
 
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    """Minimal keep-alive TMDB stand-in that echoes the request path"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTMDBClient(unittest.TestCase):
+    """Test cases for the pooled TMDB HTTP client"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubTMDBHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = TMDBClient(
+            base_url=f'http://127.0.0.1:{self.server.server_address[1]}/3',
+            api_key='test-key',
+            pool_size=2
+        )
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_sends_api_key_and_timeout(self):
+        """Test every request carries the API key and configured timeouts"""
+        with patch.object(self.client.session, 'get') as mock_get:
+            mock_get.return_value.json.return_value = {'id': 550}
+            result = self.client.get('movie/550', {'language': 'en-US'})
+
+        self.assertEqual(result['id'], 550)
+        args, kwargs = mock_get.call_args
+        self.assertTrue(args[0].endswith('/3/movie/550'))
+        self.assertEqual(kwargs['params']['api_key'], 'test-key')
+        self.assertEqual(kwargs['timeout'], self.client.timeout)
+
+    def test_keep_alive_connections_are_reused(self):
+        """Test sequential requests share one pooled connection"""
+        for movie_id in range(5):
+            self.client.get(f'movie/{movie_id}')
+
+        stats = self.client.stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['connections']['opened'], 1)
+        self.assertEqual(stats['connections']['reused'], 4)
+
+    def test_errors_are_counted_and_raised(self):
+        """Test failed requests raise and are recorded in stats"""
+        with patch.object(self.client.session, 'get', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(requests.RequestException):
+                self.client.get('movie/550')
+
+        self.assertEqual(self.client.stats()['errors'], 1)
+
+    def run_concurrently(self, count, side_effect):
+        """Issue count identical requests while the upstream call is held open"""
+        release = threading.Event()
+        outcomes = []
+
+        def held_get(*args, **kwargs):
+            release.wait(2)
+            return side_effect()
+
+        def worker():
+            try:
+                outcomes.append(self.client.get('movie/550'))
+            except requests.RequestException as e:
+                outcomes.append(e)
+
+        with patch.object(self.client.session, 'get', side_effect=held_get) as mock_get:
+            threads = [threading.Thread(target=worker) for _ in range(count)]
+            for thread in threads:
+                thread.start()
+            deadline = time.time() + 2
+            while self.client.flights.coalesced < count - 1 and time.time() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join()
+        return mock_get, outcomes
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        """Test in-flight requests for the same resource are coalesced"""
+        response = Mock()
+        response.json.return_value = {'id': 550}
+        mock_get, outcomes = self.run_concurrently(5, lambda: response)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(outcomes, [{'id': 550}] * 5)
+        self.assertEqual(self.client.stats()['single_flight']['upstream_calls_saved'], 4)
+
+    def test_coalesced_callers_share_the_error(self):
+        """Test waiters receive the leader's exception"""
+        def fail():
+            raise requests.ConnectionError('down')
+        mock_get, outcomes = self.run_concurrently(3, fail)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(len(outcomes), 3)
+        self.assertTrue(all(isinstance(o, requests.ConnectionError) for o in outcomes))
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the client-side TMDB rate limiter"""
+
+    def test_burst_then_throttle(self):
+        """Test requests beyond the burst wait for tokens"""
+        limiter = RateLimiter(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(4):
+            self.assertTrue(limiter.acquire())
+        elapsed = time.monotonic() - started
+
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertEqual(limiter.stats()['throttled'], 2)
+
+    def test_interactive_requests_overtake_background(self):
+        """Test queued interactive callers are served before background ones"""
+        limiter = RateLimiter(rate=50, burst=1)
+        limiter.pause(0.2)
+        order = []
+
+        def worker(name, priority):
+            limiter.acquire(priority)
+            order.append(name)
+
+        background = [threading.Thread(target=worker, args=(f'bg{i}', PRIORITY_BACKGROUND)) for i in range(3)]
+        for thread in background:
+            thread.start()
+        deadline = time.time() + 1
+        while limiter.queue_depth() < 3 and time.time() < deadline:
+            time.sleep(0.005)
+        interactive = threading.Thread(target=worker, args=('page', PRIORITY_INTERACTIVE))
+        interactive.start()
+        for thread in background + [interactive]:
+            thread.join(2)
+
+        self.assertEqual(order[0], 'page')
+        self.assertEqual(limiter.queue_depth(), 0)
+
+    def test_acquire_times_out(self):
+        """Test a paused limiter gives up after the queue timeout"""
+        limiter = RateLimiter(rate=10, burst=1)
+        limiter.pause(5)
+        self.assertFalse(limiter.acquire(timeout=0.05))
+        self.assertEqual(limiter.stats()['timeouts'], 1)
+
+    def test_parse_retry_after(self):
+        """Test Retry-After accepts seconds and falls back on garbage"""
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after(None), 1.0)
+        self.assertEqual(parse_retry_after('soon'), 1.0)
+
+    def test_429_is_retried_after_pause(self):
+        """Test a 429 response pauses the limiter and the request is queued again"""
+        client = TMDBClient(api_key='test-key', rate_limiter=RateLimiter(rate=100, burst=5))
+        limited = Mock(status_code=429, headers={'Retry-After': '0.1'})
+        ok = Mock(status_code=200)
+        ok.json.return_value = {'id': 550}
+
+        with patch.object(client.session, 'get', side_effect=[limited, ok]) as mock_get:
+            started = time.monotonic()
+            result = client.get('movie/550')
+
+        self.assertEqual(result, {'id': 550})
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(client.stats()['rate_limiter']['responses_429'], 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the TMDB circuit breaker and degraded mode"""
+
+    def test_opens_after_consecutive_failures(self):
+        """Test the breaker opens at the threshold and short-circuits calls"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['short_circuited'], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        """Test calls above the latency threshold trip the breaker"""
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_threshold=0.5, reset_timeout=60)
+        breaker.record_success(elapsed=2.0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_probe_restores_service(self):
+        """Test a single probe is allowed after the reset timeout and closes the circuit"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_success(elapsed=0.01)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        """Test a failing half-open probe opens the circuit again"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_circuit_serves_cached_payload(self):
+        """Test an open circuit falls back to the last cached payload and flags it"""
+        client = TMDBClient(api_key='test-key', cache=TieredCache(max_entries=10),
+                            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        client.cache.set(make_cache_key('movie/550', {'language': 'en-GB'}), {'id': 550}, ttl=-1)
+
+        with patch.object(client.session, 'get', side_effect=requests.ConnectionError('down')) as mock_get:
+            client.reset_request_state()
+            self.assertEqual(client.get('movie/550', {'language': 'en-GB'}), {'id': 550})
+            self.assertTrue(client.served_stale())
+            self.assertEqual(client.get('movie/550', {'language': 'en-GB'}), {'id': 550})
+
+        self.assertEqual(mock_get.call_count, 1)
+        stats = client.stats()['circuit_breaker']
+        self.assertEqual(stats['state'], 'open')
+        self.assertEqual(stats['degraded_responses'], 2)
+
+    def test_open_circuit_without_cache_raises(self):
+        """Test short-circuited calls raise when nothing is cached"""
+        client = TMDBClient(api_key='test-key', breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        client.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            client.get('movie/550')
+
+    def test_not_found_does_not_trip_breaker(self):
+        """Test 4xx responses are treated as a healthy upstream"""
+        client = TMDBClient(api_key='test-key', breaker=CircuitBreaker(failure_threshold=1))
+        not_found = Mock(status_code=404)
+        not_found.raise_for_status.side_effect = requests.HTTPError('404', response=not_found)
+        with patch.object(client.session, 'get', return_value=not_found):
+            with self.assertRaises(requests.HTTPError):
+                client.get('movie/0')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+
 if __name__ == '__main__':
     # Run the tests
     unittest.main()
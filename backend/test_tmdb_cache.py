@@ -0,0 +1,256 @@
+"""
+Unit tests for the TMDB response cache
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, Mock
+from tmdb import TMDBClient, endpoint_group, project_fields
+from tmdb_cache import MemoryCache, TieredCache, CacheEntry, make_cache_key
+
+
+class TestCacheKeys(unittest.TestCase):
+    """Test cases for cache key normalisation"""
+
+    def test_param_order_and_api_key_ignored(self):
+        """Test equivalent requests map to the same key"""
+        first = make_cache_key('/discover/movie', {'page': 1, 'with_genres': '28', 'api_key': 'a'})
+        second = make_cache_key('discover/movie', {'with_genres': '28 ', 'page': '1', 'region': None})
+        self.assertEqual(first, second)
+
+    def test_float_and_bool_values_normalised(self):
+        """Test numeric and boolean params render canonically"""
+        self.assertEqual(
+            make_cache_key('search/movie', {'vote_average.gte': 8.0, 'include_adult': False}),
+            make_cache_key('search/movie', {'vote_average.gte': 8, 'include_adult': 'false'})
+        )
+
+    def test_endpoint_groups(self):
+        """Test paths are classified into TTL groups"""
+        self.assertEqual(endpoint_group('genre/movie/list'), 'genres')
+        self.assertEqual(endpoint_group('configuration/languages'), 'configuration')
+        self.assertEqual(endpoint_group('movie/550'), 'details')
+        self.assertEqual(endpoint_group('movie/popular'), 'listing')
+        self.assertEqual(endpoint_group('discover/movie'), 'listing')
+        self.assertEqual(endpoint_group('search/movie'), 'search')
+
+
+class TestTieredCache(unittest.TestCase):
+    """Test cases for the memory and SQLite cache tiers"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lru_evicts_least_recently_used(self):
+        """Test the memory tier respects its size bound"""
+        cache = MemoryCache(max_entries=2)
+        now = time.time()
+        cache.set('a', CacheEntry(1, now, now + 60))
+        cache.set('b', CacheEntry(2, now, now + 60))
+        cache.get('a')
+        cache.set('c', CacheEntry(3, now, now + 60))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').value, 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired_entries_miss(self):
+        """Test entries past their TTL are not returned"""
+        cache = TieredCache(max_entries=10)
+        cache.set('genre/movie/list', {'genres': []}, ttl=-1)
+        self.assertIsNone(cache.get('genre/movie/list'))
+        self.assertIsNotNone(cache.get('genre/movie/list', allow_expired=True))
+
+    def test_disk_tier_survives_restart(self):
+        """Test the SQLite tier serves entries written by a previous instance"""
+        TieredCache(max_entries=10, disk_path=self.path).set('movie/550', {'id': 550}, ttl=60)
+
+        restarted = TieredCache(max_entries=10, disk_path=self.path)
+        self.assertEqual(restarted.get('movie/550').value, {'id': 550})
+        self.assertEqual(restarted.stats()['disk']['hits'], 1)
+
+    def test_invalidate_by_prefix(self):
+        """Test prefix invalidation removes matching keys from both tiers"""
+        cache = TieredCache(max_entries=10, disk_path=self.path)
+        cache.set('movie/550', {'id': 550}, ttl=60)
+        cache.set('movie/551', {'id': 551}, ttl=60)
+        cache.set('genre/movie/list', {'genres': []}, ttl=60)
+
+        cache.invalidate(prefix='movie/')
+
+        self.assertIsNone(cache.get('movie/550'))
+        self.assertIsNone(cache.get('movie/551'))
+        self.assertIsNotNone(cache.get('genre/movie/list'))
+
+
+class TestCachedClient(unittest.TestCase):
+    """Test cases for the cache layer inside TMDBClient"""
+
+    def setUp(self):
+        self.client = TMDBClient(api_key='test-key', cache=TieredCache(max_entries=10))
+
+    @patch('requests.Session.get')
+    def test_repeated_request_served_from_cache(self, mock_get):
+        """Test identical requests only reach TMDB once"""
+        mock_get.return_value.json.return_value = {'genres': [{'id': 28, 'name': 'Action'}]}
+
+        first = self.client.get('genre/movie/list', {'language': 'en-US'})
+        second = self.client.get('genre/movie/list', {'language': 'en-US'})
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.client.stats()['cache']['memory']['hits'], 1)
+
+    @patch('requests.Session.get')
+    def test_invalidate_forces_refetch(self, mock_get):
+        """Test explicit invalidation drops the cached response"""
+        mock_get.return_value.json.return_value = {'id': 550}
+
+        self.client.get('movie/550', {'language': 'en-US'})
+        self.client.invalidate('movie/550', {'language': 'en-US'})
+        self.client.get('movie/550', {'language': 'en-US'})
+
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('requests.Session.get')
+    def test_zero_ttl_group_is_not_cached(self, mock_get):
+        """Test endpoint groups with a zero TTL bypass the cache"""
+        client = TMDBClient(api_key='test-key', cache=TieredCache(max_entries=10),
+                            cache_ttls={'search': 0})
+        mock_get.return_value.json.return_value = {'results': []}
+
+        client.get('search/movie', {'query': 'fight'})
+        client.get('search/movie', {'query': 'fight'})
+
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class TestFieldProjection(unittest.TestCase):
+    """Test cases for trimming TMDB payloads before caching"""
+
+    def setUp(self):
+        self.client = TMDBClient(api_key='test-key', cache=TieredCache(max_entries=10))
+        self.details = {'id': 550, 'title': 'Fight Club', 'production_companies': [{'id': 508}] * 20}
+
+    def test_project_fields(self):
+        """Test top-level and per-result trimming"""
+        self.assertEqual(project_fields(self.details, ('id', 'title')), {'id': 550, 'title': 'Fight Club'})
+        page = {'page': 1, 'total_pages': 3, 'results': [self.details]}
+        self.assertEqual(project_fields(page, ('id',)), {'page': 1, 'total_pages': 3, 'results': [{'id': 550}]})
+        self.assertIs(project_fields(self.details, None), self.details)
+
+    @patch('requests.Session.get')
+    def test_projection_is_cached_and_measured(self, mock_get):
+        """Test the trimmed payload is cached and byte savings are recorded per route"""
+        mock_get.return_value.json.return_value = self.details
+        self.client.reset_request_state(route='movie.get_movie_details')
+
+        first = self.client.get('movie/550', fields=('id', 'title'))
+        second = self.client.get('movie/550', fields=('title', 'id'))
+
+        self.assertEqual(first, {'id': 550, 'title': 'Fight Club'})
+        self.assertEqual(second, first)
+        self.assertEqual(mock_get.call_count, 1)
+        savings = self.client.stats()['projection']['movie.get_movie_details']
+        self.assertEqual(savings['responses'], 1)
+        self.assertGreater(savings['bytes_saved'], 0)
+
+    @patch('requests.Session.get')
+    def test_cached_full_payload_answers_projection(self, mock_get):
+        """Test a projection is derived from a cached full payload without refetching"""
+        mock_get.return_value.json.return_value = self.details
+        self.client.get('movie/550')
+        self.assertEqual(self.client.get('movie/550', fields=('title',)), {'title': 'Fight Club'})
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_invalidate_drops_projections(self, mock_get):
+        """Test invalidating a request also removes its projected variants"""
+        mock_get.return_value.json.return_value = self.details
+        self.client.get('movie/550', fields=('title',))
+        self.client.invalidate('movie/550')
+        self.client.get('movie/550', fields=('title',))
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    """Test cases for background refresh of listing pages"""
+
+    def setUp(self):
+        self.client = TMDBClient(
+            api_key='test-key',
+            cache=TieredCache(max_entries=10),
+            cache_ttls={'listing': 60},
+            cache_hard_ttls={'listing': 3600}
+        )
+        self.key = make_cache_key('discover/movie', {'page': 1})
+
+    def seed(self, age, value):
+        """Place a cached page of the given age (seconds)"""
+        now = time.time()
+        self.client.cache.memory.set(self.key, CacheEntry(value, now - age, now - age + 3600))
+
+    def wait_for_refreshes(self):
+        deadline = time.time() + 2
+        while self.client.stats()['stale_while_revalidate']['refreshing'] and time.time() < deadline:
+            time.sleep(0.01)
+
+    @patch('requests.Session.get')
+    def test_stale_page_served_then_refreshed(self, mock_get):
+        """Test a page past its soft TTL is returned immediately and refreshed"""
+        mock_get.return_value.json.return_value = {'page': 1, 'results': ['fresh']}
+        self.seed(age=120, value={'page': 1, 'results': ['stale']})
+
+        self.assertEqual(self.client.get('discover/movie', {'page': 1})['results'], ['stale'])
+        self.wait_for_refreshes()
+
+        self.assertEqual(self.client.get('discover/movie', {'page': 1})['results'], ['fresh'])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.client.stats()['stale_while_revalidate']['stale_served'], 1)
+
+    @patch('requests.Session.get')
+    def test_fresh_page_does_not_refresh(self, mock_get):
+        """Test pages within the soft TTL never trigger a refresh"""
+        self.seed(age=10, value={'page': 1, 'results': []})
+        self.client.get('discover/movie', {'page': 1})
+        self.wait_for_refreshes()
+        mock_get.assert_not_called()
+
+    def test_refreshes_are_deduplicated(self):
+        """Test only one background refresh per key runs at a time"""
+        release = threading.Event()
+        response = Mock()
+        response.json.return_value = {'page': 1, 'results': ['fresh']}
+
+        def held_get(*args, **kwargs):
+            release.wait(2)
+            return response
+
+        self.seed(age=120, value={'page': 1, 'results': ['stale']})
+        with patch.object(self.client.session, 'get', side_effect=held_get) as mock_get:
+            for _ in range(5):
+                self.assertEqual(self.client.get('discover/movie', {'page': 1})['results'], ['stale'])
+            release.set()
+            self.wait_for_refreshes()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.client.stats()['stale_while_revalidate']['refreshes_started'], 1)
+
+    @patch('requests.Session.get')
+    def test_hard_expired_page_blocks(self, mock_get):
+        """Test pages past the hard TTL are fetched synchronously"""
+        mock_get.return_value.json.return_value = {'page': 1, 'results': ['fresh']}
+        now = time.time()
+        self.client.cache.memory.set(self.key, CacheEntry({'results': ['old']}, now - 4000, now - 400))
+
+        self.assertEqual(self.client.get('discover/movie', {'page': 1})['results'], ['fresh'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Unit tests for the unified user movie state
+"""
+import unittest
+from datetime import datetime
+from flask import Flask
+from models import db, User, Movie, Rating, SyncCheckpoint, UserMovieState, WatchedItem, LikedItem, WatchLaterItem
+from user_state import (
+    ensure_state, toggle_flag, user_status, list_query, state_counts, migrate_legacy_state, LEGACY_MIGRATION
+)
+
+
+class TestUserMovieState(unittest.TestCase):
+    """Test cases for user_state"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='testuser', email='test@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.add(Movie(tmdb_id=550, title='Fight Club'))
+        db.session.add(Movie(tmdb_id=680, title='Pulp Fiction'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_toggle_flag_sets_timestamp(self):
+        """Test toggling sets the flag and its timestamp, and clears both"""
+        self.assertTrue(toggle_flag(self.user.id, 550, 'liked'))
+        state = UserMovieState.query.one()
+        self.assertTrue(state.liked)
+        self.assertIsNotNone(state.liked_at)
+        self.assertFalse(toggle_flag(self.user.id, 550, 'liked'))
+        self.assertEqual(UserMovieState.query.count(), 0)
+
+    def test_ensure_state_reuses_row(self):
+        """Test ensure_state returns the existing row instead of inserting another"""
+        first = ensure_state(str(self.user.id), 550)
+        second = ensure_state(self.user.id, 550)
+        self.assertIs(first, second)
+        self.assertEqual(UserMovieState.query.count(), 1)
+
+    def test_status_lists_and_counts(self):
+        """Test status, list and count reads"""
+        toggle_flag(self.user.id, 680, 'watched')
+        toggle_flag(self.user.id, 550, 'watched')
+        state = ensure_state(self.user.id, 550)
+        state.set_rating(5)
+        db.session.commit()
+
+        self.assertEqual(user_status(self.user.id, 550), {'rating': 5, 'watched': True, 'liked': False, 'watch_later': False})
+        self.assertEqual(user_status(self.user.id, 13)['watched'], False)
+        self.assertEqual([movie.tmdb_id for _, movie in list_query(self.user.id, 'watched')], [680, 550])
+        self.assertEqual(list_query(self.user.id, 'liked').all(), [])
+        self.assertEqual(state_counts(self.user.id), {'watched': 2, 'liked': 0, 'watch_later': 0, 'rated': 1})
+
+    def test_migrate_legacy_state(self):
+        """Test legacy list and rating rows are merged into one row per movie, once"""
+        added = datetime(2024, 1, 2)
+        fight_club = Movie.query.filter_by(tmdb_id=550).one()
+        db.session.add(WatchedItem(user_id=self.user.id, movie_id=550, added_at=added))
+        db.session.add(LikedItem(user_id=self.user.id, movie_id=550))
+        db.session.add(WatchLaterItem(user_id=self.user.id, movie_id=680))
+        db.session.add(Rating(user_id=self.user.id, movie_id=fight_club.id, rating=4))
+        db.session.commit()
+
+        self.assertEqual(migrate_legacy_state(), 2)
+        self.assertIsNotNone(db.session.get(SyncCheckpoint, LEGACY_MIGRATION))
+        state = UserMovieState.query.filter_by(movie_id=550).one()
+        self.assertEqual(state.to_status(), {'rating': 4, 'watched': True, 'liked': True, 'watch_later': False})
+        self.assertEqual(state.watched_at, added)
+        self.assertIsNotNone(state.rated_at)
+        self.assertTrue(UserMovieState.query.filter_by(movie_id=680).one().watch_later)
+
+        # A second run is a no-op even if state has changed since
+        toggle_flag(self.user.id, 680, 'watch_later')
+        self.assertEqual(migrate_legacy_state(), 0)
+        self.assertEqual(UserMovieState.query.count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
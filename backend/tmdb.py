@@ -1,6 +1,17 @@
 import os
+import re
+import json
+import time
+import heapq
+import itertools
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+from tmdb_cache import TieredCache, make_cache_key
 
 # Load environment variables
 load_dotenv()
@@ -8,46 +19,744 @@ load_dotenv()
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
 
-def fetch_movie_details(movie_id):
-    """Get movie details from TMDB API"""
+# HTTP client tuning (pool size is per gunicorn worker)
+TMDB_POOL_SIZE = int(os.getenv('TMDB_POOL_SIZE', '10'))
+TMDB_CONNECT_TIMEOUT = float(os.getenv('TMDB_CONNECT_TIMEOUT', '3.05'))
+TMDB_READ_TIMEOUT = float(os.getenv('TMDB_READ_TIMEOUT', '10'))
+TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', '2'))
+TMDB_RETRY_BACKOFF = float(os.getenv('TMDB_RETRY_BACKOFF', '0.3'))
+
+# Response cache: memory LRU bound, optional SQLite file, TTLs in seconds per
+# endpoint group (override a group with e.g. TMDB_CACHE_TTL_DETAILS=3600)
+TMDB_CACHE_MAX_ENTRIES = int(os.getenv('TMDB_CACHE_MAX_ENTRIES', '2048'))
+TMDB_CACHE_PATH = os.getenv('TMDB_CACHE_PATH')
+TMDB_CACHE_TTLS = {
+    'genres': 7 * 24 * 3600,
+    'configuration': 7 * 24 * 3600,
+    'details': 6 * 3600,
+    'listing': 10 * 60,
+    'search': 10 * 60,
+    'default': 5 * 60
+}
+# Groups listed here are served stale-while-revalidate: past the TTL above
+# the cached page is still returned and refreshed in the background, until
+# this hard TTL after which callers block on TMDB again
+TMDB_CACHE_HARD_TTLS = {
+    'listing': 6 * 3600
+}
+for _group in TMDB_CACHE_TTLS:
+    _override = os.getenv(f'TMDB_CACHE_TTL_{_group.upper()}')
+    if _override:
+        TMDB_CACHE_TTLS[_group] = int(_override)
+    _override = os.getenv(f'TMDB_CACHE_HARD_TTL_{_group.upper()}')
+    if _override:
+        TMDB_CACHE_HARD_TTLS[_group] = int(_override)
+
+# Client-side rate limit (token bucket per worker). Requests beyond the limit
+# queue by priority; a 429 pauses the bucket for the Retry-After period.
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', '40'))
+TMDB_RATE_BURST = int(os.getenv('TMDB_RATE_BURST', '20'))
+TMDB_RATE_QUEUE_TIMEOUT = float(os.getenv('TMDB_RATE_QUEUE_TIMEOUT', '30'))
+TMDB_MAX_429_RETRIES = int(os.getenv('TMDB_MAX_429_RETRIES', '3'))
+TMDB_MAX_RETRY_AFTER = float(os.getenv('TMDB_MAX_RETRY_AFTER', '30'))
+
+# Circuit breaker: open after this many consecutive failures (errors, 5xx or
+# calls slower than the slow-call threshold), probe again after the reset time
+TMDB_BREAKER_FAILURES = int(os.getenv('TMDB_BREAKER_FAILURES', '5'))
+TMDB_BREAKER_SLOW_CALL = float(os.getenv('TMDB_BREAKER_SLOW_CALL', '5'))
+TMDB_BREAKER_RESET = float(os.getenv('TMDB_BREAKER_RESET', '30'))
+
+# Lower values are served first when requests queue for the rate limiter
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Concurrent per-item enrichment (worker threads are shared per process)
+TMDB_FANOUT_WORKERS = int(os.getenv('TMDB_FANOUT_WORKERS', '8'))
+TMDB_FANOUT_DEADLINE = float(os.getenv('TMDB_FANOUT_DEADLINE', '3'))
+
+# Language used for movie details everywhere, so every caller shares one cache entry
+TMDB_DETAILS_LANGUAGE = 'en-GB'
+
+LISTING_PATHS = ('movie/popular', 'movie/top_rated', 'movie/upcoming', 'movie/now_playing')
+
+
+def endpoint_group(path):
+    """Classify a TMDB path into the group used for cache TTLs."""
+    path = path.strip('/')
+    if path.startswith('genre/'):
+        return 'genres'
+    if path.startswith('configuration/'):
+        return 'configuration'
+    if path.startswith('search/'):
+        return 'search'
+    if path.startswith('discover/') or path in LISTING_PATHS:
+        return 'listing'
+    if re.match(r'movie/\d+(/|$)', path):
+        return 'details'
+    return 'default'
+
+
+def project_fields(payload, fields):
+    """
+    Trim a TMDB payload to the given top-level fields. Paged payloads keep
+    their paging keys and have each entry of 'results' trimmed instead.
+    """
+    if not fields or not isinstance(payload, dict):
+        return payload
+    if isinstance(payload.get('results'), list):
+        return dict(payload, results=[
+            {name: item[name] for name in fields if name in item}
+            for item in payload['results']
+        ])
+    return {name: payload[name] for name in fields if name in payload}
+
+
+def projection_key(key, fields):
+    """Cache key for a projected payload."""
+    if not fields:
+        return key
+    return f'{key}#fields={",".join(sorted(set(fields)))}'
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+    Callers that arrive while a call is in flight wait for it and receive
+    the same result, or the same exception.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class RateLimitTimeout(requests.RequestException):
+    """Raised when a request waited too long for a rate limiter slot."""
+
+
+def parse_retry_after(value, default=1.0):
+    """Return the delay in seconds described by a Retry-After header."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
     try:
-        response = requests.get(
-            f'{TMDB_BASE_URL}/movie/{movie_id}',
-            params={
-                'api_key': TMDB_API_KEY,
-                'language': 'en-US'
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread in the worker.
+
+    Callers that find the bucket empty wait in a queue ordered by priority
+    (then arrival), so interactive requests overtake queued background work.
+    A rate of zero or less disables limiting.
+    """
+
+    def __init__(self, rate=TMDB_RATE_LIMIT, burst=TMDB_RATE_BURST):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self.throttled = 0
+        self.timeouts = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Take one token, waiting in priority order. Returns False on timeout."""
+        if self.rate <= 0:
+            return True
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._queue[0] == ticket:
+                        if now >= self._paused_until and self._tokens >= 1:
+                            self._tokens -= 1
+                            heapq.heappop(self._queue)
+                            if waited:
+                                self.throttled += 1
+                            self._cond.notify_all()
+                            return True
+                        delay = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.001)
+                    else:
+                        # Not at the head: sleep until the queue moves
+                        delay = None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._queue.remove(ticket)
+                            heapq.heapify(self._queue)
+                            self.timeouts += 1
+                            self._cond.notify_all()
+                            return False
+                        delay = remaining if delay is None else min(delay, remaining)
+                    waited = True
+                    self._cond.wait(delay)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'queue_depth': len(self._queue),
+                'throttled': self.throttled,
+                'timeouts': self.timeouts,
+                'paused_for': round(max(self._paused_until - time.monotonic(), 0.0), 3)
             }
+
+
+SERVER_ERROR_STATUSES = frozenset(range(500, 600))
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without calling TMDB while the circuit breaker is open."""
+
+
+def is_upstream_failure(error):
+    """True when an error means TMDB is unavailable rather than the request being invalid."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls pass through. Open: calls are rejected until reset_timeout
+    has passed. Half-open: a single probe call is let through; success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=TMDB_BREAKER_FAILURES, slow_call_threshold=TMDB_BREAKER_SLOW_CALL,
+                 reset_timeout=TMDB_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probing = False
+            self.times_opened = 0
+            self.short_circuited = 0
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self):
+        """Return True if a call may go upstream now."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, elapsed=0.0):
+        if elapsed >= self.slow_call_threshold:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """Release a half-open probe without judging TMDB health (e.g. a 429)."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited
+            }
+
+
+class TMDBClient:
+    """
+    Shared TMDB HTTP client.
+
+    Keeps one pooled keep-alive session per worker so repeated calls reuse
+    TCP/TLS connections, applies connect/read timeouts to every request and
+    retries idempotent GETs with exponential backoff. When a cache is given,
+    successful responses are stored with the TTL of their endpoint group.
+    Concurrent identical requests share a single upstream call, and groups
+    with a hard TTL are refreshed in the background once their TTL passes.
+    Upstream calls are paced by a priority-aware token bucket, and 429
+    responses pause the bucket for Retry-After and are retried. A circuit
+    breaker short-circuits calls while TMDB is failing; in that case, or on
+    any upstream failure, the last cached payload is served instead and the
+    request is flagged as stale (see served_stale()).
+    """
+
+    def __init__(self, base_url=TMDB_BASE_URL, api_key=TMDB_API_KEY, pool_size=TMDB_POOL_SIZE,
+                 connect_timeout=TMDB_CONNECT_TIMEOUT, read_timeout=TMDB_READ_TIMEOUT,
+                 max_retries=TMDB_MAX_RETRIES, backoff_factor=TMDB_RETRY_BACKOFF,
+                 cache=None, cache_ttls=None, cache_hard_ttls=None, rate_limiter=None,
+                 queue_timeout=TMDB_RATE_QUEUE_TIMEOUT, max_429_retries=TMDB_MAX_429_RETRIES,
+                 breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.cache = cache
+        self.cache_ttls = dict(TMDB_CACHE_TTLS, **(cache_ttls or {}))
+        self.cache_hard_ttls = dict(TMDB_CACHE_HARD_TTLS, **(cache_hard_ttls or {}))
+        self.flights = SingleFlight()
+        self.limiter = rate_limiter or RateLimiter()
+        self.queue_timeout = queue_timeout
+        self.max_429_retries = max_429_retries
+        self._rate_limited = 0
+        self.breaker = breaker or CircuitBreaker()
+        self._degraded = 0
+        self._projection = {}
+        self._local = threading.local()
+        self._refreshing = set()
+        self._stale_served = 0
+        self._refresh_count = 0
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+            # 429s are handled by the rate limiter so every thread backs off
+            respect_retry_after_header=False
         )
-        response.raise_for_status()
-        return response.json()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._error_count = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def get(self, path, params=None, use_cache=True, priority=PRIORITY_INTERACTIVE, fields=None):
+        """
+        GET a TMDB endpoint and return the decoded JSON body.
+
+        With fields, the payload is trimmed to those keys (per item for
+        paged 'results' payloads) before it is cached and returned.
+        Cached payloads are shared between callers and must not be mutated.
+        Raises requests.RequestException on network or HTTP errors.
+        """
+        group = endpoint_group(path)
+        ttl = self.cache_ttls.get(group, 0) if self.cache is not None else 0
+        hard_ttl = max(self.cache_hard_ttls.get(group, ttl), ttl)
+        key = make_cache_key(path, params)
+        store_key = projection_key(key, fields)
+        if ttl > 0 and use_cache:
+            entry = self.cache.get(store_key)
+            if entry is None and fields:
+                # A cached full payload can answer any projection
+                full = self.cache.get(key)
+                if full is not None and time.time() - full.stored_at < ttl:
+                    return self._store(store_key, self._project(full.value, fields, record=False), hard_ttl)
+            if entry is not None:
+                if time.time() - entry.stored_at >= ttl:
+                    # Past the soft TTL but within the hard one: serve stale
+                    self._revalidate(key, store_key, path, params, hard_ttl, fields)
+                    with self._lock:
+                        self._stale_served += 1
+                return entry.value
+
+        try:
+            return self._load(key, store_key, path, params, hard_ttl, priority, fields)
+        except requests.RequestException as e:
+            if self.cache is None or not is_upstream_failure(e):
+                raise
+            # Degraded mode: fall back to the last payload we ever cached
+            entry = self.cache.get(store_key, allow_expired=True)
+            if entry is None and fields:
+                entry = self.cache.get(key, allow_expired=True)
+            if entry is None:
+                raise
+            self._local.stale = True
+            with self._lock:
+                self._degraded += 1
+            return project_fields(entry.value, fields)
+
+    def peek(self, path, params=None):
+        """Return a cached payload for the request without calling TMDB, or None."""
+        if self.cache is None:
+            return None
+        entry = self.cache.get(make_cache_key(path, params))
+        return entry.value if entry is not None else None
+
+    def served_stale(self):
+        """True if this thread was served a fallback payload since the last reset."""
+        return getattr(self._local, 'stale', False)
+
+    def reset_request_state(self, route=None):
+        """Clear per-request flags; call at the start of each request."""
+        self._local.stale = False
+        self._local.route = route
+
+    def _load(self, key, store_key, path, params, ttl, priority=PRIORITY_INTERACTIVE, fields=None):
+        """Fetch through the single-flight layer, project and cache the payload."""
+        data = self.flights.do(key, lambda: self._fetch(path, params, priority))
+        return self._store(store_key, self._project(data, fields), ttl)
+
+    def _store(self, store_key, data, ttl):
+        if ttl > 0:
+            self.cache.set(store_key, data, ttl)
+        return data
+
+    def _project(self, data, fields, record=True):
+        """Apply a field projection, recording the byte savings for the current route."""
+        if not fields:
+            return data
+        projected = project_fields(data, fields)
+        if record:
+            route = getattr(self._local, 'route', None) or 'unknown'
+            before = len(json.dumps(data, separators=(',', ':')))
+            after = len(json.dumps(projected, separators=(',', ':')))
+            with self._lock:
+                totals = self._projection.setdefault(route, {'responses': 0, 'bytes_before': 0, 'bytes_after': 0})
+                totals['responses'] += 1
+                totals['bytes_before'] += before
+                totals['bytes_after'] += after
+        return projected
+
+    def _revalidate(self, key, store_key, path, params, ttl, fields=None):
+        """Refresh a cached response in a background thread, once per key."""
+        with self._lock:
+            if store_key in self._refreshing:
+                return
+            self._refreshing.add(store_key)
+            self._refresh_count += 1
+        route = getattr(self._local, 'route', None)
+
+        def refresh():
+            self._local.route = route
+            try:
+                self._load(key, store_key, path, params, ttl, PRIORITY_BACKGROUND, fields)
+            except requests.RequestException as e:
+                print(f"Error refreshing {store_key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(store_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, path=None, params=None, prefix=None):
+        """
+        Drop cached responses: one request (path + params), every key under
+        a path prefix, or the whole cache when called without arguments.
+        """
+        if self.cache is None:
+            return 0
+        if path is not None:
+            key = make_cache_key(path, params)
+            # Projections of the payload are stored under key#fields=...
+            return self.cache.invalidate(key=key) + self.cache.invalidate(prefix=f'{key}#')
+        if prefix is not None:
+            return self.cache.invalidate(prefix=prefix.strip('/'))
+        return self.cache.invalidate()
+
+    def _fetch(self, path, params=None, priority=PRIORITY_INTERACTIVE):
+        """Perform the HTTP request against TMDB, pacing it through the rate limiter."""
+        query = {'api_key': self.api_key}
+        query.update(params or {})
+        url = f'{self.base_url}/{path.lstrip("/")}'
+        attempts = 0
+        while True:
+            if self.breaker.is_open():
+                raise CircuitOpenError(f'TMDB circuit breaker is open: {path}')
+            if not self.limiter.acquire(priority, timeout=self.queue_timeout):
+                raise RateLimitTimeout(f'Timed out waiting for a TMDB rate limit slot: {path}')
+            if not self.breaker.allow():
+                raise CircuitOpenError(f'TMDB circuit breaker is open: {path}')
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=query, timeout=self.timeout)
+            except requests.RequestException:
+                self.breaker.record_failure()
+                self._record(time.perf_counter() - started, True)
+                raise
+            elapsed = time.perf_counter() - started
+
+            if response.status_code == 429 and attempts < self.max_429_retries:
+                # Back off every thread, then queue again for a token
+                self.breaker.record_neutral()
+                self._record(elapsed, False)
+                attempts += 1
+                delay = min(parse_retry_after(response.headers.get('Retry-After')), TMDB_MAX_RETRY_AFTER)
+                self.limiter.pause(delay)
+                with self._lock:
+                    self._rate_limited += 1
+                continue
+
+            if response.status_code in SERVER_ERROR_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(elapsed)
+            try:
+                response.raise_for_status()
+                data = response.json()
+            except requests.RequestException:
+                self._record(elapsed, True)
+                raise
+            self._record(elapsed, False)
+            return data
+
+    def _record(self, elapsed, failed):
+        with self._lock:
+            self._request_count += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            if failed:
+                self._error_count += 1
+
+    def _connection_counts(self):
+        """Return (connections opened, requests sent) across the adapter's pools."""
+        opened = sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                sent += pool.num_requests
+        return opened, sent
+
+    def stats(self):
+        """Return request, latency and connection reuse counters."""
+        opened, sent = self._connection_counts()
+        with self._lock:
+            count = self._request_count
+            return {
+                'requests': count,
+                'errors': self._error_count,
+                'latency_ms': {
+                    'avg': round(self._latency_total / count * 1000, 2) if count else 0.0,
+                    'max': round(self._latency_max * 1000, 2)
+                },
+                'connections': {
+                    'pool_size': self.pool_size,
+                    'opened': opened,
+                    'reused': max(sent - opened, 0)
+                },
+                'cache': self.cache.stats() if self.cache is not None else None,
+                'rate_limiter': dict(self.limiter.stats(), responses_429=self._rate_limited),
+                'circuit_breaker': dict(self.breaker.stats(), degraded_responses=self._degraded),
+                'stale_while_revalidate': {
+                    'stale_served': self._stale_served,
+                    'refreshes_started': self._refresh_count,
+                    'refreshing': len(self._refreshing)
+                },
+                'single_flight': {
+                    'in_flight': self.flights.in_flight(),
+                    'upstream_calls_saved': self.flights.coalesced
+                },
+                'projection': {
+                    route: dict(totals, bytes_saved=totals['bytes_before'] - totals['bytes_after'])
+                    for route, totals in self._projection.items()
+                }
+            }
+
+
+# Module-level client shared by tmdb helpers and routes
+tmdb_client = TMDBClient(cache=TieredCache(TMDB_CACHE_MAX_ENTRIES, TMDB_CACHE_PATH))
+
+# Bounded pool for fanning out per-item TMDB lookups
+fanout_executor = ThreadPoolExecutor(max_workers=TMDB_FANOUT_WORKERS, thread_name_prefix='tmdb-fanout')
+
+def fetch_movie_details(movie_id, priority=PRIORITY_INTERACTIVE):
+    """Get movie details from TMDB API"""
+    if movie_id is None:
+        return None
+    try:
+        # Same language as the movie detail route so both share one request
+        return tmdb_client.get(f'movie/{movie_id}', {'language': TMDB_DETAILS_LANGUAGE}, priority=priority)
     except requests.RequestException as e:
         print(f"Error fetching movie details: {e}")
         return None
 
-def search_movies(query, page=1):
+def fetch_movie_details_many(movie_ids, use_cache=True, use_local=True, max_workers=None,
+                            timeout=TMDB_FANOUT_DEADLINE, priority=PRIORITY_INTERACTIVE):
+    """
+    Get details for several movies at once.
+
+    IDs are deduplicated, then served from the response cache and (with
+    use_local, inside an app context) from the local Movie table; the
+    remaining misses are fetched from TMDB concurrently, on the shared
+    fan-out pool or on a dedicated pool of max_workers threads.
+
+    Returns a dict keyed by TMDB id of
+    {'data': payload or None, 'source': 'cache' | 'local' | 'tmdb' | None,
+     'error': None or a message}. Lookups still running after timeout
+    seconds are reported with the error 'timeout'.
+    """
+    ids = []
+    for movie_id in movie_ids:
+        try:
+            ids.append(int(movie_id))
+        except (TypeError, ValueError):
+            continue
+    ids = list(dict.fromkeys(ids))
+    params = {'language': TMDB_DETAILS_LANGUAGE}
+    results = {}
+
+    if use_cache:
+        for movie_id in ids:
+            data = tmdb_client.peek(f'movie/{movie_id}', params)
+            if data is not None:
+                results[movie_id] = {'data': data, 'source': 'cache', 'error': None}
+
+    if use_local:
+        from models import Movie
+        missing = [movie_id for movie_id in ids if movie_id not in results]
+        if missing:
+            # Rows without fetched details (ID-export stubs) are not details
+            for movie in Movie.query.filter(Movie.tmdb_id.in_(missing), Movie.fetched_at.isnot(None)).all():
+                results[movie.tmdb_id] = {'data': movie.to_dict(), 'source': 'local', 'error': None}
+
+    misses = [movie_id for movie_id in ids if movie_id not in results]
+    if not misses:
+        return results
+
+    def fetch(movie_id):
+        return tmdb_client.get(f'movie/{movie_id}', params, use_cache=use_cache, priority=priority)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers else fanout_executor
+    try:
+        futures = {executor.submit(fetch, movie_id): movie_id for movie_id in misses}
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+            results[futures[future]] = {'data': None, 'source': None, 'error': 'timeout'}
+        for future in done:
+            movie_id = futures[future]
+            try:
+                results[movie_id] = {'data': future.result(), 'source': 'tmdb', 'error': None}
+            except requests.RequestException as e:
+                results[movie_id] = {'data': None, 'source': None, 'error': str(e)}
+    finally:
+        if executor is not fanout_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def search_movies(query, page=1, fields=None):
     """Search for movies"""
     try:
-        response = requests.get(
-            f'{TMDB_BASE_URL}/search/movie',
-            params={
-                'api_key': TMDB_API_KEY,
-                'language': 'en-US',
-                'query': query,
-                'page': page,
-                'include_adult': False
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('search/movie', {
+            'language': 'en-US',
+            'query': query,
+            'page': page,
+            'include_adult': False
+        }, fields=fields)
     except requests.RequestException as e:
         print(f"Error searching movies: {e}")
         return None
 
-def get_popular_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None):
+def get_popular_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None, fields=None):
     """Get popular movies list with filters"""
     try:
         params = {
-            'api_key': TMDB_API_KEY,
             'language': 'en-US',
             'page': page
         }
@@ -64,21 +773,15 @@ def get_popular_movies(page=1, with_genres=None, vote_average_gte=None, vote_ave
         if with_original_language:
             params['with_original_language'] = with_original_language
             
-        response = requests.get(
-            f'{TMDB_BASE_URL}/discover/movie',
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('discover/movie', params, fields=fields)
     except requests.RequestException as e:
         print(f"Error fetching popular movies: {e}")
         return None
 
-def get_top_rated_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None):
+def get_top_rated_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None, fields=None):
     """Get top rated movies list with filters"""
     try:
         params = {
-            'api_key': TMDB_API_KEY,
             'language': 'en-US',
             'page': page,
             'sort_by': 'vote_average.desc',
@@ -97,24 +800,18 @@ def get_top_rated_movies(page=1, with_genres=None, vote_average_gte=None, vote_a
         if with_original_language:
             params['with_original_language'] = with_original_language
             
-        response = requests.get(
-            f'{TMDB_BASE_URL}/discover/movie',
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('discover/movie', params, fields=fields)
     except requests.RequestException as e:
         print(f"Error fetching top rated movies: {e}")
         return None
 
-def get_upcoming_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None, region=None):
+def get_upcoming_movies(page=1, with_genres=None, vote_average_gte=None, vote_average_lte=None, with_original_language=None, region=None, fields=None):
     """Get upcoming movies list with filters and region-specific releases"""
     try:
         from datetime import datetime
         
         # Always use discover endpoint to ensure proper date filtering
         params = {
-            'api_key': TMDB_API_KEY,
             'language': 'en-US',
             'page': page,
             'primary_release_date.gte': datetime.now().strftime('%Y-%m-%d'),
@@ -137,13 +834,7 @@ def get_upcoming_movies(page=1, with_genres=None, vote_average_gte=None, vote_av
         if with_original_language:
             params['with_original_language'] = with_original_language
             
-        response = requests.get(
-            f'{TMDB_BASE_URL}/discover/movie',
-            params=params
-        )
-            
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('discover/movie', params, fields=fields)
     except requests.RequestException as e:
         print(f"Error fetching upcoming movies: {e}")
         return None
@@ -151,15 +842,7 @@ def get_upcoming_movies(page=1, with_genres=None, vote_average_gte=None, vote_av
 def get_movie_genres():
     """Get list of movie genres from TMDB"""
     try:
-        response = requests.get(
-            f'{TMDB_BASE_URL}/genre/movie/list',
-            params={
-                'api_key': TMDB_API_KEY,
-                'language': 'en-US'
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('genre/movie/list', {'language': 'en-US'})
     except requests.RequestException as e:
         print(f"Error fetching movie genres: {e}")
         return None
@@ -167,14 +850,7 @@ def get_movie_genres():
 def get_available_languages():
     """Get list of available languages from TMDB"""
     try:
-        response = requests.get(
-            f'{TMDB_BASE_URL}/configuration/languages',
-            params={
-                'api_key': TMDB_API_KEY
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get('configuration/languages')
     except requests.RequestException as e:
         print(f"Error fetching languages: {e}")
         return None
@@ -0,0 +1,218 @@
+"""
+Response cache for the TMDB client.
+
+Two tiers: a bounded in-process LRU and an optional SQLite file that
+survives restarts and is shared by every worker on the host.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+# value is the decoded JSON payload; timestamps are time.time() seconds
+CacheEntry = namedtuple('CacheEntry', ['value', 'stored_at', 'expires_at'])
+
+
+def normalize_param(value):
+    """Render a query parameter value in a canonical string form."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def make_cache_key(path, params=None):
+    """
+    Build a cache key from an endpoint path and its query parameters.
+    Parameter order, empty values and the API key do not affect the key.
+    """
+    items = sorted(
+        (name, normalize_param(value))
+        for name, value in (params or {}).items()
+        if value is not None and name != 'api_key'
+    )
+    key = path.strip('/')
+    if items:
+        key = f'{key}?{urlencode(items)}'
+    return key
+
+
+class MemoryCache:
+    """Thread-safe LRU cache bounded by entry count."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, allow_expired=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (not allow_expired and entry.expires_at <= time.time()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key=None, prefix=None):
+        """Remove one key, every key starting with prefix, or everything."""
+        with self._lock:
+            if key is not None:
+                return 1 if self._entries.pop(key, None) is not None else 0
+            if prefix is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            doomed = [k for k in self._entries if k.startswith(prefix)]
+            for k in doomed:
+                del self._entries[k]
+            return len(doomed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class SQLiteCache:
+    """On-disk cache tier backed by a single SQLite file."""
+
+    # Expired rows are kept this long so they can still be served as stale
+    RETENTION = 7 * 24 * 3600
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tmdb_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'stored_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, allow_expired=False):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, stored_at, expires_at FROM tmdb_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (not allow_expired and row[2] <= time.time()):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return CacheEntry(json.loads(row[0]), row[1], row[2])
+
+    def set(self, key, entry):
+        payload = json.dumps(entry.value)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO tmdb_cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)',
+                (key, payload, entry.stored_at, entry.expires_at)
+            )
+            self._conn.commit()
+            self._writes += 1
+            due = self._writes % self.PURGE_EVERY == 0
+        if due:
+            self.purge()
+
+    def delete(self, key=None, prefix=None):
+        with self._lock:
+            if key is not None:
+                cursor = self._conn.execute('DELETE FROM tmdb_cache WHERE key = ?', (key,))
+            elif prefix is not None:
+                escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                cursor = self._conn.execute(
+                    "DELETE FROM tmdb_cache WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',)
+                )
+            else:
+                cursor = self._conn.execute('DELETE FROM tmdb_cache')
+            self._conn.commit()
+            return cursor.rowcount
+
+    def purge(self):
+        """Drop rows that expired longer than RETENTION ago."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM tmdb_cache WHERE expires_at < ?', (time.time() - self.RETENTION,)
+            )
+            self._conn.commit()
+            self.evictions += cursor.rowcount
+            return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM tmdb_cache').fetchone()[0]
+            return {
+                'path': self.path,
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite store."""
+
+    def __init__(self, max_entries=2048, disk_path=None):
+        self.memory = MemoryCache(max_entries)
+        self.disk = SQLiteCache(disk_path) if disk_path else None
+
+    def get(self, key, allow_expired=False):
+        entry = self.memory.get(key, allow_expired)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key, allow_expired)
+            if entry is not None:
+                # Promote so the next lookup is served from memory
+                self.memory.set(key, entry)
+        return entry
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        entry = CacheEntry(value, now, now + ttl)
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+        return entry
+
+    def invalidate(self, key=None, prefix=None):
+        """Remove one key, a key prefix, or (with no arguments) everything."""
+        removed = self.memory.delete(key, prefix)
+        if self.disk is not None:
+            removed = max(removed, self.disk.delete(key, prefix))
+        return removed
+
+    def clear(self):
+        return self.invalidate()
+
+    def stats(self):
+        return {
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None
+        }
@@ -0,0 +1,152 @@
+"""
+Per-user movie state.
+
+Watched, liked and watch-later membership and the user's rating live in one
+user_movie_state row per user and movie, so any status question is a single
+read of the unique (user_id, movie_id) index. Rows are created on first
+touch and deleted once they no longer record anything.
+
+migrate_legacy_state() copies the older watched_item, liked_item,
+watch_later_item and rating tables into user_movie_state once.
+
+The watched, liked and watch-later lists are paginated by keyset on
+(<flag>_at, id): an opaque cursor carries the last row's sort key, so each
+page is a range scan of the list's partial index however deep the page.
+"""
+from datetime import datetime
+from catalogue import insert_ignoring_conflicts
+from models import db, Movie, Rating, SyncCheckpoint, UserMovieState, WatchedItem, LikedItem, WatchLaterItem
+from pagination import keyset_page
+from rating_stats import apply_rating_change
+
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+# Most TMDB ids POST /api/user/status accepts in one call
+STATUS_BATCH_LIMIT = 500
+LEGACY_MIGRATION = 'migration:user_movie_state'
+LEGACY_TABLES = (('watched', WatchedItem), ('liked', LikedItem), ('watch_later', WatchLaterItem))
+
+
+def get_state(user_id, movie_id, lock=False):
+    """The user's state row for a TMDB id, or None. lock holds a row lock (Postgres) until commit."""
+    query = UserMovieState.query.filter_by(user_id=int(user_id), movie_id=int(movie_id))
+    if lock:
+        query = query.with_for_update()
+    return query.first()
+
+
+def ensure_state(user_id, movie_id, lock=False):
+    """
+    Get or create the user's state row. The insert skips conflicts, so two
+    requests creating the same row cannot collide; nothing is committed.
+    """
+    state = get_state(user_id, movie_id, lock)
+    if state is None:
+        insert_ignoring_conflicts(UserMovieState.__table__, [{'user_id': int(user_id), 'movie_id': int(movie_id)}])
+        state = get_state(user_id, movie_id, lock)
+    return state
+
+
+def rate(state, rating):
+    """
+    Set the user's rating and fold the old/new delta into movie_rating_stats
+    in the same transaction. Load the state with lock=True so concurrent
+    ratings of one movie by one user see each other's old value.
+    """
+    apply_rating_change(state.movie_id, state.rating, rating)
+    state.set_rating(rating)
+
+
+def save_state(state):
+    """Commit a state change, dropping the row once it records nothing."""
+    if state.is_empty():
+        db.session.delete(state)
+    db.session.commit()
+
+
+def toggle_flag(user_id, movie_id, flag):
+    """Flip one list flag for the user and commit; returns the new value."""
+    state = ensure_state(user_id, movie_id)
+    value = not getattr(state, flag)
+    state.set_flag(flag, value)
+    save_state(state)
+    return value
+
+
+def user_status(user_id, movie_id):
+    """Rating and list membership for one movie, from one indexed read."""
+    return user_statuses(user_id, [movie_id])[int(movie_id)]
+
+
+def user_statuses(user_id, movie_ids):
+    """user_status() for many TMDB ids with one IN query; ids without a row get the empty status."""
+    movie_ids = [int(movie_id) for movie_id in movie_ids]
+    states = {
+        state.movie_id: state
+        for state in UserMovieState.query.filter(
+            UserMovieState.user_id == int(user_id),
+            UserMovieState.movie_id.in_(movie_ids)
+        )
+    } if movie_ids else {}
+    empty = {'rating': None, 'watched': False, 'liked': False, 'watch_later': False}
+    return {movie_id: states[movie_id].to_status() if movie_id in states else dict(empty) for movie_id in movie_ids}
+
+
+def list_query(user_id, flag):
+    """(UserMovieState, Movie) pairs for one of the user's lists, oldest addition first."""
+    return db.session.query(UserMovieState, Movie).join(
+        Movie, Movie.tmdb_id == UserMovieState.movie_id
+    ).filter(
+        UserMovieState.user_id == int(user_id),
+        getattr(UserMovieState, flag)
+    ).order_by(getattr(UserMovieState, f'{flag}_at'), UserMovieState.id)
+
+
+def list_page(user_id, flag, limit=LIST_PAGE_SIZE, cursor=None):
+    """
+    One page of a user's list in (<flag>_at, id) order, starting after the
+    cursor. Returns ((UserMovieState, Movie) pairs, next cursor or None).
+    """
+    added_at = f'{flag}_at'
+    return keyset_page(
+        list_query(user_id, flag),
+        (getattr(UserMovieState, added_at), UserMovieState.id),
+        lambda row: (getattr(row[0], added_at), row[0].id),
+        limit, cursor
+    )
+
+
+def state_counts(user_id):
+    """Count the user's watched, liked, watch-later and rated movies in one query."""
+    columns = [db.func.count(db.case((getattr(UserMovieState, flag), 1))) for flag in UserMovieState.FLAGS]
+    columns.append(db.func.count(UserMovieState.rating))
+    row = db.session.query(*columns).filter(UserMovieState.user_id == int(user_id)).one()
+    return dict(zip(UserMovieState.FLAGS + ('rated',), row))
+
+
+def migrate_legacy_state():
+    """
+    Copy the legacy list and rating tables into user_movie_state, once.
+    Rows already present are left alone. Returns the number of rows copied.
+    """
+    if db.session.get(SyncCheckpoint, LEGACY_MIGRATION) is not None:
+        return 0
+    empty = {'watched': False, 'liked': False, 'watch_later': False, 'rating': None,
+             'watched_at': None, 'liked_at': None, 'watch_later_at': None, 'rated_at': None}
+    states = {}
+    for flag, model in LEGACY_TABLES:
+        for user_id, movie_id, added_at in db.session.query(model.user_id, model.movie_id, model.added_at):
+            row = states.setdefault((user_id, movie_id), dict(empty, user_id=user_id, movie_id=movie_id))
+            row[flag] = True
+            row[f'{flag}_at'] = added_at or datetime.utcnow()
+    ratings = db.session.query(
+        Rating.user_id, Movie.tmdb_id, Rating.rating, Rating.created_at, Rating.updated_at
+    ).join(Movie, Rating.movie_id == Movie.id)
+    for user_id, movie_id, rating, created_at, updated_at in ratings:
+        row = states.setdefault((user_id, movie_id), dict(empty, user_id=user_id, movie_id=movie_id))
+        row['rating'] = rating
+        row['rated_at'] = updated_at or created_at
+    insert_ignoring_conflicts(UserMovieState.__table__, list(states.values()))
+    db.session.add(SyncCheckpoint(name=LEGACY_MIGRATION, synced_until=datetime.utcnow()))
+    db.session.commit()
+    return len(states)
@@ -78,8 +78,10 @@ export const getProfile = async () => {
   return response.data;
 };
 
+// The list getters pass all=1 for the full unpaginated array; without it the
+// backend returns keyset pages of { results, next_cursor }
 export const getWatchLater = async () => {
-  const response = await api.get('/user/watch-later');
+  const response = await api.get('/user/watch-later', { params: { all: 1 } });
   return response.data;
 };
 
@@ -88,13 +90,13 @@ export const getWatchlist = getWatchLater;
 
 // Get user's liked movies
 export const getLikes = async () => {
-  const response = await api.get('/user/likes');
+  const response = await api.get('/user/likes', { params: { all: 1 } });
   return response.data;
 };
 
 // Get user's watched movies
 export const getWatched = async () => {
-  const response = await api.get('/user/watched');
+  const response = await api.get('/user/watched', { params: { all: 1 } });
   return response.data;
 };
 
@@ -122,6 +124,12 @@ export const getMovieRating = async (movieId) => {
   return response.data;
 };
 
+// Get list membership and rating for many movies in one request
+export const getMovieStatuses = async (movieIds) => {
+  const response = await api.post('/user/status', { movie_ids: movieIds });
+  return response.data.statuses;
+};
+
 // Check if user is authenticated
 export const isAuthenticated = () => {
   return !!localStorage.getItem('access_token');
@@ -165,8 +173,8 @@ export const addReviewComment = async (reviewId, comment) => {
   return response.data;
 };
 
-export const getReviewComments = async (reviewId) => {
-  const response = await api.get(`/movie/reviews/${reviewId}/comments`);
+export const getReviewComments = async (reviewId, params = {}) => {
+  const response = await api.get(`/movie/reviews/${reviewId}/comments`, { params });
   return response.data;
 };
 
@@ -193,8 +201,14 @@ export const submitReview = async (movieId, reviewData) => {
   return response.data;
 };
 
-// Get reviews for a movie
-export const getMovieReviews = async (movieId) => {
-  const response = await api.get(`/movie/${movieId}/reviews`);
+// Details, reviews and the current user's state for the movie detail view
+export const getMoviePage = async (movieId) => {
+  const response = await api.get(`/movie/${movieId}/page`);
+  return response.data;
+};
+
+// Get a page of reviews for a movie: params { sort, limit, cursor }
+export const getMovieReviews = async (movieId, params = {}) => {
+  const response = await api.get(`/movie/${movieId}/reviews`, { params });
   return response.data;
 };
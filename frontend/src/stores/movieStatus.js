@@ -1,4 +1,9 @@
 import { ref, reactive } from 'vue';
+import { getMovieStatuses } from '../services/api';
+import { updateMovieRating } from './movieRatings';
+
+// Most ids the batch status endpoint accepts per request
+const STATUS_BATCH_LIMIT = 500;
 
 // Movie status store for tracking likes, watch later, and watched movies
 const movieStatus = reactive({
@@ -71,11 +76,53 @@ export const initializeMovieStatus = (likes = [], watchLater = [], watched = [])
   isInitialized.value = true;
 };
 
+// Batched status loading: cards rendered in the same tick share one request
+const loadedStatusIds = new Set();
+let pendingStatusIds = new Set();
+let pendingStatusLoad = null;
+
+const flushStatusQueue = async () => {
+  const ids = [...pendingStatusIds];
+  pendingStatusIds = new Set();
+  pendingStatusLoad = null;
+  for (let start = 0; start < ids.length; start += STATUS_BATCH_LIMIT) {
+    const batch = ids.slice(start, start + STATUS_BATCH_LIMIT);
+    try {
+      const statuses = await getMovieStatuses(batch);
+      batch.forEach(id => {
+        const status = statuses[id];
+        if (!status) return;
+        updateMovieStatus(id, 'watched', status.watched);
+        updateMovieStatus(id, 'likes', status.liked);
+        updateMovieStatus(id, 'watchLater', status.watch_later);
+        updateMovieRating(id, status.rating || 0);
+        loadedStatusIds.add(id);
+      });
+    } catch (error) {
+      console.error('Error loading movie statuses:', error);
+    }
+  }
+};
+
+// Queue a movie for the next batched status request; resolves once it is loaded
+export const loadMovieStatus = (movieId) => {
+  const id = Number(movieId);
+  if (!id || loadedStatusIds.has(id)) {
+    return Promise.resolve();
+  }
+  pendingStatusIds.add(id);
+  if (!pendingStatusLoad) {
+    pendingStatusLoad = new Promise(resolve => setTimeout(resolve, 0)).then(flushStatusQueue);
+  }
+  return pendingStatusLoad;
+};
+
 // Clear initialization state (for logout)
 export const clearMovieStatus = () => {
   movieStatus.likes.clear();
   movieStatus.watchLater.clear();
   movieStatus.watched.clear();
+  loadedStatusIds.clear();
   isInitialized.value = false;
 };
 